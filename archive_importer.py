@@ -0,0 +1,233 @@
+import argparse
+import calendar
+import contextlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import pymysql
+
+import metrics
+from config import DB_CONFIG, DB_NAME, SYMBOLS, get_db_connection
+from klines import epoch_ms_to_local
+
+logger = logging.getLogger(__name__)
+
+# 币安公开数据的月度K线文件名，如 BTCUSDT-5m-2023-01.zip
+ARCHIVE_PATTERN = re.compile(r'^(?P<pair>[A-Z0-9]+)-(?P<interval>\w+)-(?P<year>\d{4})-(?P<month>\d{2})\.(?P<ext>zip|csv)$')
+QUOTE_ASSET = 'USDT'
+INSERT_CHUNK = 5000
+LOAD_METHODS = ('insert', 'load-data')
+
+
+def find_archives(directory, symbols=None, interval='5m'):
+    """
+    在目录（含子目录）中查找月度K线归档文件
+
+    返回:
+        list: 按币种和月份排序的 (币种, 年, 月, 路径)
+    """
+    symbols = set(symbols or SYMBOLS)
+    archives = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            match = ARCHIVE_PATTERN.match(name)
+            if not match or match.group('interval') != interval or not match.group('pair').endswith(QUOTE_ASSET):
+                continue
+            symbol = match.group('pair')[:-len(QUOTE_ASSET)]
+            if symbol in symbols:
+                archives.append((symbol, int(match.group('year')), int(match.group('month')), os.path.join(root, name)))
+    return sorted(archives)
+
+
+@contextlib.contextmanager
+def open_archive(path):
+    """
+    以文本流打开归档中的CSV，zip文件直接流式解压读取，不落盘
+    """
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            member = next(name for name in archive.namelist() if name.endswith('.csv'))
+            with archive.open(member) as raw:
+                yield io.TextIOWrapper(raw, encoding='utf-8')
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield f
+
+
+def read_klines_csv(stream):
+    """
+    将K线CSV解析为按列的数组，价格取开盘价和收盘价的均价（与REST接口入库一致）
+
+    兼容带表头的新版文件，以及2025年起以微秒为单位的开盘时间
+    """
+    first = stream.readline()
+    rows = [] if not first or not first[0].isdigit() else [first]
+    data = np.loadtxt(_chain(rows, stream), delimiter=',', usecols=(0, 1, 4), dtype=np.float64, ndmin=2)
+    open_time = data[:, 0].astype(np.int64)
+    if len(open_time) and open_time[0] > 10 ** 14:
+        open_time //= 1000
+    return {'open_time': open_time, 'price': (data[:, 1] + data[:, 2]) / 2}
+
+
+def _chain(lines, stream):
+    yield from lines
+    yield from stream
+
+
+def _month_range(year, month):
+    """
+    归档月份（UTC）对应的本地时间起止
+    """
+    start_ms = calendar.timegm((year, month, 1, 0, 0, 0)) * 1000
+    days = calendar.monthrange(year, month)[1]
+    end_ms = start_ms + (days * 288 - 1) * 5 * 60 * 1000
+    start, end = epoch_ms_to_local([start_ms, end_ms]).tolist()
+    return start, end, days * 288
+
+
+def _month_complete(cursor, symbol, year, month):
+    start, end, expected = _month_range(year, month)
+    with metrics.DB_QUERY_SECONDS.time(query='count_archive_month'):
+        cursor.execute("SELECT COUNT(*) FROM price_data WHERE symbol = %s AND timestamp BETWEEN %s AND %s",
+                       (symbol, start, end))
+        result = cursor.fetchone()
+    return bool(result) and result[0] >= expected
+
+
+def _insert_rows(conn, cursor, currency_id, symbol, timestamps, prices):
+    insert_sql = """
+    INSERT IGNORE INTO price_data (currency_id, symbol, price, timestamp)
+    VALUES (%s, %s, %s, %s)
+    """
+    timestamps = timestamps.tolist()
+    prices = prices.tolist()
+    written = 0
+    for i in range(0, len(timestamps), INSERT_CHUNK):
+        with metrics.DB_QUERY_SECONDS.time(query='insert_archive_rows'):
+            written += cursor.executemany(insert_sql, [
+                (currency_id, symbol, price, timestamp)
+                for price, timestamp in zip(prices[i:i + INSERT_CHUNK], timestamps[i:i + INSERT_CHUNK])
+            ]) or 0
+            conn.commit()
+    return written
+
+
+def _load_data_rows(conn, cursor, currency_id, symbol, timestamps, prices):
+    """
+    通过 LOAD DATA LOCAL INFILE 导入；数据经命名管道传给客户端，不写临时文件
+    """
+    directory = tempfile.mkdtemp()
+    pipe = os.path.join(directory, 'rows.csv')
+    os.mkfifo(pipe)
+
+    def _write():
+        with open(pipe, 'w', encoding='utf-8') as f:
+            for timestamp, price in zip(timestamps.astype(str).tolist(), prices.tolist()):
+                f.write(f'{currency_id},{symbol},{price},{timestamp.replace("T", " ")}\n')
+
+    writer = threading.Thread(target=_write, name='archive-load-data', daemon=True)
+    writer.start()
+    try:
+        with metrics.DB_QUERY_SECONDS.time(query='load_data_archive'):
+            written = cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE price_data
+            FIELDS TERMINATED BY ',' LINES TERMINATED BY '\\n'
+            (currency_id, symbol, price, timestamp)
+            """, (pipe,))
+            conn.commit()
+        writer.join()
+        return written
+    finally:
+        os.unlink(pipe)
+        os.rmdir(directory)
+
+
+@contextlib.contextmanager
+def _connection(method):
+    if method == 'load-data':
+        conn = pymysql.connect(database=DB_NAME, local_infile=True, **DB_CONFIG)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    else:
+        with get_db_connection() as conn:
+            yield conn
+
+
+def import_directory(directory, symbols=None, method='insert', force=False):
+    """
+    将目录中的月度K线归档导入 price_data，按 (symbol, timestamp) 唯一键去重，可重复执行
+
+    参数:
+        method: 'insert' 为分块多行 INSERT IGNORE；'load-data' 为 LOAD DATA LOCAL INFILE（需服务端开启 local_infile）
+        force: 为 True 时不跳过数据库中已完整的月份
+
+    返回:
+        dict: 币种 -> {'files', 'rows', 'skipped_files'}
+    """
+    if method not in LOAD_METHODS:
+        raise ValueError(f"未知的导入方式: {method}")
+    archives = find_archives(directory, symbols)
+    if not archives:
+        logger.info(f'{directory} 中没有找到K线归档文件')
+        return {}
+
+    summary = {}
+    load_rows = _load_data_rows if method == 'load-data' else _insert_rows
+    with _connection(method) as conn:
+        if not conn:
+            return {}
+        cursor = conn.cursor()
+        currency_ids = {}
+        for symbol, year, month, path in archives:
+            stats = summary.setdefault(symbol, {'files': 0, 'rows': 0, 'skipped_files': 0})
+            if symbol not in currency_ids:
+                cursor.execute("SELECT id FROM currencies WHERE symbol = %s", (symbol,))
+                result = cursor.fetchone()
+                currency_ids[symbol] = result[0] if result else None
+            if currency_ids[symbol] is None:
+                logger.warning(f'币种 {symbol} 不存在，跳过 {path}')
+                continue
+            if not force and _month_complete(cursor, symbol, year, month):
+                stats['skipped_files'] += 1
+                continue
+
+            with open_archive(path) as stream:
+                columns = read_klines_csv(stream)
+            timestamps = epoch_ms_to_local(columns['open_time'])
+            written = load_rows(conn, cursor, currency_ids[symbol], symbol, timestamps, columns['price'])
+            metrics.ROWS_WRITTEN.inc(written, table='price_data')
+            metrics.ROWS_SKIPPED.inc(len(timestamps) - written, table='price_data')
+            stats['files'] += 1
+            stats['rows'] += written
+            logger.info(f'{os.path.basename(path)}: 读取 {len(timestamps)} 条，新写入 {written} 条')
+        cursor.close()
+
+    for symbol, stats in summary.items():
+        logger.info(f"{symbol}: 导入 {stats['files']} 个文件共 {stats['rows']} 条，跳过已完整月份 {stats['skipped_files']} 个")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导入币安月度5分钟K线归档（zip/csv）到 price_data')
+    parser.add_argument('directory', help='归档文件所在目录')
+    parser.add_argument('--symbols', default=','.join(SYMBOLS), help='币种，逗号分隔')
+    parser.add_argument('--method', choices=LOAD_METHODS, default='insert', help='导入方式')
+    parser.add_argument('--force', action='store_true', help='重新导入数据库中已完整的月份')
+    args = parser.parse_args()
+
+    start = datetime.now()
+    import_directory(args.directory, args.symbols.split(','), args.method, args.force)
+    logger.info(f'导入完成，耗时 {(datetime.now() - start).total_seconds():.1f} 秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,506 @@
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+import pymysql
+
+from config import DB_NAME, DEFAULT_DB_NAME
+from mock_market import SyntheticMarket
+
+logger = logging.getLogger(__name__)
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+# ==================== 模拟HTTP ====================
+
+class _StubResponse:
+    def __init__(self, payload):
+        self._payload = payload
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._payload
+
+
+def stub_http(market):
+    """
+    返回替代 requests.get 的函数，按请求参数从合成行情中返回数据
+    """
+    def _get(url, params=None, timeout=None, **kwargs):
+        params = params or {}
+        if '/api/v3/klines' in url:
+            symbol = params['symbol'].replace('USDT', '')
+            return _StubResponse(market.klines(symbol, int(params['startTime']), int(params['endTime']), int(params.get('limit', 500))))
+        if '/fng/' in url:
+            limit = int(re.search(r'limit=(\d+)', url).group(1)) if 'limit=' in url else 1
+            return _StubResponse(market.fng_payload(limit))
+        if '/api/v3/ticker/price' in url:
+            symbol = re.search(r'symbol=(\w+)USDT', url).group(1)
+            return _StubResponse({'symbol': f'{symbol}USDT', 'price': f'{market.close[symbol][-1]:.2f}'})
+        raise ValueError(f'未模拟的请求: {url}')
+    return _get
+
+
+# ==================== 数据库替身 ====================
+
+class StandInDatabase:
+    """
+    内存中的数据库替身，按SQL模式模拟热点路径用到的查询，并统计查询次数
+    """
+    def __init__(self):
+        self.queries = 0
+        self.currencies = {'BTC': 1, 'ETH': 2}
+        self.prices = {}  # 币种 -> [时间戳数组(datetime64[s]), 价格数组]
+        self.fng = {}
+        self.trade_rows = 0
+        self.schema_version = 0
+        self.trade_runs = 0
+        self.last_price_id = 0  # 模拟 price_data 的自增ID
+        self.verified_through = {}  # 币种 -> 完整性检查水位
+        self.known_gaps = {}  # (币种, 日期) -> (记录数, 原因)
+        self.lastrowid = None
+        self.rowcount = 0
+        self._lock = threading.Lock()  # 压测时多个线程并发写入
+
+    def _series(self, symbol):
+        """
+        返回币种的 [时间戳, 价格, 行数]，数组按容量倍增预分配，顺序追加为均摊O(1)
+        """
+        series = self.prices.get(symbol)
+        if series is None:
+            series = self.prices[symbol] = [np.empty(1024, dtype='datetime64[s]'), np.empty(1024), 0]
+        return series
+
+    def _view(self, symbol):
+        timestamps, prices, size = self._series(symbol)
+        return timestamps[:size], prices[:size]
+
+    def _append(self, rows, ignore):
+        by_symbol = {}
+        for row in rows:
+            by_symbol.setdefault(row[1], []).append(row)
+        for symbol, items in by_symbol.items():
+            series = self._series(symbol)
+            existing, _ = self._view(symbol)
+            timestamps = np.array([row[3] for row in items], dtype='datetime64[s]')
+            prices = np.array([np.nan if row[2] is None else row[2] for row in items], dtype=np.float64)
+            if ignore:
+                mask = ~np.isin(timestamps, existing)
+                timestamps, prices = timestamps[mask], prices[mask]
+            self.rowcount += len(timestamps)
+            self.last_price_id += len(timestamps)
+
+            size = series[2]
+            needed = size + len(timestamps)
+            if needed > len(series[0]):
+                capacity = max(needed, len(series[0]) * 2)
+                series[0] = np.concatenate((series[0][:size], np.empty(capacity - size, dtype='datetime64[s]')))
+                series[1] = np.concatenate((series[1][:size], np.empty(capacity - size)))
+            series[0][size:needed] = timestamps
+            series[1][size:needed] = prices
+            series[2] = needed
+
+            # 非顺序追加时重新排序
+            if len(timestamps) and ((size and timestamps.min() < series[0][size - 1]) or np.any(np.diff(timestamps).astype(np.int64) < 0)):
+                order = np.argsort(series[0][:needed], kind='stable')
+                series[0][:needed] = series[0][:needed][order]
+                series[1][:needed] = series[1][:needed][order]
+
+    def _range(self, symbol, start, end):
+        timestamps, _ = self._view(symbol)
+        lo = np.searchsorted(timestamps, np.datetime64(start, 's'), side='left')
+        hi = np.searchsorted(timestamps, np.datetime64(end, 's'), side='right')
+        return lo, hi
+
+    def _delete(self, symbol, lo, hi):
+        series = self._series(symbol)
+        size = series[2]
+        removed = hi - lo
+        series[0][lo:size - removed] = series[0][hi:size]
+        series[1][lo:size - removed] = series[1][hi:size]
+        series[2] = size - removed
+
+    def execute(self, sql, params, many=False):
+        with self._lock:
+            return self._execute(sql, params, many)
+
+    def _execute(self, sql, params, many=False):
+        self.queries += 1
+        self.rowcount = 0
+        text = ' '.join(sql.split())
+
+        if text.startswith('SELECT id FROM currencies'):
+            currency_id = self.currencies.get(params[0])
+            return [(currency_id,)] if currency_id else []
+
+        if text.startswith('SELECT timestamp FROM price_data'):
+            lo, hi = self._range(*params)
+            return [(ts,) for ts in self._view(params[0])[0][lo:hi].tolist()]
+
+        if text.startswith("SELECT TIMESTAMPDIFF(SECOND, '1970-01-01', timestamp), price * 1e0 FROM price_data"):
+            timestamps, prices = self._view(params[0])
+            lo = np.searchsorted(timestamps, np.datetime64(params[1], 's'), side='left')
+            hi = np.searchsorted(timestamps, np.datetime64(params[2], 's'), side='left') if len(params) > 2 else None
+            seconds, prices = timestamps[lo:hi].astype(np.int64), prices[lo:hi]
+            present = ~np.isnan(prices)
+            return list(zip(seconds[present].tolist(), prices[present].tolist()))
+
+        if text.startswith('SELECT COUNT(*) FROM price_data'):
+            lo, hi = self._range(*params)
+            return [(int(hi - lo),)]
+
+        if text.startswith('SELECT MAX(timestamp)'):
+            timestamps, _ = self._view(params[0])
+            return [(timestamps[-1].tolist() if len(timestamps) else None,)]
+
+        if text.startswith('DELETE FROM price_data'):
+            lo, hi = self._range(*params)
+            self._delete(params[0], lo, hi)
+            return []
+
+        if text.startswith('INSERT INTO price_data') or text.startswith('INSERT IGNORE INTO price_data'):
+            self._append(params if many else [params], ignore='IGNORE' in text)
+            return []
+
+        if text.startswith('SELECT DATE(timestamp)'):
+            symbol = re.search(r"symbol = '(\w+)'", text).group(1)
+            timestamps, prices = self._view(symbol)
+            days = timestamps.astype('datetime64[D]')
+            unique_days, index, counts = np.unique(days, return_index=True, return_counts=True)
+            sums = np.add.reduceat(prices, index) if len(index) else np.empty(0)
+            return list(zip(unique_days.tolist(), (sums / np.maximum(counts, 1)).tolist()))
+
+        if 'FROM fear_greed_index' in text and text.startswith('SELECT date'):
+            return [(datetime.strptime(date, '%Y-%m-%d').date(), value) for date, value in sorted(self.fng.items())]
+
+        if text.startswith('INSERT INTO fear_greed_index'):
+            flat = list(params)
+            for i in range(0, len(flat), 2):
+                self.fng[str(flat[i])] = int(flat[i + 1])
+            return []
+
+        if text.startswith('SELECT MAX(id) FROM price_data'):
+            return [(self.last_price_id or None,)]
+
+        if text.startswith('SELECT MAX(date), COUNT(*), SUM(value) FROM fear_greed_index'):
+            if not self.fng:
+                return [(None, 0, None)]
+            return [(max(self.fng), len(self.fng), sum(self.fng.values()))]
+
+        if text.startswith('SELECT MAX(version)'):
+            return [(self.schema_version or None,)]
+
+        if text.startswith('INSERT INTO schema_version'):
+            self.schema_version = max(self.schema_version, params[0])
+            return []
+
+        if text.startswith('INSERT INTO trade_runs'):
+            self.trade_runs += 1
+            self.lastrowid = self.trade_runs
+            return []
+
+        if text.startswith('SELECT verified_through FROM integrity_state'):
+            watermark = self.verified_through.get(params[0])
+            return [(watermark,)] if watermark else []
+
+        if text.startswith('INSERT INTO integrity_state'):
+            self.verified_through[params[0]] = params[1]
+            return []
+
+        if text.startswith('SELECT date FROM known_data_gaps'):
+            return [(date,) for symbol, date in self.known_gaps if symbol == params[0]]
+
+        if text.startswith('INSERT INTO known_data_gaps'):
+            self.known_gaps[(params[0], params[1])] = (params[2], params[3])
+            return []
+
+        if text.startswith('DELETE FROM known_data_gaps'):
+            self.known_gaps.pop((params[0], params[1]), None)
+            return []
+
+        if text.startswith('INSERT INTO trade_records'):
+            self.trade_rows += len(params) if many else 1
+            return []
+
+        # 其余语句（DDL等）视为成功
+        return []
+
+
+class _StandInCursor:
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    @property
+    def lastrowid(self):
+        return self.db.lastrowid
+
+    def execute(self, sql, params=None):
+        self._rows = self.db.execute(sql, params or ())
+        return len(self._rows) or self.db.rowcount
+
+    def executemany(self, sql, rows):
+        self._rows = self.db.execute(sql, list(rows), many=True)
+        return len(self._rows) or self.db.rowcount
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class _StandInConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, *args, **kwargs):
+        return _StandInCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _CountingCursor:
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.queries += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _QueryCounter:
+    queries = 0
+
+
+# ==================== 基准测试 ====================
+
+class BenchmarkContext:
+    def __init__(self, market, use_mysql=False):
+        self.market = market
+        self.use_mysql = use_mysql
+        self.db = None if use_mysql else StandInDatabase()
+        self.counter = _QueryCounter() if use_mysql else self.db
+        self._real_connect = pymysql.connect
+
+    def connect(self, *args, **kwargs):
+        if self.use_mysql:
+            return _CountingConnection(self._real_connect(*args, **kwargs), self.counter)
+        return _StandInConnection(self.db)
+
+    @contextlib.contextmanager
+    def patched(self):
+        import requests
+        with mock.patch.object(pymysql, 'connect', self.connect), \
+                mock.patch.object(requests, 'get', stub_http(self.market)), \
+                mock.patch.object(time, 'sleep', lambda seconds: None), \
+                contextlib.redirect_stdout(io.StringIO()):
+            logging.disable(logging.CRITICAL)
+            try:
+                yield
+            finally:
+                logging.disable(logging.NOTSET)
+
+    def execute(self, sql, params):
+        with self.patched():
+            from config import get_db_connection
+            with get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql, params)
+                conn.commit()
+                cursor.close()
+
+
+def measure(context, name, func, rows, track_memory=True):
+    queries_before = context.counter.queries
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with context.patched():
+        result = func()
+    wall_time = time.perf_counter() - start
+    peak = 0
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    rows = rows(result) if callable(rows) else rows
+    return {
+        'name': name,
+        'rows': rows,
+        'wall_time': round(wall_time, 4),
+        'rows_per_sec': round(rows / wall_time, 1) if wall_time > 0 else None,
+        'queries': context.counter.queries - queries_before,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2)
+    }
+
+
+def run_benchmarks(years=3, use_mysql=False, track_memory=True, seed=7):
+    if use_mysql and DB_NAME == DEFAULT_DB_NAME:
+        # 基准测试会写入合成数据并删除部分行，绝不能在生产库上运行
+        raise RuntimeError(f'--mysql 需要将 DB_NAME 指向测试库，不能使用生产库 {DEFAULT_DB_NAME}')
+    start = datetime(2021, 1, 1)
+    days = int(years * 365)
+    market = SyntheticMarket(start, days, seed=seed)
+    context = BenchmarkContext(market, use_mysql=use_mysql)
+    end = start + timedelta(days=days) - timedelta(minutes=5)
+    results = []
+
+    import main
+    from daily_data_checker import DailyDataChecker
+    from investment_analysis import InvestmentAnalyzer
+    from spool import PriceSpool
+
+    # 写入失败的合成数据进入临时预写日志，不能混入生产环境的日志，之后被排空到生产库
+    spool_dir = tempfile.mkdtemp(prefix='benchmark-spool-')
+    main.price_spool = PriceSpool(os.path.join(spool_dir, 'price_data.spool'))
+
+    if use_mysql:
+        with context.patched():
+            main.init_database()
+
+    def ingest():
+        for symbol in market.symbols:
+            main.fetch_historical_data(symbol, start, end)
+        main.save_fng_history(dict(zip(market.fng_dates, market.fng_values.tolist())))
+    results.append(measure(context, 'ingest', ingest, len(market.symbols) * days * 288, track_memory))
+
+    # 每隔约一个月删除一天数据，让完整性检查走修复路径
+    gap_days = [start + timedelta(days=i) for i in range(15, min(days, 365), 30)]
+    for day in gap_days:
+        context.execute("DELETE FROM price_data WHERE symbol = %s AND timestamp BETWEEN %s AND %s",
+                        ('BTC', day, day + timedelta(hours=23, minutes=59, seconds=59)))
+
+    def check():
+        checker = DailyDataChecker()
+        checker.check_yearly_data(symbol='BTC', year=start.year)
+    results.append(measure(context, 'check_yearly_data', check, min(days, 365), track_memory))
+
+    def preload():
+        analyzer = InvestmentAnalyzer()
+        analyzer.preload_data()
+        return sum(len(prices) for prices in analyzer.daily_prices.values()) + len(analyzer.daily_fng)
+    results.append(measure(context, 'preload_data', preload, lambda loaded: loaded, track_memory))
+
+    def analyze():
+        analyzer = InvestmentAnalyzer()
+        analyzer.analyze_investment(start, start + timedelta(days=days - 1))
+    results.append(measure(context, 'analyze_investment', analyze, days, track_memory))
+
+    return {'dataset': {'years': years, 'days': days, 'symbols': market.symbols, 'seed': seed,
+                        'backend': 'mysql' if use_mysql else 'stand-in'},
+            'results': results}
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """
+    与基线对比，返回回归项列表
+    """
+    regressions = []
+    if baseline.get('dataset') != report['dataset']:
+        logger.warning('基线数据集与本次运行不一致，跳过对比')
+        return regressions
+
+    previous = {item['name']: item for item in baseline.get('results', [])}
+    for item in report['results']:
+        base = previous.get(item['name'])
+        if not base:
+            continue
+        if item['wall_time'] > base['wall_time'] * (1 + tolerance):
+            regressions.append(f"{item['name']}: 耗时 {base['wall_time']}s -> {item['wall_time']}s")
+        if item['queries'] > base['queries']:
+            regressions.append(f"{item['name']}: 查询次数 {base['queries']} -> {item['queries']}")
+        if base['peak_memory_mb'] and item['peak_memory_mb'] > base['peak_memory_mb'] * (1 + tolerance):
+            regressions.append(f"{item['name']}: 内存峰值 {base['peak_memory_mb']}MB -> {item['peak_memory_mb']}MB")
+    return regressions
+
+
+def print_report(report):
+    print(f"数据集: {report['dataset']}")
+    print(f"{'基准':<22}{'行数':>10}{'耗时(s)':>12}{'行/秒':>14}{'查询数':>10}{'内存峰值(MB)':>14}")
+    for item in report['results']:
+        print(f"{item['name']:<22}{item['rows']:>10}{item['wall_time']:>12.3f}"
+              f"{item['rows_per_sec'] or 0:>14.1f}{item['queries']:>10}{item['peak_memory_mb']:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='入库、完整性检查和回测热点路径的基准测试')
+    parser.add_argument('--years', type=float, default=3, help='合成数据的年数')
+    parser.add_argument('--mysql', action='store_true', help='使用本地MySQL（DB_NAME应指向测试库）而不是内存替身')
+    parser.add_argument('--no-memory', action='store_true', help='不统计内存峰值（tracemalloc会拖慢运行）')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基线文件路径')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='判定回归的相对阈值')
+    args = parser.parse_args()
+    if args.mysql and DB_NAME == DEFAULT_DB_NAME:
+        parser.error(f'--mysql 会写入合成数据并删除部分行，请将 DB_NAME 指向测试库（当前为生产库 {DEFAULT_DB_NAME}）')
+
+    report = run_benchmarks(years=args.years, use_mysql=args.mysql, track_memory=not args.no_memory)
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'基线已保存到 {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print('\n性能回归:')
+            for line in regressions:
+                print(f'- {line}')
+            return 1
+        print('\n未发现性能回归')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,7 +24,9 @@ DB_CONFIG = {
     'charset': os.getenv('DB_CHARSET', 'utf8mb4')
 }
 
-DB_NAME = os.getenv('DB_NAME', 'cryptocurrency_analysis')
+# 生产库的默认名称，基准测试等会写入合成数据的工具拒绝在该库上运行
+DEFAULT_DB_NAME = 'cryptocurrency_analysis'
+DB_NAME = os.getenv('DB_NAME', DEFAULT_DB_NAME)
 
 SYMBOLS = ['BTC', 'ETH']
 
@@ -32,6 +34,28 @@ MAX_RETRIES = 3
 REQUEST_LIMIT = 500
 BATCH_SIZE = 1000
 
+BINANCE_API_URL = os.getenv('BINANCE_API_URL', 'https://api.binance.com').rstrip('/')
+FNG_API_URL = os.getenv('FNG_API_URL', 'https://api.alternative.me').rstrip('/')
+
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_DUMP_PATH = os.getenv('METRICS_DUMP_PATH', '')
+METRICS_DUMP_INTERVAL = int(os.getenv('METRICS_DUMP_INTERVAL', '60'))
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', '')
+
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', 'cache/results')
+RESULT_CACHE_MAX_MB = float(os.getenv('RESULT_CACHE_MAX_MB', '256'))
+
+DATA_STORE_DIR = os.getenv('DATA_STORE_DIR', '')
+
+SPOOL_PATH = os.getenv('SPOOL_PATH', 'spool/price_data.spool')
+SPOOL_SYNC_INTERVAL = float(os.getenv('SPOOL_SYNC_INTERVAL', '1'))
+
+PRICE_FEED = os.getenv('PRICE_FEED', 'rest').lower()
+BINANCE_STREAM_URL = os.getenv('BINANCE_STREAM_URL', 'wss://stream.binance.com:9443')
+
 INITIAL_FUNDS = float(os.getenv('INITIAL_FUNDS', '10000'))
 
 BUY_THRESHOLDS = json.loads(os.getenv('BUY_THRESHOLDS', '[{"fng": 10, "btc": 500, "eth": 300}, {"fng": 15, "btc": 200, "eth": 100}, {"fng": 20, "btc": 100, "eth": 50}]'))
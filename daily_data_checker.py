@@ -1,12 +1,21 @@
+import argparse
 import logging
 from datetime import datetime, timedelta
 import requests
-import time
 
-from config import get_db_connection, SYMBOLS
+import metrics
+from config import get_db_connection, SYMBOLS, BINANCE_API_URL
+from klines import parse_klines, epoch_ms_to_local
 
 logger = logging.getLogger(__name__)
 
+# 每天的5分钟K线条数
+EXPECTED_RECORDS = 288
+# 完整性检查的起始日期
+FIRST_DATE = datetime(2020, 1, 1)
+# 增量检查时重新验证水位之前的天数，用于发现事后缺失的数据（如预写日志尚未写入、误删）
+TRAILING_DAYS = 3
+
 
 class DailyDataChecker:
     def __init__(self):
@@ -28,8 +37,9 @@ class DailyDataChecker:
                 FROM price_data 
                 WHERE symbol = %s AND timestamp BETWEEN %s AND %s
                 """
-                cursor.execute(query, (symbol, start_time, end_time))
-                result = cursor.fetchone()
+                with metrics.DB_QUERY_SECONDS.time(query='count_daily_records'):
+                    cursor.execute(query, (symbol, start_time, end_time))
+                    result = cursor.fetchone()
                 
                 return result[0] if result else 0
         except Exception as error:
@@ -45,7 +55,7 @@ class DailyDataChecker:
             end_ts = int(end_time.timestamp() * 1000)
             limit = 1000
             
-            url = 'https://api.binance.com/api/v3/klines'
+            url = f'{BINANCE_API_URL}/api/v3/klines'
             params = {
                 'symbol': f'{symbol}USDT',
                 'interval': '5m',
@@ -54,10 +64,16 @@ class DailyDataChecker:
                 'limit': limit
             }
             
-            time.sleep(1)
+            metrics.wait(1, reason='pacing')
             
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
+            with metrics.HTTP_REQUEST_SECONDS.time(endpoint='klines'):
+                try:
+                    response = requests.get(url, params=params, timeout=30)
+                    response.raise_for_status()
+                except Exception as error:
+                    status = getattr(getattr(error, 'response', None), 'status_code', None) or 'error'
+                    metrics.HTTP_ERRORS.inc(endpoint='klines', status=status)
+                    raise
             
             klines = response.json()
             if not klines:
@@ -68,7 +84,7 @@ class DailyDataChecker:
             
             with get_db_connection() as conn:
                 if not conn:
-                    return 0
+                    return None
                 
                 cursor = conn.cursor()
                 
@@ -79,26 +95,125 @@ class DailyDataChecker:
                 
                 currency_id = currency_result[0]
                 
-                insert_count = 0
-                for kline in klines:
-                    timestamp = datetime.fromtimestamp(kline[0] / 1000)
-                    open_price = float(kline[1])
-                    close_price = float(kline[4])
-                    avg_price = (open_price + close_price) / 2
-                    
-                    insert_sql = """
-                    INSERT IGNORE INTO price_data (currency_id, symbol, price, timestamp)
-                    VALUES (%s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_sql, (currency_id, symbol, avg_price, timestamp))
-                    insert_count += 1
+                columns = parse_klines(klines)
+                timestamps = epoch_ms_to_local(columns['open_time']).tolist()
+                
+                insert_sql = """
+                INSERT IGNORE INTO price_data (currency_id, symbol, price, timestamp)
+                VALUES (%s, %s, %s, %s)
+                """
+                with metrics.DB_QUERY_SECONDS.time(query='insert_price_data'):
+                    cursor.executemany(insert_sql, [
+                        (currency_id, symbol, price, timestamp)
+                        for price, timestamp in zip(columns['price'].tolist(), timestamps)
+                    ])
+                insert_count = len(timestamps)
+                metrics.ROWS_WRITTEN.inc(insert_count, table='price_data')
                 
                 conn.commit()
                 
                 return insert_count
         except Exception as error:
             logger.error(f'请求和存储数据失败: {error}')
-            return 0
+            return None
+    
+    def load_state(self, symbol):
+        """
+        读取币种的已验证水位和已知缺口
+
+        返回:
+            tuple: (水位日期或 None, 已知缺口日期集合)，数据库不可用时返回 None
+        """
+        try:
+            with get_db_connection() as conn:
+                if not conn:
+                    return None
+                cursor = conn.cursor()
+                cursor.execute("SELECT verified_through FROM integrity_state WHERE symbol = %s", (symbol,))
+                row = cursor.fetchone()
+                cursor.execute("SELECT date FROM known_data_gaps WHERE symbol = %s", (symbol,))
+                gaps = {gap for (gap,) in cursor.fetchall()}
+                cursor.close()
+        except Exception as error:
+            logger.error(f'读取完整性检查状态失败: {error}')
+            return None
+        watermark = datetime.combine(row[0], datetime.min.time()) if row and row[0] else None
+        return watermark, gaps
+    
+    def save_watermark(self, symbol, verified_through):
+        try:
+            with get_db_connection() as conn:
+                if not conn:
+                    return
+                cursor = conn.cursor()
+                cursor.execute("""
+                INSERT INTO integrity_state (symbol, verified_through) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE verified_through = VALUES(verified_through)
+                """, (symbol, verified_through.date()))
+                conn.commit()
+                cursor.close()
+        except Exception as error:
+            logger.error(f'保存完整性检查水位失败: {error}')
+    
+    def save_known_gap(self, symbol, date, record_count, reason=None):
+        """
+        记录或删除（reason 为 None 时）已知无法修复的缺口
+        """
+        try:
+            with get_db_connection() as conn:
+                if not conn:
+                    return
+                cursor = conn.cursor()
+                if reason is None:
+                    cursor.execute("DELETE FROM known_data_gaps WHERE symbol = %s AND date = %s", (symbol, date.date()))
+                else:
+                    cursor.execute("""
+                    INSERT INTO known_data_gaps (symbol, date, record_count, reason) VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE record_count = VALUES(record_count), reason = VALUES(reason)
+                    """, (symbol, date.date(), record_count, reason))
+                conn.commit()
+                cursor.close()
+        except Exception as error:
+            logger.error(f'保存已知缺口失败: {error}')
+    
+    def check_day(self, symbol, date, known_gaps=(), recheck_gaps=False):
+        """
+        检查一天的数据，不足时从API重新获取；recheck_gaps 为 True 时也重新尝试修复已知缺口
+
+        返回:
+            str: complete（完整）、fixed（已修复）、known_gap（已知无法修复的缺口）或 missing（仍然缺失）
+        """
+        day = date.strftime('%Y-%m-%d')
+        if date.date() in known_gaps and not recheck_gaps:
+            logger.debug(f"{day}: 已知缺口，跳过")
+            return 'known_gap'
+        
+        record_count = self.count_daily_records(symbol, date)
+        if record_count >= EXPECTED_RECORDS:
+            logger.debug(f"{day}: 数据完整 ({record_count}/{EXPECTED_RECORDS})")
+            if date.date() in known_gaps:
+                self.save_known_gap(symbol, date, record_count)
+            return 'complete'
+        
+        logger.warning(f"{day}: 数据不足 ({record_count}/{EXPECTED_RECORDS})，重新获取...")
+        logger.debug("添加延迟，避免API限制...")
+        metrics.wait(1, reason='pacing')
+        fetched_count = self.fetch_and_store_daily_data(symbol, date)
+        if fetched_count:
+            logger.debug(f"已获取 {fetched_count} 条数据")
+            record_count = self.count_daily_records(symbol, date)
+            logger.debug(f"更新后数据条数: {record_count}/{EXPECTED_RECORDS}")
+            if record_count >= EXPECTED_RECORDS:
+                if date.date() in known_gaps:
+                    self.save_known_gap(symbol, date, record_count)
+                return 'fixed'
+        if fetched_count is not None and fetched_count < EXPECTED_RECORDS:
+            # 交易所本身就没有完整数据（如停机），重新获取也无法修复，记录后不再重试
+            reason = f'交易所只返回 {fetched_count}/{EXPECTED_RECORDS} 条K线'
+            logger.warning(f"{day}: {reason}，记录为已知缺口")
+            self.save_known_gap(symbol, date, record_count, reason)
+            return 'known_gap'
+        return 'missing'
     
     def check_yearly_data(self, symbol='BTC', year=2020):
         logger.info(f"检查 {year} 年 {symbol} 数据完整性")
@@ -111,6 +226,8 @@ class DailyDataChecker:
             total_fixed = 0
             
             current_date_now = datetime.now()
+            state = self.load_state(symbol)
+            known_gaps = state[1] if state else set()
             
             for day in range(days_in_year):
                 current_date = start_date + timedelta(days=day)
@@ -119,24 +236,14 @@ class DailyDataChecker:
                     logger.debug(f"日期 {current_date.strftime('%Y-%m-%d')} 超过当前日期，停止检查")
                     break
                 
-                record_count = self.count_daily_records(symbol, current_date)
+                status = self.check_day(symbol, current_date, known_gaps)
                 total_checked += 1
                 
-                if record_count >= 288:
-                    logger.debug(f"{current_date.strftime('%Y-%m-%d')}: 数据完整 ({record_count}/288)")
-                else:
-                    logger.warning(f"{current_date.strftime('%Y-%m-%d')}: 数据不足 ({record_count}/288)，重新获取...")
-                    logger.debug("添加延迟，避免API限制...")
-                    time.sleep(1)
-                    fetched_count = self.fetch_and_store_daily_data(symbol, current_date)
-                    if fetched_count > 0:
-                        total_fixed += 1
-                        logger.debug(f"已获取 {fetched_count} 条数据")
-                        new_count = self.count_daily_records(symbol, current_date)
-                        logger.debug(f"更新后数据条数: {new_count}/288")
-                    if total_fixed > 0 and total_fixed % 10 == 0:
+                if status == 'fixed':
+                    total_fixed += 1
+                    if total_fixed % 10 == 0:
                         logger.debug("添加较长延迟，避免API限制...")
-                        time.sleep(3)
+                        metrics.wait(3, reason='pacing')
             
             logger.info(f"检查了 {total_checked} 天的数据")
             logger.info(f"修复了 {total_fixed} 天的数据")
@@ -144,18 +251,69 @@ class DailyDataChecker:
         except Exception as error:
             logger.error(f'检查年度数据失败: {error}')
             return False
+    
+    def check_incremental(self, symbol='BTC', trailing_days=TRAILING_DAYS, full=False, recheck_gaps=False):
+        """
+        增量检查：只检查已验证水位之后的已收盘日期及水位前 trailing_days 天，检查后推进水位
+
+        水位是从 FIRST_DATE 起连续完整（或为已知缺口）的最后一天，日常运行只需检查常数天；
+        首次运行或 full=True 时从 FIRST_DATE 开始全部检查。窗口内有仍然缺失的日期时，水位回退到其前一天，下次重新检查
+
+        参数:
+            recheck_gaps: 为 True 时重新尝试修复已知缺口
+
+        返回:
+            datetime: 新的水位日期（FIRST_DATE 前一天表示尚无已验证的日期），数据库不可用时返回 None
+        """
+        state = self.load_state(symbol)
+        if state is None:
+            logger.error(f"数据库不可用，跳过 {symbol} 数据完整性检查")
+            return None
+        watermark, known_gaps = state
+        
+        # 只检查已收盘的日期，当天的数据仍在写入
+        last_closed = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        if watermark is None or full:
+            start_date = FIRST_DATE
+        else:
+            start_date = max(FIRST_DATE, watermark - timedelta(days=trailing_days - 1))
+        
+        verified_through = start_date - timedelta(days=1)
+        contiguous = True
+        counts = {'complete': 0, 'fixed': 0, 'known_gap': 0, 'missing': 0}
+        current_date = start_date
+        while current_date <= last_closed:
+            status = self.check_day(symbol, current_date, known_gaps, recheck_gaps)
+            counts[status] += 1
+            if status == 'missing':
+                contiguous = False
+            elif contiguous:
+                verified_through = current_date
+            if status == 'fixed' and counts['fixed'] % 10 == 0:
+                metrics.wait(3, reason='pacing')
+            current_date += timedelta(days=1)
+        
+        if verified_through != watermark:
+            self.save_watermark(symbol, verified_through)
+        
+        checked = sum(counts.values())
+        logger.info(f"{symbol}: 检查了 {checked} 天，修复 {counts['fixed']} 天，已知缺口 {counts['known_gap']} 天，"
+                    f"仍缺失 {counts['missing']} 天；已验证至 {verified_through.strftime('%Y-%m-%d')}")
+        return verified_through
 
 
 def main():
-    checker = DailyDataChecker()
+    parser = argparse.ArgumentParser(description='检查并修复5分钟K线数据的完整性')
+    parser.add_argument('--symbols', default=','.join(SYMBOLS), help='币种，逗号分隔')
+    parser.add_argument('--full', action='store_true', help='忽略已验证水位，从2020年起全部重新检查')
+    parser.add_argument('--trailing-days', type=int, default=TRAILING_DAYS, help='重新验证水位之前的天数')
+    parser.add_argument('--recheck-gaps', action='store_true', help='重新尝试修复已知缺口')
+    args = parser.parse_args()
     
-    logger.info("检查BTC数据...")
-    for year in range(2020, 2027):
-        checker.check_yearly_data(symbol='BTC', year=year)
-    
-    logger.info("检查ETH数据...")
-    for year in range(2020, 2027):
-        checker.check_yearly_data(symbol='ETH', year=year)
+    checker = DailyDataChecker()
+    for symbol in args.symbols.split(','):
+        logger.info(f"检查{symbol}数据...")
+        checker.check_incremental(symbol, args.trailing_days, args.full, args.recheck_gaps)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,339 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+from config import DATA_STORE_DIR, SYMBOLS, get_db_connection
+from export_data import ArrowWriter, stream_chunks
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = {'5m': 300, '15m': 900, '1h': 3600, '4h': 14400, '1d': 86400}
+MAX_PARTS = 16  # 增量文件超过该数量时合并为一个文件
+EPOCH = np.datetime64('1970-01-01T00:00:00', 's')
+
+
+def _bounds(start, end):
+    """
+    [start, end) 转为自1970-01-01起的秒数（按本地时间，不做时区换算），None 表示不限
+    """
+    lo = int((np.datetime64(start, 's') - EPOCH).astype(np.int64)) if start is not None else None
+    hi = int((np.datetime64(end, 's') - EPOCH).astype(np.int64)) if end is not None else None
+    return lo, hi
+
+
+def bucket_mean(seconds, prices, interval):
+    """
+    按时间间隔分桶求均价，seconds 须已排序
+
+    返回:
+        tuple: (桶起始秒数, 均价)
+    """
+    if interval == INTERVALS['5m'] or not len(seconds):
+        return seconds, prices
+    buckets = seconds // interval * interval
+    keys, index, counts = np.unique(buckets, return_index=True, return_counts=True)
+    return keys, np.add.reduceat(prices, index) / counts
+
+
+class MySQLStore:
+    """
+    直接从 MySQL 读取；时间以整数秒、价格以 DOUBLE 返回，避免逐行创建 datetime/Decimal 对象，
+    大于5分钟的间隔在服务端聚合
+    """
+    def prices(self, symbol, interval, start=None, end=None):
+        conditions, params = ["symbol = %s", "price IS NOT NULL"], [symbol]
+        if start is not None:
+            conditions.append("timestamp >= %s")
+            params.append(str(np.datetime64(start, 's')).replace('T', ' '))
+        if end is not None:
+            conditions.append("timestamp < %s")
+            params.append(str(np.datetime64(end, 's')).replace('T', ' '))
+        where = ' AND '.join(conditions)
+        # TIMESTAMPDIFF 按本地时间计算秒数，不受会话时区影响；乘以浮点字面量使结果为 DOUBLE
+        if interval == INTERVALS['5m']:
+            query = f"""
+            SELECT TIMESTAMPDIFF(SECOND, '1970-01-01', timestamp), price * 1e0
+            FROM price_data WHERE {where} ORDER BY timestamp
+            """
+        else:
+            query = f"""
+            SELECT TIMESTAMPDIFF(SECOND, '1970-01-01', timestamp) DIV {interval} * {interval} AS bucket,
+                   AVG(price * 1e0)
+            FROM price_data WHERE {where} GROUP BY bucket ORDER BY bucket
+            """
+        with get_db_connection() as conn:
+            if not conn:
+                return np.empty(0, dtype=np.int64), np.empty(0)
+            cursor = conn.cursor()
+            with metrics.DB_QUERY_SECONDS.time(query='data_api_prices'):
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+            cursor.close()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0].astype(np.int64), data[:, 1]
+
+    def fng(self, start=None, end=None):
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= %s")
+            params.append(str(np.datetime64(start, 'D')))
+        if end is not None:
+            conditions.append("date <= %s")
+            params.append(str(np.datetime64(end, 'D')))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+        with get_db_connection() as conn:
+            if not conn:
+                return np.empty(0, dtype='datetime64[D]'), np.empty(0)
+            cursor = conn.cursor()
+            with metrics.DB_QUERY_SECONDS.time(query='data_api_fng'):
+                cursor.execute(f"SELECT TO_DAYS(date) - TO_DAYS('1970-01-01'), value FROM fear_greed_index{where} ORDER BY date",
+                               params)
+                rows = cursor.fetchall()
+            cursor.close()
+        data = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        return data[:, 0].astype('datetime64[D]'), data[:, 1].astype(np.float64)
+
+
+class ParquetStore:
+    """
+    本地 Parquet 快照：prices/ 下为按自增ID增量同步的分片，fng.parquet 为完整的贪婪恐惧指数
+
+    读取时只加载所需列和范围（谓词下推），数值列直接转为 numpy 数组；
+    修复数据会以更大的ID重新同步，读取时同一时间戳保留ID最大的一行
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.prices_dir = os.path.join(directory, 'prices')
+        self.fng_path = os.path.join(directory, 'fng.parquet')
+        self.state_path = os.path.join(directory, 'state.json')
+
+    def exists(self):
+        return os.path.exists(self.state_path)
+
+    def _state(self):
+        if not self.exists():
+            return {'last_id': 0}
+        with open(self.state_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _parts(self):
+        if not os.path.isdir(self.prices_dir):
+            return []
+        return sorted(os.path.join(self.prices_dir, name) for name in os.listdir(self.prices_dir)
+                      if name.endswith('.parquet'))
+
+    def sync(self, chunk_size=100000):
+        """
+        从 MySQL 增量同步 price_data（ID大于上次同步的行）并重写贪婪恐惧指数
+
+        返回:
+            int: 新同步的价格行数，数据库不可用时返回 None
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(self.prices_dir, exist_ok=True)
+        state = self._state()
+        part_path = os.path.join(self.prices_dir, f"part-{state['last_id'] + 1:012d}.parquet")
+        synced = 0
+        with get_db_connection() as conn:
+            if not conn:
+                return None
+            writer = None
+            try:
+                for rows in stream_chunks(conn, "SELECT id, symbol, timestamp, price FROM price_data WHERE id > %s ORDER BY id",
+                                          (state['last_id'],), chunk_size):
+                    if writer is None:
+                        writer = ArrowWriter(part_path, ('id', 'symbol', 'timestamp', 'price'), 'parquet')
+                    writer.write(rows)
+                    synced += len(rows)
+                    state['last_id'] = rows[-1][0]
+            finally:
+                if writer is not None:
+                    writer.close()
+
+            cursor = conn.cursor()
+            cursor.execute("SELECT date, value FROM fear_greed_index ORDER BY date")
+            fng_rows = cursor.fetchall()
+            cursor.close()
+
+        dates, values = zip(*fng_rows) if fng_rows else ((), ())
+        pq.write_table(pa.table({'date': pa.array(dates, type=pa.date32()), 'value': pa.array(values, type=pa.int32())}),
+                       self.fng_path)
+        if len(self._parts()) > MAX_PARTS:
+            self.compact()
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        logger.info(f"同步 {synced} 条价格数据、{len(fng_rows)} 条贪婪恐惧指数，最新ID {state['last_id']}")
+        return synced
+
+    def compact(self):
+        """
+        将所有分片去重排序后合并为一个文件
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        parts = self._parts()
+        table = pq.read_table(self.prices_dir)
+        table = table.take(pc.sort_indices(table, [('symbol', 'ascending'), ('timestamp', 'ascending'), ('id', 'ascending')]))
+        symbols = table.column('symbol').to_numpy(zero_copy_only=False)
+        timestamps = table.column('timestamp').cast('int64').to_numpy()
+        last = np.ones(len(symbols), dtype=bool)
+        last[:-1] = (symbols[1:] != symbols[:-1]) | (timestamps[1:] != timestamps[:-1])
+        table = table.filter(pa.array(last))
+        merged = os.path.join(self.prices_dir, f"part-{int(table.column('id').to_numpy().min()):012d}.merged")
+        pq.write_table(table, merged)
+        for part in parts:
+            os.unlink(part)
+        os.replace(merged, merged[:-len('.merged')] + '.parquet')
+        logger.info(f'合并 {len(parts)} 个分片，共 {table.num_rows} 行')
+
+    def prices(self, symbol, interval, start=None, end=None):
+        import pyarrow.parquet as pq
+
+        lo, hi = _bounds(start, end)
+        filters = [('symbol', '=', symbol)]
+        if lo is not None:
+            filters.append(('timestamp', '>=', (EPOCH + lo).astype(datetime)))
+        if hi is not None:
+            filters.append(('timestamp', '<', (EPOCH + hi).astype(datetime)))
+        table = pq.read_table(self.prices_dir, columns=['id', 'timestamp', 'price'], filters=filters)
+        table = table.filter(table.column('price').is_valid())
+        seconds = table.column('timestamp').cast('timestamp[s]').cast('int64').to_numpy()
+        prices = table.column('price').to_numpy()
+        if len(seconds) > 1 and not np.all(np.diff(seconds) > 0):
+            # 多个分片：按时间排序，同一时间戳保留ID最大（最近同步）的一行
+            ids = table.column('id').to_numpy()
+            order = np.lexsort((ids, seconds))
+            seconds, prices = seconds[order], prices[order]
+            last = np.append(seconds[1:] != seconds[:-1], True)
+            seconds, prices = seconds[last], prices[last]
+        return bucket_mean(seconds, prices, interval)
+
+    def fng(self, start=None, end=None):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(self.fng_path)
+        dates = table.column('date').to_numpy().astype('datetime64[D]')
+        values = table.column('value').to_numpy().astype(np.float64)
+        mask = np.ones(len(dates), dtype=bool)
+        if start is not None:
+            mask &= dates >= np.datetime64(start, 'D')
+        if end is not None:
+            mask &= dates <= np.datetime64(end, 'D')
+        return dates[mask], values[mask]
+
+
+def default_store():
+    """
+    配置了 DATA_STORE_DIR 且已同步过时使用本地 Parquet 快照，否则直接读取 MySQL
+    """
+    if DATA_STORE_DIR:
+        store = ParquetStore(DATA_STORE_DIR)
+        if store.exists():
+            return store
+    return MySQLStore()
+
+
+def load_series(symbols=None, interval='1d', start=None, end=None, with_fng=True, store=None):
+    """
+    读取按时间对齐的价格（及贪婪恐惧指数）序列
+
+    参数:
+        symbols: 币种列表，默认 SYMBOLS
+        interval: '5m'、'15m'、'1h'、'4h' 或 '1d'，大于5分钟时取区间内均价（'1d' 与回测的日均价一致）
+        start, end: 时间范围 [start, end)
+        store: MySQLStore 或 ParquetStore，默认由 default_store() 决定
+
+    返回:
+        dict: 'timestamp' 为 datetime64[s] 数组，各币种为 float64 数组，'fng' 为当日贪婪恐惧指数，缺失处为 NaN
+    """
+    if interval not in INTERVALS:
+        raise ValueError(f"未知的时间间隔: {interval}，可选: {', '.join(INTERVALS)}")
+    symbols = list(symbols or SYMBOLS)
+    store = store or default_store()
+    seconds = INTERVALS[interval]
+
+    series = {symbol: store.prices(symbol, seconds, start, end) for symbol in symbols}
+    keys = series[symbols[0]][0]
+    for symbol in symbols[1:]:
+        if not np.array_equal(keys, series[symbol][0]):
+            keys = np.union1d(keys, series[symbol][0])
+
+    result = {'timestamp': (keys + EPOCH.astype(np.int64)).astype('datetime64[s]')}
+    for symbol in symbols:
+        symbol_keys, values = series[symbol]
+        if len(symbol_keys) == len(keys):
+            result[symbol] = values  # 与公共时间轴一致时直接使用，不复制
+        else:
+            column = np.full(len(keys), np.nan)
+            column[np.searchsorted(keys, symbol_keys)] = values
+            result[symbol] = column
+
+    if with_fng:
+        fng_dates, fng_values = store.fng(start, end)
+        days = result['timestamp'].astype('datetime64[D]')
+        index = np.clip(np.searchsorted(fng_dates, days), 0, max(len(fng_dates) - 1, 0))
+        column = np.full(len(keys), np.nan)
+        if len(fng_dates):
+            matched = fng_dates[index] == days
+            column[matched] = fng_values[index[matched]]
+        result['fng'] = column
+    return result
+
+
+def load_arrow(symbols=None, interval='1d', start=None, end=None, with_fng=True, store=None):
+    """
+    以 pyarrow.Table 返回对齐序列；数值列由 numpy 数组零拷贝构建
+    """
+    import pyarrow as pa
+
+    series = load_series(symbols, interval, start, end, with_fng, store)
+    return pa.table({name: pa.array(values) for name, values in series.items()})
+
+
+def load_pandas(symbols=None, interval='1d', start=None, end=None, with_fng=True, store=None):
+    """
+    以时间为索引的 pandas.DataFrame 返回对齐序列，列直接引用 numpy 数组
+    """
+    import pandas as pd
+
+    series = load_series(symbols, interval, start, end, with_fng, store)
+    index = pd.DatetimeIndex(series.pop('timestamp'), name='timestamp')
+    return pd.DataFrame(series, index=index, copy=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='价格和贪婪恐惧指数数据访问：同步本地 Parquet 快照或查看对齐后的序列')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sync_parser = subparsers.add_parser('sync', help='从 MySQL 增量同步到 DATA_STORE_DIR')
+    sync_parser.add_argument('--directory', default=DATA_STORE_DIR, help='快照目录')
+    show_parser = subparsers.add_parser('show', help='读取并输出对齐后的序列')
+    show_parser.add_argument('--symbols', default=','.join(SYMBOLS), help='币种，逗号分隔')
+    show_parser.add_argument('--interval', choices=INTERVALS, default='1d', help='时间间隔')
+    show_parser.add_argument('--start', help='开始日期（含），如 2020-01-01')
+    show_parser.add_argument('--end', help='结束日期（不含），如 2024-01-01')
+    args = parser.parse_args()
+
+    if args.command == 'sync':
+        if not args.directory:
+            parser.error('请通过 --directory 或 DATA_STORE_DIR 指定快照目录')
+        return 0 if ParquetStore(args.directory).sync() is not None else 1
+
+    started = time.perf_counter()
+    frame = load_pandas(args.symbols.split(','), args.interval, args.start, args.end)
+    logger.info(f'读取 {len(frame)} 行，耗时 {time.perf_counter() - started:.3f} 秒')
+    print(frame)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
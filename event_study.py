@@ -0,0 +1,237 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import data_api
+from config import SYMBOLS
+
+logger = logging.getLogger(__name__)
+
+HORIZONS = (1, 7, 30, 90)
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def daily_frame(symbols=None, start=None, end=None, store=None):
+    """
+    读取日线价格和贪婪恐惧指数，并铺到连续的自然日上（缺失日为 NaN），使下标差即为天数差
+    """
+    series = data_api.load_series(symbols, '1d', start, end, with_fng=True, store=store)
+    days = series['timestamp'].astype('datetime64[D]')
+    if not len(days):
+        return None
+    calendar = np.arange(days[0], days[-1] + 1)
+    position = (days - calendar[0]).astype(np.int64)
+    frame = {'date': calendar}
+    for name, values in series.items():
+        if name == 'timestamp':
+            continue
+        column = np.full(len(calendar), np.nan)
+        column[position] = values
+        frame[name] = column
+    return frame
+
+
+def forward_returns(prices, horizons):
+    """
+    向量化计算各持有期的远期收益率 price[t+h] / price[t] - 1，末尾不足 h 天的为 NaN
+
+    返回:
+        ndarray: 形状为 (持有期数, 天数)
+    """
+    out = np.full((len(horizons), len(prices)), np.nan)
+    for row, horizon in enumerate(horizons):
+        if horizon < len(prices):
+            out[row, :-horizon] = prices[horizon:] / prices[:-horizon] - 1
+    return out
+
+
+def fng_buckets(fng, edges):
+    """
+    按区间边界把贪婪恐惧指数分桶，桶 i 为 [edges[i], edges[i+1])；缺失值返回 -1
+    """
+    bucket = np.digitize(fng, edges[1:-1])
+    return np.where(np.isnan(fng), -1, bucket)
+
+
+def bucket_labels(edges):
+    return [f'{int(lo)}-{int(hi) - 1}' for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+def _bucket_means(returns, buckets, n_buckets, index=None):
+    """
+    用 bincount 一次计算每行、每个桶的均值和上涨比例
+
+    参数:
+        returns: (行数, 天数)
+        index: 重采样的下标，形状 (重采样次数, 天数)；为 None 时使用原始序列
+
+    返回:
+        tuple: (均值, 上涨比例)，形状为 (重采样次数或1, 行数, 桶数)
+    """
+    if index is None:
+        index = np.arange(returns.shape[1])[None, :]
+    n_resamples = index.shape[0]
+    rows = returns.shape[0]
+    sampled = returns[:, index]  # (行数, 重采样次数, 天数)
+    sampled_buckets = buckets[index]  # (重采样次数, 天数)
+    valid = ~np.isnan(sampled) & (sampled_buckets >= 0)
+    # 每个 (行, 重采样, 桶) 组合一个 bincount 槽位
+    slot = (np.arange(rows)[:, None, None] * n_resamples + np.arange(n_resamples)[None, :, None]) * n_buckets \
+        + np.maximum(sampled_buckets, 0)[None, :, :]
+    size = rows * n_resamples * n_buckets
+    counts = np.bincount(slot[valid], minlength=size)
+    sums = np.bincount(slot[valid], weights=sampled[valid], minlength=size)
+    ups = np.bincount(slot[valid], weights=(sampled[valid] > 0).astype(np.float64), minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        hit_rates = ups / counts
+    shape = (rows, n_resamples, n_buckets)
+    return means.reshape(shape).transpose(1, 0, 2), hit_rates.reshape(shape).transpose(1, 0, 2)
+
+
+def _bootstrap_chunk(returns, buckets, n_buckets, n_resamples, block_size, seed):
+    """
+    循环区块自助法：按区块重采样交易日，保留远期收益率的重叠和自相关结构
+    """
+    rng = np.random.default_rng(seed)
+    days = returns.shape[1]
+    n_blocks = -(-days // block_size)
+    starts = rng.integers(0, days, size=(n_resamples, n_blocks))
+    index = ((starts[:, :, None] + np.arange(block_size)) % days).reshape(n_resamples, -1)[:, :days]
+    return _bucket_means(returns, buckets, n_buckets, index)
+
+
+def bootstrap(returns, buckets, n_buckets, n_resamples=2000, block_size=30, workers=None, chunk_size=100, seed=None):
+    """
+    分块并行计算各桶均值和上涨比例的自助分布
+
+    返回:
+        tuple: (均值, 上涨比例)，形状为 (n_resamples, 行数, 桶数)
+    """
+    chunks = [min(chunk_size, n_resamples - offset) for offset in range(0, n_resamples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = workers or os.cpu_count() or 1
+    args = [(returns, buckets, n_buckets, size, block_size, child) for size, child in zip(chunks, seeds)]
+    if workers == 1:
+        results = [_bootstrap_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_bootstrap_chunk, *zip(*args)))
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def event_study(frame, symbols=None, horizons=HORIZONS, edges=None, n_resamples=2000, block_size=30,
+                workers=None, seed=None, confidence=0.95):
+    """
+    按贪婪恐惧指数分桶统计各币种、各持有期的远期收益率分布
+
+    参数:
+        frame: daily_frame 的结果
+        edges: 分桶边界，默认每10点一个桶
+
+    返回:
+        list: 每个 (币种, 持有期, 桶) 一行统计，含样本数、均值、分位数、上涨比例及其自助置信区间
+    """
+    symbols = list(symbols or SYMBOLS)
+    edges = np.asarray(edges if edges is not None else np.arange(0, 101, 10), dtype=np.float64)
+    edges[-1] = max(edges[-1], 101)  # 最后一个桶包含100
+    n_buckets = len(edges) - 1
+    labels = bucket_labels(edges)
+    buckets = fng_buckets(frame['fng'], edges)
+
+    returns = np.concatenate([forward_returns(frame[symbol], horizons) for symbol in symbols])
+    keys = [(symbol, horizon) for symbol in symbols for horizon in horizons]
+
+    means, hit_rates = _bucket_means(returns, buckets, n_buckets)
+    boot_means, boot_hits = bootstrap(returns, buckets, n_buckets, n_resamples, block_size, workers, seed=seed)
+    tail = (1 - confidence) / 2 * 100
+    with np.errstate(invalid='ignore'):
+        mean_ci = np.nanpercentile(boot_means, [tail, 100 - tail], axis=0)
+        hit_ci = np.nanpercentile(boot_hits, [tail, 100 - tail], axis=0)
+
+    rows = []
+    for row, (symbol, horizon) in enumerate(keys):
+        for bucket, label in enumerate(labels):
+            values = returns[row][(buckets == bucket) & ~np.isnan(returns[row])]
+            if not len(values):
+                continue
+            quantiles = np.percentile(values, PERCENTILES)
+            rows.append({
+                'symbol': symbol,
+                'horizon': horizon,
+                'fng_bucket': label,
+                'count': int(len(values)),
+                'mean': float(means[0, row, bucket]),
+                'mean_ci_low': float(mean_ci[0, row, bucket]),
+                'mean_ci_high': float(mean_ci[1, row, bucket]),
+                'std': float(values.std()),
+                **{f'p{p}': float(q) for p, q in zip(PERCENTILES, quantiles)},
+                'hit_rate': float(hit_rates[0, row, bucket]),
+                'hit_rate_ci_low': float(hit_ci[0, row, bucket]),
+                'hit_rate_ci_high': float(hit_ci[1, row, bucket]),
+            })
+    return rows
+
+
+def write_results(rows, path):
+    if path.endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        return
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='贪婪恐惧指数分桶的远期收益率事件研究（区块自助法置信区间）')
+    parser.add_argument('--symbols', default=','.join(SYMBOLS), help='币种，逗号分隔')
+    parser.add_argument('--horizons', default=','.join(map(str, HORIZONS)), help='持有天数，逗号分隔')
+    parser.add_argument('--bucket-size', type=int, default=10, help='等宽分桶的宽度，1 为逐个指数值')
+    parser.add_argument('--edges', help='自定义分桶边界，如 0,10,15,20,45,55,80,85,90,100')
+    parser.add_argument('--start', help='开始日期（含），如 2020-01-01')
+    parser.add_argument('--end', help='结束日期（不含）')
+    parser.add_argument('--bootstrap', type=int, default=2000, help='自助重采样次数')
+    parser.add_argument('--block-size', type=int, default=30, help='区块自助法的区块长度（天）')
+    parser.add_argument('--confidence', type=float, default=0.95, help='置信水平')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数，默认CPU核数')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--output', help='将结果写入CSV或JSON文件')
+    args = parser.parse_args()
+
+    symbols = args.symbols.split(',')
+    horizons = [int(h) for h in args.horizons.split(',')]
+    edges = [float(e) for e in args.edges.split(',')] if args.edges else np.arange(0, 100 + args.bucket_size,
+                                                                                     args.bucket_size)
+    started = time.perf_counter()
+    frame = daily_frame(symbols, args.start, args.end)
+    if frame is None:
+        logger.error('没有可用的日线数据')
+        return 1
+    rows = event_study(frame, symbols, horizons, edges, args.bootstrap, args.block_size, args.workers, args.seed,
+                       args.confidence)
+    elapsed = time.perf_counter() - started
+
+    logger.info(f"{len(frame['date'])} 天 × {len(symbols)} 个币种 × {len(horizons)} 个持有期 × "
+                f"{len(edges) - 1} 个分桶，自助重采样 {args.bootstrap} 次，耗时 {elapsed:.1f} 秒")
+    confidence = f'{args.confidence * 100:.0f}%'
+    for row in rows:
+        logger.info(f"{row['symbol']} {row['horizon']:>3}天 FNG {row['fng_bucket']:>6}: 样本 {row['count']:>4}, "
+                    f"均值 {row['mean'] * 100:7.2f}% [{confidence}: {row['mean_ci_low'] * 100:.2f}%, "
+                    f"{row['mean_ci_high'] * 100:.2f}%], 中位数 {row['p50'] * 100:7.2f}%, "
+                    f"上涨比例 {row['hit_rate'] * 100:5.1f}%")
+    if args.output and rows:
+        write_results(rows, args.output)
+        logger.info(f'结果已写入 {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
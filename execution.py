@@ -0,0 +1,127 @@
+import logging
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+FILL_MODES = ('daily_avg', 'time', 'twap', 'vwap')
+
+
+class IntradayPrices:
+    """
+    常驻内存的5分钟价格序列，按日预先建立 [起始下标, 结束下标) 索引，成交价只需切片而无需查询数据库
+    """
+    def __init__(self, timestamps, prices):
+        self.timestamps = timestamps
+        self.prices = prices
+        days = timestamps.astype('datetime64[D]')
+        self.minutes = (timestamps - days).astype('timedelta64[m]').astype(np.int64)  # 当日第几分钟
+        unique_days, starts = np.unique(days, return_index=True)
+        ends = np.append(starts[1:], len(timestamps))
+        self.day_ranges = {str(day): (int(lo), int(hi)) for day, lo, hi in zip(unique_days, starts, ends)}
+
+    @classmethod
+    def from_cursor(cls, cursor, symbol, start_date, end_date=None):
+        """
+        一次查询加载某币种 [start_date, end_date) 的5分钟价格，end_date 为 None 时加载到最新
+
+        时间以整数秒、价格以 DOUBLE 返回（与 data_api.MySQLStore 相同），直接转换为数组，不逐行创建 datetime/Decimal 对象
+        """
+        conditions, params = ["symbol = %s", "price IS NOT NULL", "timestamp >= %s"], [symbol, start_date]
+        if end_date is not None:
+            conditions.append("timestamp < %s")
+            params.append(end_date)
+        query = f"""
+        SELECT TIMESTAMPDIFF(SECOND, '1970-01-01', timestamp), price * 1e0
+        FROM price_data
+        WHERE {' AND '.join(conditions)}
+        ORDER BY timestamp
+        """
+        with metrics.DB_QUERY_SECONDS.time(query='load_intraday'):
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        return cls(data[:, 0].astype(np.int64).astype('datetime64[s]'), data[:, 1])
+
+    def day(self, date_str):
+        """
+        返回某日的 (当日分钟数, 价格) 视图，无数据时返回 None
+        """
+        day_range = self.day_ranges.get(date_str)
+        if day_range is None:
+            return None
+        lo, hi = day_range
+        return self.minutes[lo:hi], self.prices[lo:hi]
+
+
+class ExecutionModel:
+    """
+    成交模型：按日内指定时间或时间加权均价成交，并计入手续费和滑点
+
+    参数:
+        mode: 'daily_avg' 使用日均价（原有行为）；'time' 使用 fill_time 时刻（或之后第一个）的5分钟价格；
+              'twap' 使用 [window_start, window_end) 区间的时间加权均价；
+              'vwap' 需要成交量，价格表未存储成交量，退化为 'twap'
+        fee_rate: 手续费率，按成交金额收取
+        slippage_bps: 滑点（基点），买入价格上浮、卖出价格下浮
+    """
+    def __init__(self, mode='daily_avg', fill_time='00:00', window_start='00:00', window_end='24:00',
+                 fee_rate=0.0, slippage_bps=0.0):
+        if mode not in FILL_MODES:
+            raise ValueError(f"未知的成交方式: {mode}，可选: {', '.join(FILL_MODES)}")
+        if mode == 'vwap':
+            logger.warning('price_data 未存储成交量，VWAP 按 TWAP 计算')
+            mode = 'twap'
+        self.mode = mode
+        self.fill_offset = _minutes(fill_time)
+        self.window = (_minutes(window_start), _minutes(window_end))
+        self.fee_rate = fee_rate
+        self.slippage = slippage_bps / 10000
+        self.intraday = {}
+
+    @property
+    def needs_intraday(self):
+        return self.mode != 'daily_avg'
+
+    def load(self, cursor, symbols, start_date, end_date=None):
+        """
+        预加载成交所需的5分钟数据，每个币种一次查询
+
+        参数:
+            start_date, end_date: 'YYYY-MM-DD' 格式的加载区间 [start_date, end_date)，end_date 为 None 时加载到最新
+        """
+        if not self.needs_intraday:
+            return
+        for symbol in symbols:
+            if symbol not in self.intraday:
+                self.intraday[symbol] = IntradayPrices.from_cursor(cursor, symbol, start_date, end_date)
+        logger.info('已加载日内价格: ' + ', '.join(f'{symbol} {len(series.prices)} 条'
+                                              for symbol, series in self.intraday.items()))
+
+    def fill_price(self, symbol, date_str, side, reference_price):
+        """
+        计算成交价；日内数据缺失时退回参考价（日均价），再按买卖方向加滑点
+        """
+        price = reference_price
+        if self.needs_intraday and symbol in self.intraday:
+            day = self.intraday[symbol].day(date_str)
+            if day is not None:
+                minutes, prices = day
+                if self.mode == 'time':
+                    index = int(np.searchsorted(minutes, self.fill_offset))
+                    if index < len(prices):
+                        price = float(prices[index])
+                else:
+                    lo, hi = np.searchsorted(minutes, self.window)
+                    if hi > lo:
+                        price = float(prices[lo:hi].mean())
+        if side == 'buy':
+            return price * (1 + self.slippage)
+        return price * (1 - self.slippage)
+
+
+def _minutes(clock):
+    hours, minutes = clock.split(':')
+    return int(hours) * 60 + int(minutes)
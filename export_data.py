@@ -0,0 +1,190 @@
+import argparse
+import csv
+import logging
+import time
+from datetime import datetime
+
+import pymysql
+
+import metrics
+from config import SYMBOLS, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'parquet', 'arrow')
+TABLES = ('price_data', 'fear_greed_index')
+EXPORT_CHUNK = 50000
+# 客户端写文件较慢时，服务端等待发送的超时时间（秒）
+NET_WRITE_TIMEOUT = 600
+
+
+def build_query(table, symbols=None, start=None, end=None):
+    """
+    生成导出查询，price_data 按 (symbol, timestamp) 唯一键顺序读取，无需额外排序
+
+    返回:
+        tuple: (列名, 数据查询, 行数查询, 参数)
+    """
+    conditions, params = [], []
+    if table == 'price_data':
+        columns = ('symbol', 'timestamp', 'price')
+        column = 'timestamp'
+        if symbols:
+            conditions.append(f"symbol IN ({', '.join(['%s'] * len(symbols))})")
+            params.extend(symbols)
+        order = 'symbol, timestamp'
+    elif table == 'fear_greed_index':
+        columns = ('date', 'value')
+        column = 'date'
+        order = 'date'
+    else:
+        raise ValueError(f"不支持导出的表: {table}")
+    if start:
+        conditions.append(f"{column} >= %s")
+        params.append(start)
+    if end:
+        conditions.append(f"{column} < %s")
+        params.append(end)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY {order}"
+    count_query = f"SELECT COUNT(*) FROM {table}{where}"
+    return columns, query, count_query, params
+
+
+def stream_chunks(conn, query, params, chunk_size=EXPORT_CHUNK):
+    """
+    通过无缓冲的服务端游标（SSCursor）逐块读取结果，内存中最多只有一个块
+    """
+    cursor = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cursor.execute(query, params)
+        while True:
+            with metrics.DB_QUERY_SECONDS.time(query='export_fetch_chunk'):
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # 未读完时关闭游标会读掉剩余结果，连接才能继续使用
+        cursor.close()
+
+
+class CsvWriter:
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowWriter:
+    """
+    Parquet（每块一个行组）或 Arrow IPC 文件写入器，需要安装 pyarrow
+    """
+    def __init__(self, path, columns, file_format):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise RuntimeError('导出 parquet/arrow 格式需要安装 pyarrow') from None
+        self.pa = pa
+        types = {'id': pa.int64(), 'symbol': pa.string(), 'timestamp': pa.timestamp('s'), 'price': pa.float64(),
+                 'date': pa.date32(), 'value': pa.int32()}
+        self.schema = pa.schema([(name, types[name]) for name in columns])
+        if file_format == 'parquet':
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows):
+        arrays = []
+        for field, values in zip(self.schema, zip(*rows)):
+            if field.name == 'price':
+                # DECIMAL 列按浮点导出，空价格保留为 null
+                values = [None if value is None else float(value) for value in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def open_writer(path, columns, file_format):
+    if file_format == 'csv':
+        return CsvWriter(path, columns)
+    if file_format in ('parquet', 'arrow'):
+        return ArrowWriter(path, columns, file_format)
+    raise ValueError(f"未知的导出格式: {file_format}，可选: {', '.join(FORMATS)}")
+
+
+def export_table(table, output, file_format='csv', symbols=None, start=None, end=None,
+                 chunk_size=EXPORT_CHUNK, progress_interval=5.0):
+    """
+    将 price_data 或 fear_greed_index 按币种/日期范围流式导出到文件
+
+    参数:
+        start, end: 时间范围 [start, end)，字符串或 datetime，为 None 时不限
+        progress_interval: 输出进度的最小间隔（秒）
+
+    返回:
+        int: 导出的行数，数据库不可用时返回 None
+    """
+    columns, query, count_query, params = build_query(table, symbols, start, end)
+    with get_db_connection() as conn:
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        cursor.execute(f"SET SESSION net_write_timeout = {NET_WRITE_TIMEOUT}")
+        with metrics.DB_QUERY_SECONDS.time(query='export_count'):
+            cursor.execute(count_query, params)
+            total = cursor.fetchone()[0]
+        cursor.close()
+        logger.info(f'开始导出 {table}: 共 {total} 行 -> {output} ({file_format})')
+
+        writer = open_writer(output, columns, file_format)
+        exported = 0
+        started = last_report = time.perf_counter()
+        try:
+            for rows in stream_chunks(conn, query, params, chunk_size):
+                writer.write(rows)
+                exported += len(rows)
+                now = time.perf_counter()
+                if now - last_report >= progress_interval:
+                    last_report = now
+                    percent = exported / total * 100 if total else 100
+                    logger.info(f'已导出 {exported}/{total} 行 ({percent:.1f}%), {exported / (now - started):.0f} 行/秒')
+        finally:
+            writer.close()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f'导出完成: {exported} 行，耗时 {elapsed:.1f} 秒')
+    return exported
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式导出 price_data / fear_greed_index 到 CSV、Parquet 或 Arrow 文件')
+    parser.add_argument('table', choices=TABLES, help='要导出的表')
+    parser.add_argument('output', help='输出文件路径')
+    parser.add_argument('--format', choices=FORMATS, help='导出格式，默认按输出文件扩展名判断')
+    parser.add_argument('--symbols', default=','.join(SYMBOLS), help='币种，逗号分隔（仅 price_data）')
+    parser.add_argument('--start', help='开始日期（含），如 2020-01-01')
+    parser.add_argument('--end', help='结束日期（不含），如 2024-01-01')
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK, help='每次从服务端读取的行数')
+    args = parser.parse_args()
+
+    file_format = args.format or {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}.get(
+        args.output[args.output.rfind('.'):].lower(), 'csv')
+    start = datetime.strptime(args.start, '%Y-%m-%d') if args.start else None
+    end = datetime.strptime(args.end, '%Y-%m-%d') if args.end else None
+    exported = export_table(args.table, args.output, file_format, args.symbols.split(','), start, end,
+                            args.chunk_size)
+    return 0 if exported is not None else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class FngCache:
+    """
+    贪婪恐惧指数读穿缓存：内存LRU -> fear_greed_index表 -> 网络
+
+    历史日期的值不会变化，命中后永久缓存；当天的值和所有空结果（当天尚未发布或网络、数据库暂时不可用）
+    只缓存 today_ttl 秒。同一日期的并发未命中只会触发一次加载，网络获取的历史数据会整体写入数据库，
+    写入成功后同一历史日期不会再次请求网络。
+    """
+    def __init__(self, fetch_history, save_history, max_entries=4096, today_ttl=3600):
+        self.fetch_history = fetch_history
+        self.save_history = save_history
+        self.max_entries = max_entries
+        self.today_ttl = today_ttl
+
+        self._entries = OrderedDict()  # 日期 -> (值, 过期时间或None)
+        self._inflight = {}  # 日期 -> threading.Event
+        self._lock = threading.Lock()
+        self._network_lock = threading.Lock()
+        self._fetched_from = None  # 已从网络获取并入库的最早日期，None表示尚未获取
+
+    def _lookup(self, date):
+        entry = self._entries.get(date, _MISSING)
+        if entry is _MISSING:
+            return _MISSING
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._entries[date]
+            return _MISSING
+        self._entries.move_to_end(date)
+        return value
+
+    def _store(self, date, value):
+        # 空结果可能来自暂时的故障，不能永久缓存
+        is_today = date >= datetime.now().strftime('%Y-%m-%d')
+        expires_at = time.monotonic() + self.today_ttl if is_today or value is None else None
+        self._entries[date] = (value, expires_at)
+        self._entries.move_to_end(date)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, date):
+        """
+        获取指定日期（YYYY-MM-DD）的贪婪恐惧指数，没有数据时返回None
+        """
+        while True:
+            with self._lock:
+                value = self._lookup(date)
+                if value is not _MISSING:
+                    return value
+                event = self._inflight.get(date)
+                if event is None:
+                    event = self._inflight[date] = threading.Event()
+                    break
+            # 其他线程正在加载同一日期，等待其结果
+            event.wait()
+
+        try:
+            value = self._load(date)
+            with self._lock:
+                self._store(date, value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[date]
+            event.set()
+
+    def _load(self, date):
+        value = self._load_from_database(date)
+        if value is not None:
+            return value
+
+        with self._network_lock:
+            if self._fetched_from is not None and date >= self._fetched_from:
+                # 已从网络获取过覆盖该日期的数据（可能由等待期间的其他线程完成），以数据库为准
+                value = self._load_from_database(date)
+                if value is not None or date < datetime.now().strftime('%Y-%m-%d'):
+                    return value
+            return self._load_from_network(date)
+
+    def _load_from_database(self, date):
+        try:
+            with get_db_connection() as conn:
+                if not conn:
+                    return None
+                cursor = conn.cursor()
+                cursor.execute("SELECT value FROM fear_greed_index WHERE date = %s", (date,))
+                row = cursor.fetchone()
+                cursor.close()
+                return int(row[0]) if row else None
+        except Exception as error:
+            logger.error(f'从数据库读取 {date} 贪婪恐惧指数失败: {error}')
+            return None
+
+    def _database_date_range(self):
+        try:
+            with get_db_connection() as conn:
+                if not conn:
+                    return None
+                cursor = conn.cursor()
+                cursor.execute("SELECT MIN(date), MAX(date) FROM fear_greed_index")
+                row = cursor.fetchone()
+                cursor.close()
+                return row if row and row[1] else None
+        except Exception as error:
+            logger.error(f'读取贪婪恐惧指数日期范围失败: {error}')
+            return None
+
+    def _load_from_network(self, date):
+        # 数据库最新日期早于该日期时只增量获取，否则获取完整历史
+        bounds = self._database_date_range()
+        start_date = None
+        if bounds and str(bounds[1]) < date:
+            start_date = bounds[1]
+
+        history = self.fetch_history(start_date)
+        if history:
+            saved = self.save_history(history)
+            with self._lock:
+                for item_date, item_value in history.items():
+                    if item_date != date:
+                        self._store(item_date, item_value)
+
+            # 只有历史数据确实入库后，之后的未命中才能以数据库为准；获取或写入失败时下次仍请求网络
+            if saved:
+                fetched_from = str(start_date + timedelta(days=1)) if start_date else '0000-00-00'
+                if self._fetched_from is None or fetched_from < self._fetched_from:
+                    self._fetched_from = fetched_from
+
+        value = history.get(date) if history else None
+        if value is None:
+            logger.warning(f'未找到 {date} 的贪婪恐惧指数')
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
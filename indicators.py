@@ -0,0 +1,511 @@
+import argparse
+import json
+import logging
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+from config import SYMBOLS, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# ==================== 批量计算（沿最后一维向量化，可用于回测和蒙特卡洛路径） ====================
+
+
+def sma(values, window):
+    """
+    N期简单均线，前N-1期使用累计均值
+    """
+    values = np.asarray(values, dtype=np.float64)
+    cumulative = np.cumsum(values, axis=-1)
+    count = np.minimum(np.arange(1, values.shape[-1] + 1), window)
+    shifted = np.zeros_like(cumulative)
+    shifted[..., window:] = cumulative[..., :-window]
+    return (cumulative - shifted) / count
+
+
+def _ema(values, alpha, carry=None):
+    """
+    y[t] = y[t-1] + alpha * (x[t] - y[t-1])，carry 为序列之前的 y，为 None 时以首个值起始
+
+    分块用闭式解计算：块内 y[j] = d^(j+1) * (carry + alpha * Σ d^-(k+1) * x[k])，d = 1 - alpha，
+    块长保证 d^-块长 不溢出
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(values)
+    if values.shape[-1] == 0:
+        return out
+    carry = values[..., 0].copy() if carry is None else np.asarray(carry, dtype=np.float64)
+    decay = 1.0 - alpha
+    if decay <= 0:
+        out[...] = values
+        return out
+    block = int(min(max(150 * np.log(10) / -np.log(decay), 1), 1024)) if decay < 1 else values.shape[-1]
+    for lo in range(0, values.shape[-1], block):
+        chunk = values[..., lo:lo + block]
+        powers = decay ** np.arange(1, chunk.shape[-1] + 1)
+        out[..., lo:lo + block] = powers * (carry[..., None] + alpha * np.cumsum(chunk / powers, axis=-1))
+        carry = out[..., lo + chunk.shape[-1] - 1]
+    return out
+
+
+def ema(values, span):
+    """
+    指数移动平均，alpha = 2 / (span + 1)，以首个值起始
+    """
+    return _ema(values, 2.0 / (span + 1))
+
+
+def _rsi_averages(values, period):
+    deltas = np.diff(np.asarray(values, dtype=np.float64), axis=-1)
+    gains = np.maximum(deltas, 0.0)
+    losses = np.maximum(-deltas, 0.0)
+    if deltas.shape[-1] < period:
+        return None, None
+    # 前 period 个变化取简单平均作为起点，之后按 Wilder 平滑（alpha = 1 / period）
+    seed_gain = gains[..., :period].mean(axis=-1)
+    seed_loss = losses[..., :period].mean(axis=-1)
+    avg_gain = np.concatenate((seed_gain[..., None], _ema(gains[..., period:], 1.0 / period, seed_gain)), axis=-1)
+    avg_loss = np.concatenate((seed_loss[..., None], _ema(losses[..., period:], 1.0 / period, seed_loss)), axis=-1)
+    return avg_gain, avg_loss
+
+
+def _rsi_value(avg_gain, avg_loss):
+    avg_gain = np.asarray(avg_gain, dtype=np.float64)
+    avg_loss = np.asarray(avg_loss, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    value = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), value)
+    return value
+
+
+def rsi(values, period=14):
+    """
+    Wilder RSI，前 period 期为 NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    avg_gain, avg_loss = _rsi_averages(values, period)
+    if avg_gain is not None:
+        out[..., period:] = _rsi_value(avg_gain, avg_loss)
+    return out
+
+
+def volatility(values, window=30, annualization=1):
+    """
+    对数收益率的滚动样本标准差，乘以 sqrt(annualization) 年化；收益率不足 window 期时为 NaN
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    returns = np.diff(np.log(values), axis=-1)
+    if returns.shape[-1] >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(returns, window, axis=-1)
+        out[..., window:] = windows.std(axis=-1, ddof=1) * np.sqrt(annualization)
+    return out
+
+
+# ==================== 增量计算（每根K线 O(1)，状态可序列化） ====================
+
+
+class Indicator:
+    """
+    增量指标基类：update 每根K线 O(1) 更新并返回当前值，batch 为等价的向量化计算，
+    backfill 批量计算历史并把状态设置为序列末尾，之后可继续增量更新
+    """
+    def spec(self):
+        raise NotImplementedError
+
+    def update(self, value):
+        raise NotImplementedError
+
+    def batch(self, values):
+        raise NotImplementedError
+
+    def backfill(self, values):
+        raise NotImplementedError
+
+    def state(self):
+        return dict(self.__dict__)
+
+    def load_state(self, state):
+        self.__dict__.update(state)
+
+
+class SMA(Indicator):
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.count = 0
+
+    def spec(self):
+        return f'sma({self.window})'
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+        self.count += 1
+        if self.count % self.window == 0:
+            # 定期重新求和，避免长期累加的浮点误差
+            self.total = float(sum(self.values))
+        return self.total / len(self.values)
+
+    def batch(self, values):
+        return sma(values, self.window)
+
+    def backfill(self, values):
+        self.values = deque((float(v) for v in values[-self.window:]), maxlen=self.window)
+        self.total = float(sum(self.values))
+        self.count = len(values)
+        return self.batch(values)
+
+    def state(self):
+        return {'values': list(self.values), 'count': self.count}
+
+    def load_state(self, state):
+        self.values = deque(state['values'], maxlen=self.window)
+        self.total = float(sum(self.values))
+        self.count = state['count']
+
+
+class EMA(Indicator):
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+
+    def spec(self):
+        return f'ema({self.span})'
+
+    def update(self, value):
+        self.value = value if self.value is None else self.value + self.alpha * (value - self.value)
+        return self.value
+
+    def batch(self, values):
+        return ema(values, self.span)
+
+    def backfill(self, values):
+        out = self.batch(values)
+        self.value = float(out[-1]) if len(out) else None
+        return out
+
+    def state(self):
+        return {'value': self.value}
+
+
+class RSI(Indicator):
+    def __init__(self, period=14):
+        self.period = period
+        self.previous = None
+        self.deltas = 0
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def spec(self):
+        return f'rsi({self.period})'
+
+    def update(self, value):
+        if self.previous is None:
+            self.previous = value
+            return np.nan
+        delta = value - self.previous
+        self.previous = value
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        self.deltas += 1
+        if self.deltas <= self.period:
+            # 预热期累计简单平均
+            self.avg_gain += (gain - self.avg_gain) / self.deltas
+            self.avg_loss += (loss - self.avg_loss) / self.deltas
+            if self.deltas < self.period:
+                return np.nan
+        else:
+            self.avg_gain += (gain - self.avg_gain) / self.period
+            self.avg_loss += (loss - self.avg_loss) / self.period
+        return float(_rsi_value(self.avg_gain, self.avg_loss))
+
+    def batch(self, values):
+        return rsi(values, self.period)
+
+    def backfill(self, values):
+        self.__init__(self.period)
+        if len(values) <= self.period:
+            # 不足一个周期时逐根更新即可
+            return np.array([self.update(float(v)) for v in values])
+        avg_gain, avg_loss = _rsi_averages(values, self.period)
+        self.previous = float(values[-1])
+        self.deltas = len(values) - 1
+        self.avg_gain = float(avg_gain[-1])
+        self.avg_loss = float(avg_loss[-1])
+        return self.batch(values)
+
+
+class Volatility(Indicator):
+    def __init__(self, window=30, annualization=1):
+        self.window = window
+        self.annualization = annualization
+        self.previous = None
+        self.returns = deque(maxlen=window)
+
+    def spec(self):
+        return f'volatility({self.window},{self.annualization})'
+
+    def update(self, value):
+        if self.previous is not None:
+            self.returns.append(float(np.log(value / self.previous)))
+        self.previous = value
+        if len(self.returns) < self.window:
+            return np.nan
+        # 窗口固定为 window 个收益率，直接计算与批量结果完全一致
+        return float(np.std(self.returns, ddof=1) * np.sqrt(self.annualization))
+
+    def batch(self, values):
+        return volatility(values, self.window, self.annualization)
+
+    def backfill(self, values):
+        self.previous = float(values[-1]) if len(values) else None
+        self.returns = deque(np.diff(np.log(np.asarray(values[-self.window - 1:], dtype=np.float64))).tolist(),
+                             maxlen=self.window)
+        return self.batch(values)
+
+    def state(self):
+        return {'previous': self.previous, 'returns': list(self.returns)}
+
+    def load_state(self, state):
+        self.previous = state['previous']
+        self.returns = deque(state['returns'], maxlen=self.window)
+
+
+def default_indicators(symbols=None):
+    """
+    默认指标：各币种均线、RSI、年化波动率，以及贪婪恐惧指数均线
+    """
+    specs = {}
+    for symbol in symbols or SYMBOLS:
+        prefix = symbol.lower()
+        specs[f'{prefix}_sma_50'] = (symbol, SMA(50))
+        specs[f'{prefix}_sma_200'] = (symbol, SMA(200))
+        specs[f'{prefix}_ema_20'] = (symbol, EMA(20))
+        specs[f'{prefix}_rsi_14'] = (symbol, RSI(14))
+        specs[f'{prefix}_volatility_30'] = (symbol, Volatility(30, 365))
+    specs['fng_sma_7'] = ('fng', SMA(7))
+    specs['fng_ema_30'] = ('fng', EMA(30))
+    return specs
+
+
+class IndicatorEngine:
+    """
+    按K线驱动一组指标：历史用 backfill 批量计算，新K线用 update 增量计算，状态保存在 indicator_state 表
+
+    参数:
+        specs: 输出名 -> (数据源, Indicator)，数据源为币种或 'fng'，与 data_api.load_series 的列名一致
+        interval: K线间隔，与 data_api.INTERVALS 一致
+    """
+    def __init__(self, name='default', specs=None, interval='1d'):
+        self.name = name
+        self.specs = specs if specs is not None else default_indicators()
+        self.interval = interval
+        self.last_timestamp = None  # 最后处理的K线时间（datetime64[s]）
+        self.latest = {}
+        # 缺失或数据源不完整的K线时间；这些K线被修复后增量状态不再等同于批量结果，需要重新回填
+        self.gaps = []
+
+    def signature(self):
+        """
+        指标配置签名，配置变化后已保存的状态失效
+        """
+        return {name: [source, indicator.spec()] for name, (source, indicator) in sorted(self.specs.items())}
+
+    def sources(self):
+        return sorted({source for source, _ in self.specs.values()})
+
+    def step(self):
+        import data_api
+        return np.timedelta64(data_api.INTERVALS[self.interval], 's')
+
+    def _missing_between(self, previous, timestamp):
+        """
+        previous 与 timestamp 之间没有出现的K线时间
+        """
+        return list(np.arange(previous + self.step(), timestamp, self.step()))
+
+    def backfill(self, series):
+        """
+        批量计算整段历史（如 data_api.load_series 的结果），缺失值不参与计算且对应输出为 NaN
+
+        返回:
+            dict: 输出名 -> 与 series['timestamp'] 等长的数组
+        """
+        outputs = {}
+        timestamps = np.asarray(series['timestamp'], dtype='datetime64[s]')
+        incomplete = np.zeros(len(timestamps), dtype=bool)
+        for name, (source, indicator) in self.specs.items():
+            values = np.asarray(series[source], dtype=np.float64)
+            valid = ~np.isnan(values)
+            column = np.full(len(values), np.nan)
+            column[valid] = indicator.backfill(values[valid])
+            outputs[name] = column
+            # 数据源开始之前的缺失不算缺口
+            if valid.any():
+                incomplete[valid.argmax():] |= ~valid[valid.argmax():]
+        self.gaps = timestamps[incomplete].tolist()
+        if len(timestamps) > 1:
+            skipped = np.nonzero(np.diff(timestamps) > self.step())[0]
+            for i in skipped:
+                self.gaps.extend(self._missing_between(timestamps[i], timestamps[i + 1]))
+        self.gaps = sorted(np.datetime64(gap, 's') for gap in self.gaps)
+        if len(timestamps):
+            self.last_timestamp = timestamps[-1]
+            self.latest = {name: _to_json(column[-1]) for name, column in outputs.items()}
+        return outputs
+
+    def update(self, timestamp, bar):
+        """
+        处理一根新K线，已处理过的时间直接忽略；缺失的数据源不更新对应指标，该K线和中间跳过的K线记入 gaps
+
+        返回:
+            dict: 输出名 -> 当前值，K线已处理过时返回 None
+        """
+        timestamp = np.datetime64(timestamp, 's')
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return None
+        if self.last_timestamp is not None:
+            self.gaps.extend(self._missing_between(self.last_timestamp, timestamp))
+        values = {}
+        for name, (source, indicator) in self.specs.items():
+            value = bar.get(source)
+            values[name] = np.nan if value is None or np.isnan(value) else indicator.update(float(value))
+        if any(bar.get(source) is None or np.isnan(bar.get(source)) for source in self.sources()):
+            self.gaps.append(timestamp)
+        self.last_timestamp = timestamp
+        self.latest = {name: _to_json(value) for name, value in values.items()}
+        return values
+
+    def state(self):
+        return {'signature': self.signature(),
+                'indicators': {name: indicator.state() for name, (_, indicator) in self.specs.items()},
+                'gaps': [str(gap) for gap in self.gaps]}
+
+    def repaired_gaps(self, series):
+        """
+        返回 series 中已补齐全部数据源的缺口K线时间
+        """
+        if not self.gaps:
+            return []
+        timestamps = np.asarray(series['timestamp'], dtype='datetime64[s]')
+        complete = np.ones(len(timestamps), dtype=bool)
+        for source in self.sources():
+            complete &= ~np.isnan(np.asarray(series[source], dtype=np.float64))
+        return [gap for gap in timestamps[complete] if gap in set(self.gaps)]
+
+    def load(self):
+        """
+        从 indicator_state 读取状态，没有状态或配置已变化时返回 False
+        """
+        with get_db_connection() as conn:
+            if not conn:
+                return False
+            cursor = conn.cursor()
+            cursor.execute("SELECT last_timestamp, state, latest_values FROM indicator_state WHERE engine = %s AND bar_interval = %s",
+                           (self.name, self.interval))
+            row = cursor.fetchone()
+            cursor.close()
+        if not row:
+            return False
+        state = json.loads(row[1])
+        if state['signature'] != self.signature():
+            logger.info(f'指标配置已变化，重新计算 {self.name}')
+            return False
+        for name, (_, indicator) in self.specs.items():
+            indicator.load_state(state['indicators'][name])
+        self.gaps = [np.datetime64(gap, 's') for gap in state.get('gaps', [])]
+        self.last_timestamp = np.datetime64(row[0], 's')
+        self.latest = json.loads(row[2])
+        return True
+
+    def save(self):
+        with get_db_connection() as conn:
+            if not conn:
+                return
+            cursor = conn.cursor()
+            with metrics.DB_QUERY_SECONDS.time(query='save_indicator_state'):
+                cursor.execute("""
+                INSERT INTO indicator_state (engine, bar_interval, last_timestamp, state, latest_values)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE last_timestamp = VALUES(last_timestamp), state = VALUES(state),
+                                        latest_values = VALUES(latest_values)
+                """, (self.name, self.interval, str(self.last_timestamp).replace('T', ' '),
+                      json.dumps(self.state()), json.dumps(self.latest)))
+                conn.commit()
+            cursor.close()
+
+
+def _to_json(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def update_indicators(engine=None, store=None, rebuild=False):
+    """
+    定时任务入口：有保存的状态时只增量处理之后已收盘的K线，否则批量回填全部历史；
+    之前缺失或不完整的K线已被补齐时也重新批量回填，保证增量结果与批量计算一致
+
+    返回:
+        dict: 最新的指标值
+    """
+    import data_api
+
+    engine = engine or IndicatorEngine()
+    # 实时任务直接读取 MySQL，避免本地快照滞后
+    store = store or data_api.MySQLStore()
+    step = engine.step()
+    # 只处理已收盘的K线：结束时间取当前本地时间向下对齐到K线间隔（price_data 以本地时间存储）
+    now = np.datetime64(datetime.now(), 's')
+    end = now - now.astype(np.int64) % step.astype(np.int64)
+    symbols = [source for source in engine.sources() if source != 'fng']
+
+    with_fng = 'fng' in engine.sources()
+    incremental = not rebuild and engine.load()
+    if incremental and engine.gaps:
+        # 缺口被修复（如完整性检查补齐了数据）后，增量状态缺少这些K线，重新批量回填
+        repaired = engine.repaired_gaps(data_api.load_series(symbols, engine.interval, min(engine.gaps),
+                                                             max(engine.gaps) + step, with_fng, store))
+        if repaired:
+            logger.info(f'{len(repaired)} 根缺失的K线已补齐（最早 {repaired[0]}），重新回填指标')
+            incremental = False
+    if incremental:
+        start = engine.last_timestamp + step
+        if start >= end:
+            return engine.latest
+        series = data_api.load_series(symbols, engine.interval, start, end, with_fng, store)
+        processed = 0
+        for i, timestamp in enumerate(series['timestamp']):
+            if engine.update(timestamp, {source: series[source][i] for source in engine.sources()}) is not None:
+                processed += 1
+        logger.info(f'指标增量更新 {processed} 根K线')
+    else:
+        series = data_api.load_series(symbols, engine.interval, None, end, with_fng, store)
+        engine.backfill(series)
+        logger.info(f"指标批量回填 {len(series['timestamp'])} 根K线")
+
+    if engine.last_timestamp is not None:
+        engine.save()
+    return engine.latest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='更新技术指标（增量，首次运行批量回填）并输出最新值')
+    parser.add_argument('--interval', default='1d', help='K线间隔：5m、15m、1h、4h 或 1d')
+    parser.add_argument('--rebuild', action='store_true', help='忽略已保存的状态，重新回填全部历史')
+    args = parser.parse_args()
+
+    latest = update_indicators(IndicatorEngine(interval=args.interval), rebuild=args.rebuild)
+    for name, value in sorted(latest.items()):
+        logger.info(f'{name}: {value}')
+
+
+if __name__ == '__main__':
+    main()
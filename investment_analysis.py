@@ -1,9 +1,25 @@
 # 导入必要的库
+import argparse
+import bisect
+import contextlib
+import json
+import logging
 import os
+import time
+import numpy as np
 import pymysql
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import metrics
+import migrations
+import performance
+from execution import ExecutionModel, FILL_MODES
+import profiling
+import result_cache
+import strategies
+from config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB, get_db_connection, logger
+
 load_dotenv()
 
 # MySQL数据库配置
@@ -39,18 +55,82 @@ INVESTMENT_STRATEGY = {
     ]
 }
 
+# 交易记录每条批量插入语句的最大行数
+TRADE_INSERT_CHUNK = 1000
+
+# 缓存命中时需要恢复的账户状态
+CACHED_STATE = ('current_funds', 'btc_holdings', 'eth_holdings', 'btc_average_price', 'eth_average_price',
+                'total_fees', 'last_buy_date', 'last_sell_date')
+
+
+def format_trade_note(trade_record):
+    """
+    生成交易备注，包含贪恐指数；仅在写入数据库时调用
+    """
+    action = '买入' if trade_record['trade_type'] == 'buy' else '卖出'
+    return (f"当日贪恐指数: {trade_record['fng']} - 交易类型: {trade_record['trade_type']} - "
+            f"以${trade_record['btc_trade_price']:.2f}价格{action}{trade_record['btc_trade_amount']:.6f}BTC - "
+            f"以${trade_record['eth_trade_price']:.2f}价格{action}{trade_record['eth_trade_amount']:.6f}ETH")
+
+
+def prune_runs(keep=None, older_than_days=None):
+    """
+    批量删除旧的回测运行及其交易记录
+
+    参数:
+        keep: 保留最近的运行数
+        older_than_days: 删除早于该天数的运行
+
+    返回:
+        int: 删除的运行数
+    """
+    conditions, params = [], []
+    if keep is not None:
+        # MySQL 不支持在 IN 子查询中使用 LIMIT，用派生表包一层
+        conditions.append("id NOT IN (SELECT id FROM (SELECT id FROM trade_runs ORDER BY id DESC LIMIT %s) AS recent)")
+        params.append(keep)
+    if older_than_days is not None:
+        conditions.append("created_at < NOW() - INTERVAL %s DAY")
+        params.append(older_than_days)
+    if not conditions:
+        return 0
+    
+    with get_db_connection() as conn:
+        if not conn:
+            return 0
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT id FROM trade_runs WHERE {' AND '.join(conditions)}", params)
+        run_ids = [row[0] for row in cursor.fetchall()]
+        for i in range(0, len(run_ids), TRADE_INSERT_CHUNK):
+            chunk = run_ids[i:i + TRADE_INSERT_CHUNK]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM trade_records WHERE run_id IN ({placeholders})", chunk)
+            cursor.execute(f"DELETE FROM trade_runs WHERE id IN ({placeholders})", chunk)
+            conn.commit()
+        cursor.close()
+    logger.info("已删除 %d 次回测运行", len(run_ids))
+    return len(run_ids)
+
+
 class InvestmentAnalyzer:
     """
     加密货币投资策略分析器
     基于贪婪恐惧指数进行投资决策
     """
-    def __init__(self, initial_funds=None, investment_strategy=None):
+    def __init__(self, initial_funds=None, investment_strategy=None, log_trades=True, trade_log=None,
+                 persist_trades=True, execution=None, result_cache=None, strategy=None):
         """
         初始化投资分析器
         
         Args:
             initial_funds: 初始资金
             investment_strategy: 投资策略配置
+            log_trades: 是否逐笔输出交易日志，False 时只输出总结
+            trade_log: 交易记录 JSON Lines 文件路径，为 None 时不写入
+            persist_trades: 是否登记回测运行并保存交易，滚动回测等批量模拟时关闭
+            execution: execution.ExecutionModel 成交模型，为 None 时按日均价成交且不收手续费
+            result_cache: result_cache.ResultCache 回测结果缓存，为 None 时每次都完整模拟
+            strategy: strategies.Strategy 回测策略，为 None 时按 investment_strategy 使用贪婪恐惧分档策略
         """
         # 使用传入的配置或全局配置作为默认值
         self.initial_funds = initial_funds if initial_funds is not None else INITIAL_FUNDS
@@ -64,8 +144,22 @@ class InvestmentAnalyzer:
         self.last_sell_date = None  # 上次卖出日期
         
         self.investment_strategy = investment_strategy if investment_strategy is not None else INVESTMENT_STRATEGY
+        self.strategy = strategy if strategy is not None else strategies.build_strategy('fng_tiers',
+                                                                                        self.investment_strategy)
+        self.compiled_signals = None  # 预加载后由 compile_strategy 生成的每日信号
         
-        self.create_trade_table()  # 创建交易记录表
+        self.log_trades = log_trades
+        self.trade_log = trade_log
+        self._trade_stream = None
+        self.persist_trades = persist_trades
+        self.execution = execution
+        self.fee_rate = execution.fee_rate if execution is not None else 0
+        self.total_fees = 0  # 累计手续费
+        self.equity_dates = None  # 权益曲线日期
+        self.equity = None  # 每日权益
+        self.performance = {}  # 风险与收益指标
+        self.run_id = None  # trade_runs 中的回测运行ID
+        self.result_cache = result_cache
     
     def get_db_connection(self):
         """
@@ -86,7 +180,7 @@ class InvestmentAnalyzer:
                 )
                 yield conn
             except Exception as error:
-                print('数据库连接失败:', str(error))
+                logger.error('数据库连接失败: %s', error)
                 yield None
             finally:
                 if conn:
@@ -98,54 +192,48 @@ class InvestmentAnalyzer:
         更新数据，从最新日期开始获取到当前日期的数据
         注意：实际数据获取由main.py中的相关函数处理
         """
-        print("正在检查数据...")
-        print("数据更新完成")
+        logger.info("正在检查数据...")
+        logger.info("数据更新完成")
         return True
     
-    def create_trade_table(self):
+    def run_parameters(self):
+        """
+        本次回测的策略和成交参数，保存到 trade_runs 以便区分不同运行
+        """
+        parameters = {'investment_strategy': self.investment_strategy, 'strategy': self.strategy.describe()}
+        if self.execution is not None:
+            parameters['execution'] = {
+                'mode': self.execution.mode,
+                'fill_offset': self.execution.fill_offset,
+                'window': list(self.execution.window),
+                'fee_rate': self.execution.fee_rate,
+                'slippage': self.execution.slippage
+            }
+        return parameters
+    
+    def start_run(self, start_date, end_date):
         """
-        创建交易记录表
-        存在则删除再创建
+        在 trade_runs 中登记本次回测，返回运行ID；数据库不可用时返回 None
         """
         with self.get_db_connection() as conn:
             if not conn:
-                return
+                return None
             
             cursor = conn.cursor()
-            
-            cursor.execute("DROP TABLE IF EXISTS trade_records")
-            
-            create_table_sql = """
-            CREATE TABLE trade_records (
-                id INT AUTO_INCREMENT PRIMARY KEY COMMENT '交易记录ID',
-                trade_date DATE NOT NULL COMMENT '交易日期',
-                trade_type VARCHAR(10) NOT NULL COMMENT '交易类型：buy或sell',
-                btc_trade_amount DECIMAL(20, 8) NOT NULL COMMENT 'BTC交易数量',
-                btc_trade_value DECIMAL(20, 2) NOT NULL COMMENT 'BTC交易金额',
-                btc_trade_price DECIMAL(20, 2) NOT NULL COMMENT 'BTC交易时价格',
-                eth_trade_amount DECIMAL(20, 8) NOT NULL COMMENT 'ETH交易数量',
-                eth_trade_value DECIMAL(20, 2) NOT NULL COMMENT 'ETH交易金额',
-                eth_trade_price DECIMAL(20, 2) NOT NULL COMMENT 'ETH交易时价格',
-                total_trade_value DECIMAL(20, 2) NOT NULL COMMENT '交易总金额',
-                btc_holdings DECIMAL(20, 8) NOT NULL COMMENT 'BTC持仓数量',
-                eth_holdings DECIMAL(20, 8) NOT NULL COMMENT 'ETH持仓数量',
-                btc_average_price DECIMAL(20, 2) NOT NULL COMMENT 'BTC持仓均价',
-                eth_average_price DECIMAL(20, 2) NOT NULL COMMENT 'ETH持仓均价',
-                remaining_usd DECIMAL(20, 2) NOT NULL COMMENT '剩余资金（USD）',
-                account_total DECIMAL(20, 2) NOT NULL COMMENT '账户总价值',
-                trade_note TEXT NOT NULL COMMENT '交易备注',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间'
-            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='交易记录表';
-            """
-            
-            cursor.execute(create_table_sql)
+            cursor.execute("""
+            INSERT INTO trade_runs (parameters, initial_funds, start_date, end_date)
+            VALUES (%s, %s, %s, %s)
+            """, (json.dumps(self.run_parameters(), ensure_ascii=False), self.initial_funds,
+                  start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')))
+            run_id = cursor.lastrowid
             conn.commit()
-            print("交易记录表已重新创建")
             cursor.close()
+            logger.info("回测运行ID: %s", run_id)
+            return run_id
     
-    def save_trade_to_database(self, trade_record):
+    def save_trades_to_database(self, run_id, trade_records):
         """
-        将交易记录保存到数据库
+        分块批量写入本次运行的交易记录，并将运行标记为完成
         """
         with self.get_db_connection() as conn:
             if not conn:
@@ -155,13 +243,14 @@ class InvestmentAnalyzer:
             
             insert_sql = """
             INSERT INTO trade_records (
-                trade_date, trade_type, btc_trade_amount, btc_trade_value, btc_trade_price, 
+                run_id, trade_date, trade_type, btc_trade_amount, btc_trade_value, btc_trade_price, 
                 eth_trade_amount, eth_trade_value, eth_trade_price, total_trade_value, 
                 btc_holdings, eth_holdings, btc_average_price, eth_average_price, 
                 remaining_usd, account_total, trade_note
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """
-            cursor.execute(insert_sql, (
+            rows = [(
+                run_id,
                 trade_record['trade_date'],
                 trade_record['trade_type'],
                 trade_record.get('btc_trade_amount', 0),
@@ -172,21 +261,78 @@ class InvestmentAnalyzer:
                 trade_record.get('eth_trade_price', 0),
                 trade_record['total_trade_value'],
                 trade_record['btc_holdings'],
-                trade_record.get('eth_holdings', self.eth_holdings),
+                trade_record['eth_holdings'],
                 trade_record.get('btc_average_price', 0),
                 trade_record.get('eth_average_price', 0),
                 trade_record['remaining_usd'],
                 trade_record['account_total'],
-                trade_record.get('trade_note', '')
-            ))
-            conn.commit()
+                format_trade_note(trade_record)
+            ) for trade_record in trade_records]
+            
+            with metrics.DB_QUERY_SECONDS.time(query='insert_trade_records'):
+                for i in range(0, len(rows), TRADE_INSERT_CHUNK):
+                    cursor.executemany(insert_sql, rows[i:i + TRADE_INSERT_CHUNK])
+                cursor.execute("""
+                UPDATE trade_runs SET status = 'finished', trade_count = %s, finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """, (len(rows), run_id))
+                conn.commit()
+            metrics.ROWS_WRITTEN.inc(len(rows), table='trade_records')
             cursor.close()
+            logger.info("已保存 %d 条交易记录（运行ID: %s）", len(rows), run_id)
     
-    def preload_data(self):
+    def result_cache_key(self, start_date, end_date):
+        """
+        由回测参数和当前数据水位生成缓存键，数据库不可用时返回 None
+        """
+        with self.get_db_connection() as conn:
+            if not conn:
+                return None
+            cursor = conn.cursor()
+            watermark = result_cache.data_watermark(cursor)
+            cursor.close()
+        parameters = {**self.run_parameters(), 'initial_funds': self.initial_funds,
+                      'start_date': start_date.strftime('%Y-%m-%d'), 'end_date': end_date.strftime('%Y-%m-%d')}
+        return result_cache.cache_key(parameters, watermark)
+    
+    def cached_result(self, end_date):
+        """
+        缓存内容：交易记录、最终账户状态、总结所需的期末价格、权益曲线和风险指标
+        """
+        end_str = end_date.strftime('%Y-%m-%d')
+        return {
+            'trade_records': self.trade_records,
+            'state': {name: getattr(self, name) for name in CACHED_STATE},
+            'final_prices': {symbol: self.get_daily_average_price(symbol, end_str) for symbol in ('BTC', 'ETH')},
+            'equity_dates': [str(date) for date in self.equity_dates.tolist()] if self.equity_dates is not None else [],
+            'equity': self.equity.tolist() if self.equity is not None else [],
+            'performance': self.performance
+        }
+    
+    def restore_result(self, cached, end_date):
+        """
+        从缓存恢复回测结果；交易按原顺序重新记录，以便照常输出日志和写入 JSON Lines
+        """
+        for trade_record in cached['trade_records']:
+            self.record_trade(trade_record)
+        for name, value in cached['state'].items():
+            setattr(self, name, value)
+        end_str = end_date.strftime('%Y-%m-%d')
+        # 总结只需要期末价格，不再预加载全部日均价
+        self.daily_prices = {symbol: {end_str: price} for symbol, price in cached['final_prices'].items()
+                             if price is not None}
+        self.equity_dates = np.array(cached['equity_dates'], dtype='datetime64[D]')
+        self.equity = np.array(cached['equity'], dtype=np.float64)
+        self.performance = cached['performance']
+    
+    def preload_data(self, end_date=None):
         """
         预加载所有需要的数据，减少数据库连接次数
+        
+        Args:
+            end_date: 回测结束时间，成交模型只加载到当天为止的5分钟数据；为 None 时加载到最新
         """
-        print("正在预加载数据...")
+        logger.info("正在预加载数据...")
         
         with self.get_db_connection() as conn:
             if not conn:
@@ -202,8 +348,10 @@ class InvestmentAnalyzer:
             WHERE symbol = 'BTC' AND DATE(timestamp) >= '2020-01-01'
             GROUP BY DATE(timestamp)
             """
-            cursor.execute(query)
-            for row in cursor.fetchall():
+            with metrics.DB_QUERY_SECONDS.time(query='preload'):
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            for row in rows:
                 date_str = row[0].strftime('%Y-%m-%d') if hasattr(row[0], 'strftime') else str(row[0])
                 self.daily_prices['BTC'][date_str] = float(row[1])
             
@@ -213,8 +361,10 @@ class InvestmentAnalyzer:
             WHERE symbol = 'ETH' AND DATE(timestamp) >= '2020-01-01'
             GROUP BY DATE(timestamp)
             """
-            cursor.execute(query)
-            for row in cursor.fetchall():
+            with metrics.DB_QUERY_SECONDS.time(query='preload'):
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            for row in rows:
                 date_str = row[0].strftime('%Y-%m-%d') if hasattr(row[0], 'strftime') else str(row[0])
                 self.daily_prices['ETH'][date_str] = float(row[1])
             
@@ -225,34 +375,63 @@ class InvestmentAnalyzer:
             WHERE date >= '2020-01-01'
             ORDER BY date
             """
-            cursor.execute(query)
-            for row in cursor.fetchall():
+            with metrics.DB_QUERY_SECONDS.time(query='preload'):
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            for row in rows:
                 date_str = row[0].strftime('%Y-%m-%d') if hasattr(row[0], 'strftime') else str(row[0])
                 self.daily_fng[date_str] = int(row[1])
             
+            # 成交模型需要的5分钟数据一次性载入内存
+            if self.execution is not None:
+                intraday_end = (end_date + timedelta(days=1)).strftime('%Y-%m-%d') if end_date else None
+                self.execution.load(cursor, ('BTC', 'ETH'), '2020-01-01', intraday_end)
+            
             cursor.close()
         
-        print(f"预加载完成: {len(self.daily_prices)} 天价格数据, {len(self.daily_fng)} 天贪婪恐惧指数数据")
+        logger.info("预加载完成: %d 天价格数据, %d 天贪婪恐惧指数数据",
+                    len(self.daily_prices['BTC']), len(self.daily_fng))
         
-        print("\n数据样本:")
-        sample_dates = list(self.daily_prices.keys())[:5]
-        for date in sample_dates:
-            fng = self.daily_fng.get(date, 'N/A')
+        self.compile_strategy()
         
-        print("\n潜在交易日期:")
-        buy_thresholds = [t['fng'] for t in self.investment_strategy['buy_thresholds']]
-        sell_thresholds = [t['fng'] for t in self.investment_strategy['sell_thresholds']]
-        min_buy_threshold = min(buy_thresholds) if buy_thresholds else 30
-        max_sell_threshold = max(sell_thresholds) if sell_thresholds else 65
-        
-        for date, fng in self.daily_fng.items():
-            if fng < min_buy_threshold and date in self.daily_prices:
-                print(f"{date}: FNG={fng} (买入信号)")
-            elif fng > max_sell_threshold and date in self.daily_prices:
-                print(f"{date}: FNG={fng} (卖出信号)")
+        # 逐日列出潜在交易日期开销较大，仅在DEBUG级别输出
+        if logger.isEnabledFor(logging.DEBUG):
+            self.log_potential_trade_dates()
         
         return True
     
+    def compile_strategy(self):
+        """
+        在贪婪恐惧指数和两种价格都齐全的交易日上编译一次策略，回测时按日期下标读取每日买入金额和卖出比例
+        """
+        btc_prices = self.daily_prices['BTC']
+        eth_prices = self.daily_prices['ETH']
+        dates = [date for date in sorted(self.daily_fng) if date in btc_prices and date in eth_prices]
+        self.compiled_signals = {'dates': dates, 'index': {date: i for i, date in enumerate(dates)},
+                                 'buy_cooldown': 0, 'sell_cooldown': 0}
+        if not dates:
+            self.compiled_signals.update({name: [] for name in ('buy_btc', 'buy_eth', 'sell_btc', 'sell_eth')})
+            return self.compiled_signals
+        market = {
+            'fng': np.array([self.daily_fng[date] for date in dates], dtype=np.int64),
+            'btc': np.array([btc_prices[date] for date in dates], dtype=np.float64),
+            'eth': np.array([eth_prices[date] for date in dates], dtype=np.float64)
+        }
+        signals = self.strategy.compile(market)
+        for name in ('buy_btc', 'buy_eth', 'sell_btc', 'sell_eth'):
+            self.compiled_signals[name] = signals[name].tolist()
+        self.compiled_signals['buy_cooldown'] = signals['buy_cooldown']
+        self.compiled_signals['sell_cooldown'] = signals['sell_cooldown']
+        return self.compiled_signals
+    
+    def log_potential_trade_dates(self):
+        """
+        输出所有潜在的买入/卖出信号日期
+        """
+        logger.debug("潜在交易日期:")
+        for date, fng, _, _, trade_type in self.trade_signals():
+            logger.debug("%s: FNG=%d (%s信号)", date, fng, '买入' if trade_type == 'buy' else '卖出')
+    
     def get_daily_average_price(self, symbol, date):
         """
         获取指定日期的日均价
@@ -281,33 +460,90 @@ class InvestmentAnalyzer:
                     return self.daily_fng[stored_date]
         return None
     
-    def calculate_investment_amount(self, fng):
+    def trade_signals(self, start=None, end=None):
         """
-        根据贪婪恐惧指数计算投资金额
-        返回(BTC投资金额, ETH投资金额)的元组
-        """
-        # 按贪婪恐惧指数从低到高排序
-        sorted_buy_thresholds = sorted(self.investment_strategy['buy_thresholds'], key=lambda x: x['fng'])
+        按日期顺序返回编译后的策略在各交易日触发的买入/卖出信号
         
-        for threshold in sorted_buy_thresholds:
-            if fng < threshold['fng']:
-                return (threshold['btc'], threshold['eth'])
+        同一天可以既有买入又有卖出（先买后卖，与 strategies.simulate 一致）；冷却期取决于实际成交，
+        由 buy_crypto/sell_crypto 执行
+        
+        参数:
+            start, end (str, optional): 'YYYY-MM-DD' 格式的起止日期（含），默认不限
         
-        return (0, 0)  # 所有阈值以上不买入
+        返回:
+            list: [(日期字符串, 贪婪恐惧指数, BTC均价, ETH均价, 'buy'或'sell')]，与回测账户状态无关，可在多个窗口间共享
+        """
+        compiled = self.compiled_signals
+        dates = compiled['dates']
+        first = bisect.bisect_left(dates, start) if start else 0
+        last = bisect.bisect_right(dates, end) if end else len(dates)
+        signals = []
+        for index in range(first, last):
+            date_str = dates[index]
+            buy = compiled['buy_btc'][index] + compiled['buy_eth'][index] > 0
+            sell = compiled['sell_btc'][index] > 0 or compiled['sell_eth'][index] > 0
+            if not buy and not sell:
+                continue
+            row = (date_str, self.daily_fng[date_str], self.daily_prices['BTC'][date_str],
+                   self.daily_prices['ETH'][date_str])
+            if buy:
+                signals.append(row + ('buy',))
+            if sell:
+                signals.append(row + ('sell',))
+        return signals
+    
+    def in_cooldown(self, last_date, date, days):
+        """
+        距上次同类交易是否还不足冷却天数（按交易日下标计数，与 strategies.simulate 一致）
+        """
+        index = self.compiled_signals['index']
+        if not days or last_date not in index:
+            return False
+        return index[date] - index[last_date] < days
+    
+    def calculate_investment_amount(self, date):
+        """
+        按编译后的策略信号计算当日投资金额
+        返回(BTC投资金额, ETH投资金额)的元组
+        """
+        index = self.compiled_signals['index'].get(date)
+        if index is None:
+            return (0, 0)  # 数据不全的日期不交易
+        return (self.compiled_signals['buy_btc'][index], self.compiled_signals['buy_eth'][index])
+    
+    def calculate_sell_percentage(self, date):
+        """
+        按编译后的策略信号计算当日卖出比例
+        返回(BTC卖出比例, ETH卖出比例)的元组
+        """
+        index = self.compiled_signals['index'].get(date)
+        if index is None:
+            return (0, 0)
+        return (self.compiled_signals['sell_btc'][index], self.compiled_signals['sell_eth'][index])
     
     def buy_crypto(self, date, btc_price, eth_price, fng):
         """
         合并买入BTC和ETH
         """
-        btc_investment, eth_investment = self.calculate_investment_amount(fng)
+        btc_investment, eth_investment = self.calculate_investment_amount(date)
+        if btc_investment + eth_investment <= 0:
+            return False
+        if self.in_cooldown(self.last_buy_date, date, self.compiled_signals['buy_cooldown']):
+            return False
+        
+        # 按成交模型确定实际成交价（含滑点）
+        if self.execution is not None:
+            btc_price = self.execution.fill_price('BTC', date, 'buy', btc_price)
+            eth_price = self.execution.fill_price('ETH', date, 'buy', eth_price)
         
         # 检查资金是否足够购买BTC
         if self.current_funds < btc_investment:
-            print(f"{date}: 资金不足，无法买入 {btc_investment} 美元的BTC")
+            if self.log_trades:
+                logger.info("%s: 资金不足，无法买入 %s 美元的BTC", date, btc_investment)
             return False
         
-        # 计算可购买的BTC数量
-        btc_amount = btc_investment / btc_price
+        # 计算可购买的BTC数量（手续费从投资金额中扣除）
+        btc_amount = btc_investment * (1 - self.fee_rate) / btc_price
         
         # 更新BTC持仓和资金
         self.btc_holdings += btc_amount
@@ -321,13 +557,15 @@ class InvestmentAnalyzer:
         else:
             self.btc_average_price = 0
         
-        # 检查资金是否足够购买ETH
-        if self.current_funds < eth_investment:
-            print(f"{date}: 资金不足，无法买入 {eth_investment} 美元的ETH")
-            return False
+        # 检查资金是否足够购买ETH；不足时仍需记录已完成的BTC买入，否则交易记录与持仓不一致
+        eth_affordable = self.current_funds >= eth_investment
+        if not eth_affordable:
+            if self.log_trades:
+                logger.info("%s: 资金不足，无法买入 %s 美元的ETH", date, eth_investment)
+            eth_investment = 0
         
-        # 计算可购买的ETH数量
-        eth_amount = eth_investment / eth_price
+        # 计算可购买的ETH数量（手续费从投资金额中扣除）
+        eth_amount = eth_investment * (1 - self.fee_rate) / eth_price
         
         # 更新ETH持仓和资金
         self.eth_holdings += eth_amount
@@ -341,12 +579,12 @@ class InvestmentAnalyzer:
         else:
             self.eth_average_price = 0
         
+        fee = (btc_investment + eth_investment) * self.fee_rate
+        self.total_fees += fee
+        
         # 计算账户总额
         account_total = self.current_funds + (self.btc_holdings * btc_price) + (self.eth_holdings * eth_price)
         
-        # 生成交易备注，包含贪恐指数
-        trade_note = f"当日贪恐指数: {fng} - 交易类型: buy - 以${btc_price:.2f}价格买入{btc_amount:.6f}BTC - 以${eth_price:.2f}价格买入{eth_amount:.6f}ETH"
-        
         # 记录交易
         trade_record = {
             'trade_date': date,
@@ -364,25 +602,14 @@ class InvestmentAnalyzer:
             'eth_average_price': self.eth_average_price,
             'remaining_usd': self.current_funds,
             'account_total': account_total,
-            'trade_note': trade_note
+            'fee': fee,
+            'fng': fng  # 交易备注在写入数据库时由 format_trade_note 生成
         }
         
-        self.trade_records.append(trade_record)
-        
-        # 保存到数据库
-        self.save_trade_to_database(trade_record)
-        
-        buy_details = []
-        if btc_amount > 0:
-            buy_details.append(f"买入 {btc_amount:.6f} BTC, 花费: ${btc_investment:.2f}")
-        if eth_amount > 0:
-            buy_details.append(f"买入 {eth_amount:.6f} ETH, 花费: ${eth_investment:.2f}")
-        print(f"{date}: {'; '.join(buy_details)}")
-        print(f"  当前持有: BTC={self.btc_holdings:.6f}, ETH={self.eth_holdings:.6f}, 剩余资金: ${self.current_funds:.2f}")
-        print(f"  账户总额: ${account_total:.2f}")
+        self.record_trade(trade_record)
         
         self.last_buy_date = date
-        return True
+        return eth_affordable
     
     def sell_crypto(self, date, btc_price, eth_price, fng):
         """
@@ -390,29 +617,28 @@ class InvestmentAnalyzer:
         """
         # 检查是否有BTC可卖
         if self.btc_holdings <= 0 and self.eth_holdings <= 0:
-            print(f"{date}: 没有加密货币可卖")
+            if self.log_trades:
+                logger.info("%s: 没有加密货币可卖", date)
             return False
         
-        # 根据贪婪恐惧指数确定卖出比例
-        # 按贪婪恐惧指数从高到低排序
-        sorted_sell_thresholds = sorted(self.investment_strategy['sell_thresholds'], key=lambda x: x['fng'], reverse=True)
-        
-        btc_sell_percentage = None
-        eth_sell_percentage = None
-        
-        for threshold in sorted_sell_thresholds:
-            if fng >= threshold['fng']:
-                btc_sell_percentage = threshold['btc']
-                eth_sell_percentage = threshold['eth']
-                break
+        # 卖出比例由策略信号决定
+        btc_sell_percentage, eth_sell_percentage = self.calculate_sell_percentage(date)
+        if btc_sell_percentage <= 0 and eth_sell_percentage <= 0:
+            return False
+        if self.in_cooldown(self.last_sell_date, date, self.compiled_signals['sell_cooldown']):
+            return False
         
-        if btc_sell_percentage is None or eth_sell_percentage is None:
-            return False  # 所有阈值以下不卖出
+        # 按成交模型确定实际成交价（含滑点）
+        if self.execution is not None:
+            btc_price = self.execution.fill_price('BTC', date, 'sell', btc_price)
+            eth_price = self.execution.fill_price('ETH', date, 'sell', eth_price)
+        fee = 0
         
         # 计算BTC卖出数量和价值
         if self.btc_holdings > 0:
             btc_sell_amount = self.btc_holdings * btc_sell_percentage
-            btc_sell_value = btc_sell_amount * btc_price
+            btc_sell_value = btc_sell_amount * btc_price * (1 - self.fee_rate)
+            fee += btc_sell_amount * btc_price * self.fee_rate
             
             # 更新BTC持仓和资金
             self.btc_holdings -= btc_sell_amount
@@ -424,7 +650,8 @@ class InvestmentAnalyzer:
         # 计算ETH卖出数量和价值
         if self.eth_holdings > 0:
             eth_sell_amount = self.eth_holdings * eth_sell_percentage
-            eth_sell_value = eth_sell_amount * eth_price
+            eth_sell_value = eth_sell_amount * eth_price * (1 - self.fee_rate)
+            fee += eth_sell_amount * eth_price * self.fee_rate
             
             # 更新ETH持仓和资金
             self.eth_holdings -= eth_sell_amount
@@ -433,15 +660,14 @@ class InvestmentAnalyzer:
             eth_sell_amount = 0
             eth_sell_value = 0
         
+        self.total_fees += fee
+        
         # 计算总卖出价值
         total_sell_value = btc_sell_value + eth_sell_value
         
         # 计算账户总额
         account_total = self.current_funds + (self.btc_holdings * btc_price) + (self.eth_holdings * eth_price)
         
-        # 生成交易备注
-        trade_note = f"当日贪恐指数: {fng} - 交易类型: sell - 以${btc_price:.2f}价格卖出{btc_sell_amount:.6f}BTC - 以${eth_price:.2f}价格卖出{eth_sell_amount:.6f}ETH"
-        
         # 记录交易
         trade_record = {
             'trade_date': date,
@@ -459,27 +685,61 @@ class InvestmentAnalyzer:
             'eth_average_price': self.eth_average_price,
             'remaining_usd': self.current_funds,
             'account_total': account_total,
-            'trade_note': trade_note
+            'fee': fee,
+            'fng': fng  # 交易备注在写入数据库时由 format_trade_note 生成
         }
-        self.trade_records.append(trade_record)
-        
-        # 保存到数据库
-        self.save_trade_to_database(trade_record)
-        
-        # 打印交易信息
-        if btc_sell_amount > 0 or eth_sell_amount > 0:
-            sell_details = []
-            if btc_sell_amount > 0:
-                sell_details.append(f"卖出 {btc_sell_amount:.6f} BTC, 获得: ${btc_sell_value:.2f}")
-            if eth_sell_amount > 0:
-                sell_details.append(f"卖出 {eth_sell_amount:.6f} ETH, 获得: ${eth_sell_value:.2f}")
-            print(f"{date}: {'; '.join(sell_details)}")
-            print(f"  当前持有: BTC={self.btc_holdings:.6f}, ETH={self.eth_holdings:.6f}, 剩余资金: ${self.current_funds:.2f}")
-            print(f"  账户总额: ${account_total:.2f}")
+        self.record_trade(trade_record)
         
         self.last_sell_date = date
         return True
     
+    def record_trade(self, trade_record):
+        """
+        记录一笔交易：按需写入 JSON Lines 并输出日志，数据库在回测结束后批量写入
+        """
+        self.trade_records.append(trade_record)
+        
+        if self._trade_stream is not None:
+            self._trade_stream.write(json.dumps(trade_record, ensure_ascii=False))
+            self._trade_stream.write('\n')
+        
+        if self.log_trades:
+            self.log_trade(trade_record)
+    
+    def log_trade(self, trade_record):
+        """
+        输出单笔交易的详情
+        """
+        if trade_record['trade_type'] == 'buy':
+            action, flow = '买入', '花费'
+        else:
+            action, flow = '卖出', '获得'
+        date = trade_record['trade_date']
+        if trade_record['btc_trade_amount'] > 0:
+            logger.info("%s: %s %.6f BTC, %s: $%.2f", date, action,
+                        trade_record['btc_trade_amount'], flow, trade_record['btc_trade_value'])
+        if trade_record['eth_trade_amount'] > 0:
+            logger.info("%s: %s %.6f ETH, %s: $%.2f", date, action,
+                        trade_record['eth_trade_amount'], flow, trade_record['eth_trade_value'])
+        logger.info("  当前持有: BTC=%.6f, ETH=%.6f, 剩余资金: $%.2f",
+                    trade_record['btc_holdings'], trade_record['eth_holdings'], trade_record['remaining_usd'])
+        logger.info("  账户总额: $%.2f", trade_record['account_total'])
+    
+    @contextlib.contextmanager
+    def open_trade_stream(self):
+        """
+        在模拟期间打开交易记录 JSON Lines 文件
+        """
+        if not self.trade_log:
+            yield None
+            return
+        with open(self.trade_log, 'w', encoding='utf-8') as stream:
+            self._trade_stream = stream
+            try:
+                yield stream
+            finally:
+                self._trade_stream = None
+    
     def analyze_investment(self, start_date=None, end_date=None):
         """
         分析投资策略
@@ -488,26 +748,33 @@ class InvestmentAnalyzer:
             start_date (datetime, optional): 投资开始时间
             end_date (datetime, optional): 投资结束时间
         """
-        print("\n" + "=" * 90)
-        print("        加密货币投资策略分析")
-        print("=" * 90)
-        print(f"初始资金: ${self.initial_funds:.2f}")
+        logger.info("=" * 90)
+        logger.info("        加密货币投资策略分析")
+        logger.info("=" * 90)
+        logger.info("初始资金: $%.2f", self.initial_funds)
         
         # 动态生成投资策略描述
-        buy_strategy_lines = []
-        for threshold in sorted(self.investment_strategy['buy_thresholds'], key=lambda x: x['fng']):
-            buy_strategy_lines.append(f"{threshold['fng']}以下买入{threshold['btc']}u BTC和{threshold['eth']}u ETH")
-        buy_strategy = "，".join(buy_strategy_lines)
-        print(f"投资策略: 贪婪恐惧指数{buy_strategy}")
-        
-        # 动态生成卖出策略描述
-        sell_strategy_lines = []
-        for threshold in sorted(self.investment_strategy['sell_thresholds'], key=lambda x: x['fng']):
-            btc_percent = threshold['btc'] * 100
-            eth_percent = threshold['eth'] * 100
-            sell_strategy_lines.append(f"{threshold['fng']}以上卖出BTC {btc_percent:.0f}%和ETH {eth_percent:.0f}%")
-        sell_strategy = "，".join(sell_strategy_lines)
-        print(f"卖出策略: 贪婪恐惧指数{sell_strategy}")
+        logger.info("回测策略: %s", self.strategy.name)
+        for rule in self.strategy.rules:
+            if not isinstance(rule, strategies.FngTiers):
+                description = {key: value for key, value in vars(rule).items() if not key.startswith('_')}
+                logger.info("策略规则: %s %s", type(rule).__name__, json.dumps(description, ensure_ascii=False))
+                continue
+            
+            buy_strategy_lines = []
+            for threshold in sorted(rule.buy_thresholds, key=lambda x: x['fng']):
+                buy_strategy_lines.append(f"{threshold['fng']}以下买入{threshold['btc']}u BTC和{threshold['eth']}u ETH")
+            buy_strategy = "，".join(buy_strategy_lines)
+            logger.info("投资策略: 贪婪恐惧指数%s", buy_strategy)
+            
+            # 动态生成卖出策略描述
+            sell_strategy_lines = []
+            for threshold in sorted(rule.sell_thresholds, key=lambda x: x['fng']):
+                btc_percent = threshold['btc'] * 100
+                eth_percent = threshold['eth'] * 100
+                sell_strategy_lines.append(f"{threshold['fng']}以上卖出BTC {btc_percent:.0f}%和ETH {eth_percent:.0f}%")
+            sell_strategy = "，".join(sell_strategy_lines)
+            logger.info("卖出策略: 贪婪恐惧指数%s", sell_strategy)
         
         # 设置默认时间范围
         if not start_date:
@@ -515,79 +782,97 @@ class InvestmentAnalyzer:
         if not end_date:
             end_date = datetime.now()
         
-        print(f"投资开始时间: {start_date.strftime('%Y年%m月%d日')}")
-        print(f"投资结束时间: {end_date.strftime('%Y年%m月%d日')}")
-        print(f"时间范围: {start_date.strftime('%Y年%m月%d日')} - {end_date.strftime('%Y年%m月%d日')}")
-        print("=" * 90)
+        logger.info("投资开始时间: %s", start_date.strftime('%Y年%m月%d日'))
+        logger.info("投资结束时间: %s", end_date.strftime('%Y年%m月%d日'))
+        logger.info("时间范围: %s - %s", start_date.strftime('%Y年%m月%d日'), end_date.strftime('%Y年%m月%d日'))
+        logger.info("=" * 90)
         
         # 更新数据
-        if not self.update_data():
-            print("数据更新失败，无法继续分析")
+        with profiling.phase('update_data'):
+            updated = self.update_data()
+        if not updated:
+            logger.error("数据更新失败，无法继续分析")
             return
         
+        # 参数和数据水位都未变化时直接使用缓存结果
+        cache_key = None
+        if self.result_cache is not None:
+            with profiling.phase('result_cache'):
+                cache_key = self.result_cache_key(start_date, end_date)
+                cached = self.result_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info("命中回测结果缓存，跳过预加载和模拟")
+                with self.open_trade_stream():
+                    self.restore_result(cached, end_date)
+                if self.persist_trades:
+                    self.run_id = self.start_run(start_date, end_date)
+                    if self.run_id is not None:
+                        self.save_trades_to_database(self.run_id, self.trade_records)
+                with profiling.phase('summary'):
+                    self.print_summary(end_date)
+                return
+        
         # 预加载数据
-        if not self.preload_data():
-            print("数据预加载失败，无法继续分析")
+        with profiling.phase('preload_data'):
+            preloaded = self.preload_data(end_date)
+        if not preloaded:
+            logger.error("数据预加载失败，无法继续分析")
             return
         
-        # 遍历从起始日期到现在的每一天
-        current_date = start_date
+        if self.persist_trades:
+            self.run_id = self.start_run(start_date, end_date)
         
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            
-            # 获取当日的贪婪恐惧指数
-            fng = self.get_daily_fear_greed_index(date_str)
-            if fng is None:
-                current_date += timedelta(days=1)
-                continue
+        with profiling.phase('simulation'), self.open_trade_stream():
+            # 策略已在预加载后编译为每日信号，只需按日期顺序执行区间内的信号
+            simulation_start = time.perf_counter()
+            simulated_days = max((end_date - start_date).days + 1, 0)
+            logged_date = None
             
-            # 获取当日BTC均价
-            btc_price = self.get_daily_average_price('BTC', date_str)
-            if btc_price is None:
-                current_date += timedelta(days=1)
-                continue
-            
-            # 获取当日ETH均价
-            eth_price = self.get_daily_average_price('ETH', date_str)
-            if eth_price is None:
-                current_date += timedelta(days=1)
-                continue
-            
-            # 检查是否需要操作
-            if fng is not None and btc_price is not None and eth_price is not None:
-                # 从配置中获取最大的买入阈值和最小的卖出阈值
-                buy_thresholds = [t['fng'] for t in self.investment_strategy['buy_thresholds']]
-                sell_thresholds = [t['fng'] for t in self.investment_strategy['sell_thresholds']]
-                max_buy_threshold = max(buy_thresholds) if buy_thresholds else 20
-                min_sell_threshold = min(sell_thresholds) if sell_thresholds else 80
-                
-                if fng < max_buy_threshold:
-                    # 贪婪恐惧指数低于最大买入阈值，买入
-                    if self.last_buy_date != date_str:
-                        print(f"\n{date_str}: 贪婪恐惧指数={fng}, BTC均价=${btc_price:.2f}, ETH均价=${eth_price:.2f}")
-                        # 合并买入BTC和ETH
-                        self.buy_crypto(date_str, btc_price, eth_price, fng)
-                elif fng >= min_sell_threshold:
-                    # 贪婪恐惧指数高于最小卖出阈值，根据不同区间卖出不同比例
-                    if self.last_sell_date != date_str:
-                        print(f"\n{date_str}: 贪婪恐惧指数={fng}, BTC均价=${btc_price:.2f}, ETH均价=${eth_price:.2f}")
-                        # 合并卖出BTC和ETH
-                        self.sell_crypto(date_str, btc_price, eth_price, fng)
-                # 其他区间，不操作，不输出
-            else:
-                # 调试：检查数据缺失情况
-                if fng is None:
-                    print(f"{date_str}: 无贪婪恐惧指数数据")
-                if btc_price is None:
-                    print(f"{date_str}: 无BTC价格数据")
-                if eth_price is None:
-                    print(f"{date_str}: 无ETH价格数据")
-            
-            current_date += timedelta(days=1)
+            for date_str, fng, btc_price, eth_price, trade_type in self.trade_signals(
+                    start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')):
+                if self.log_trades and logged_date != date_str:
+                    logger.info("%s: 贪婪恐惧指数=%d, BTC均价=$%.2f, ETH均价=$%.2f",
+                                date_str, fng, btc_price, eth_price)
+                    logged_date = date_str
+                if trade_type == 'buy':
+                    # 合并买入BTC和ETH
+                    self.buy_crypto(date_str, btc_price, eth_price, fng)
+                else:
+                    # 合并卖出BTC和ETH
+                    self.sell_crypto(date_str, btc_price, eth_price, fng)
+        
+        elapsed = time.perf_counter() - simulation_start
+        metrics.BACKTEST_DAYS.inc(simulated_days)
+        if elapsed > 0:
+            metrics.BACKTEST_DAYS_PER_SECOND.set(simulated_days / elapsed)
+        
+        if self.run_id is not None:
+            with profiling.phase('save_trades'):
+                self.save_trades_to_database(self.run_id, self.trade_records)
+        
+        with profiling.phase('performance'):
+            self.compute_performance(start_date, end_date)
+        
+        if cache_key is not None:
+            self.result_cache.put(cache_key, self.cached_result(end_date))
         
         # 分析结束，输出结果
-        self.print_summary(end_date)
+        with profiling.phase('summary'):
+            self.print_summary(end_date)
+    
+    def compute_performance(self, start_date, end_date, price_table=None):
+        """
+        生成每日权益曲线并计算风险与收益指标
+        
+        Args:
+            price_table: 预先构建的 performance.PriceTable，批量回测时传入以免重复构建
+        """
+        if price_table is None:
+            price_table = performance.PriceTable.from_daily_prices(self.daily_prices)
+        self.equity_dates, self.equity, invested = performance.equity_curve(
+            self.trade_records, self.initial_funds, price_table, start_date, end_date)
+        self.performance = performance.compute_metrics(self.equity_dates, self.equity, invested)
+        return self.performance
     
     def print_summary(self, end_date):
         """
@@ -596,9 +881,9 @@ class InvestmentAnalyzer:
         Args:
             end_date: 分析结束日期
         """
-        print("\n" + "=" * 90)
-        print("        投资策略分析总结")
-        print("=" * 90)
+        logger.info("=" * 90)
+        logger.info("        投资策略分析总结")
+        logger.info("=" * 90)
         
         # 计算最终价值（以分析结束日期的价格估算）
         latest_date = end_date.strftime('%Y-%m-%d')
@@ -610,16 +895,16 @@ class InvestmentAnalyzer:
             if self.trade_records:
                 latest_trade = self.trade_records[-1]
                 btc_final_price = latest_trade.get('btc_trade_price', 0)
-                print(f"使用最近交易价格作为BTC最终价格: ${btc_final_price:.2f}")
+                logger.info("使用最近交易价格作为BTC最终价格: $%.2f", btc_final_price)
         
         if not eth_final_price:
             # 如果没有当天价格，尝试获取最近的ETH价格
             if self.trade_records:
                 # 找到最近的ETH交易
                 for trade in reversed(self.trade_records):
-                    if 'ETH' in trade.get('trade_note', ''):
+                    if trade.get('eth_trade_price'):
                         eth_final_price = trade.get('eth_trade_price', 0)
-                        print(f"使用最近交易价格作为ETH最终价格: ${eth_final_price:.2f}")
+                        logger.info("使用最近交易价格作为ETH最终价格: $%.2f", eth_final_price)
                         break
         
         if btc_final_price and eth_final_price:
@@ -627,47 +912,60 @@ class InvestmentAnalyzer:
             eth_value = self.eth_holdings * eth_final_price
             total_value = self.current_funds + btc_value + eth_value
             
-            print(f"初始资金: ${self.initial_funds:.2f}")
-            print(f"最终资金: ${self.current_funds:.2f}")
-            print(f"最终持有BTC: {self.btc_holdings:.6f}")
-            print(f"最终持有ETH: {self.eth_holdings:.6f}")
-            print(f"BTC最终价格: ${btc_final_price:.2f}")
-            print(f"ETH最终价格: ${eth_final_price:.2f}")
-            print(f"BTC持仓均价: ${self.btc_average_price:.2f}")
-            print(f"ETH持仓均价: ${self.eth_average_price:.2f}")
-            print(f"BTC价值: ${btc_value:.2f}")
-            print(f"ETH价值: ${eth_value:.2f}")
-            print(f"总价值 (BTC+ETH+U): ${total_value:.2f}")
-            print(f"收益率: {(total_value / self.initial_funds - 1) * 100:.2f}%")
+            logger.info("初始资金: $%.2f", self.initial_funds)
+            logger.info("最终资金: $%.2f", self.current_funds)
+            logger.info("最终持有BTC: %.6f", self.btc_holdings)
+            logger.info("最终持有ETH: %.6f", self.eth_holdings)
+            logger.info("BTC最终价格: $%.2f", btc_final_price)
+            logger.info("ETH最终价格: $%.2f", eth_final_price)
+            logger.info("BTC持仓均价: $%.2f", self.btc_average_price)
+            logger.info("ETH持仓均价: $%.2f", self.eth_average_price)
+            logger.info("BTC价值: $%.2f", btc_value)
+            logger.info("ETH价值: $%.2f", eth_value)
+            logger.info("总价值 (BTC+ETH+U): $%.2f", total_value)
+            logger.info("收益率: %.2f%%", (total_value / self.initial_funds - 1) * 100)
         elif btc_final_price:
             btc_value = self.btc_holdings * btc_final_price
             total_value = self.current_funds + btc_value
             
-            print(f"初始资金: ${self.initial_funds:.2f}")
-            print(f"最终资金: ${self.current_funds:.2f}")
-            print(f"最终持有BTC: {self.btc_holdings:.6f}")
-            print(f"最终持有ETH: {self.eth_holdings:.6f}")
-            print(f"BTC最终价格: ${btc_final_price:.2f}")
-            print(f"BTC持仓均价: ${self.btc_average_price:.2f}")
-            print(f"ETH持仓均价: ${self.eth_average_price:.2f}")
-            print(f"BTC价值: ${btc_value:.2f}")
-            print(f"总价值 (BTC+U): ${total_value:.2f}")
-            print(f"收益率: {(total_value / self.initial_funds - 1) * 100:.2f}%")
+            logger.info("初始资金: $%.2f", self.initial_funds)
+            logger.info("最终资金: $%.2f", self.current_funds)
+            logger.info("最终持有BTC: %.6f", self.btc_holdings)
+            logger.info("最终持有ETH: %.6f", self.eth_holdings)
+            logger.info("BTC最终价格: $%.2f", btc_final_price)
+            logger.info("BTC持仓均价: $%.2f", self.btc_average_price)
+            logger.info("ETH持仓均价: $%.2f", self.eth_average_price)
+            logger.info("BTC价值: $%.2f", btc_value)
+            logger.info("总价值 (BTC+U): $%.2f", total_value)
+            logger.info("收益率: %.2f%%", (total_value / self.initial_funds - 1) * 100)
         else:
-            print(f"初始资金: ${self.initial_funds:.2f}")
-            print(f"最终资金: ${self.current_funds:.2f}")
-            print(f"最终持有BTC: {self.btc_holdings:.6f}")
-            print(f"最终持有ETH: {self.eth_holdings:.6f}")
-            print(f"BTC持仓均价: ${self.btc_average_price:.2f}")
-            print(f"ETH持仓均价: ${self.eth_average_price:.2f}")
-            print("无法计算总价值（缺少价格数据）")
-        
-        print(f"\n交易统计:")
-        print(f"- 交易次数: {len(self.trade_records)}")
-        print(f"- 买入次数: {sum(1 for r in self.trade_records if r['trade_type'] == 'buy')}")
-        print(f"- 卖出次数: {sum(1 for r in self.trade_records if r['trade_type'] == 'sell')}")
-        
-        print("=" * 90)
+            logger.info("初始资金: $%.2f", self.initial_funds)
+            logger.info("最终资金: $%.2f", self.current_funds)
+            logger.info("最终持有BTC: %.6f", self.btc_holdings)
+            logger.info("最终持有ETH: %.6f", self.eth_holdings)
+            logger.info("BTC持仓均价: $%.2f", self.btc_average_price)
+            logger.info("ETH持仓均价: $%.2f", self.eth_average_price)
+            logger.warning("无法计算总价值（缺少价格数据）")
+        
+        if self.performance:
+            logger.info("风险指标:")
+            logger.info("- 年化收益率: %.2f%%", self.performance['cagr_pct'])
+            logger.info("- 年化波动率: %.2f%%", self.performance['volatility_pct'])
+            logger.info("- 夏普比率: %.2f", self.performance['sharpe'])
+            logger.info("- 索提诺比率: %.2f", self.performance['sortino'])
+            logger.info("- 最大回撤: %.2f%% (%s 至 %s)", self.performance['max_drawdown_pct'],
+                        self.performance['max_drawdown_peak'], self.performance['max_drawdown_trough'])
+            logger.info("- 平均仓位: %.2f%%", self.performance['exposure_pct'])
+            logger.info("- 持仓时间占比: %.2f%%", self.performance['time_in_market_pct'])
+        
+        logger.info("交易统计:")
+        logger.info("- 交易次数: %s", len(self.trade_records))
+        if self.execution is not None:
+            logger.info("- 成交方式: %s, 手续费合计: $%.2f", self.execution.mode, self.total_fees)
+        logger.info("- 买入次数: %s", sum(1 for r in self.trade_records if r['trade_type'] == 'buy'))
+        logger.info("- 卖出次数: %s", sum(1 for r in self.trade_records if r['trade_type'] == 'sell'))
+        
+        logger.info("=" * 90)
 
 
 if __name__ == '__main__':
@@ -675,24 +973,71 @@ if __name__ == '__main__':
     主函数，执行投资策略分析
     可以直接在此处修改投资的开始时间和结束时间
     """
-    print("启动加密货币投资策略分析...")
-    # 使用配置区域的参数创建分析器实例
-    analyzer = InvestmentAnalyzer(
-        initial_funds=INITIAL_FUNDS,
-        investment_strategy=INVESTMENT_STRATEGY
-    )
+    parser = argparse.ArgumentParser(description='加密货币投资策略分析')
+    parser.add_argument('--profile', nargs='?', const='phases', default='',
+                        help='剖析运行过程: phases（默认）、cprofile、memory、stacks 或 all，可用逗号组合')
+    parser.add_argument('--strategy', choices=sorted(strategies.STRATEGIES), default='fng_tiers', help='回测策略')
+    parser.add_argument('--strategy-param', action='append', metavar='KEY=VALUE',
+                        help='策略参数，可重复，如 --strategy-param window=100')
+    parser.add_argument('--summary-only', action='store_true',
+                        help='只输出策略说明和总结，不逐笔输出交易')
+    parser.add_argument('--trade-log', metavar='PATH',
+                        help='将每笔交易以 JSON Lines 格式写入该文件')
+    parser.add_argument('--fill', choices=FILL_MODES, default=None,
+                        help='成交方式: daily_avg（日均价）、time（日内指定时刻）、twap、vwap（无成交量时按twap）')
+    parser.add_argument('--fill-time', default='00:00', help='time 方式的成交时刻 HH:MM')
+    parser.add_argument('--fill-window', default='00:00-24:00', help='twap 方式的时间窗口 HH:MM-HH:MM')
+    parser.add_argument('--fee-rate', type=float, default=0.0, help='手续费率，如 0.001')
+    parser.add_argument('--slippage-bps', type=float, default=0.0, help='滑点（基点）')
+    parser.add_argument('--no-cache', action='store_true', help='不读取也不写入回测结果缓存')
+    parser.add_argument('--prune-keep', type=int, metavar='N', help='只删除旧的回测运行（保留最近 N 次），不执行分析')
+    parser.add_argument('--prune-days', type=int, metavar='DAYS', help='只删除早于 DAYS 天的回测运行，不执行分析')
+    args = parser.parse_args()
+    
+    if args.prune_keep is not None or args.prune_days is not None:
+        migrations.migrate()
+        prune_runs(args.prune_keep, args.prune_days)
+        raise SystemExit(0)
     
-    # 使用配置区域的时间范围
-    # 格式: datetime(年, 月, 日)
-    start_date = datetime(*START_DATE)  # 投资开始时间
-    end_date = datetime(*END_DATE)      # 投资结束时间
+    try:
+        strategy = strategies.build_strategy(args.strategy, INVESTMENT_STRATEGY,
+                                             **strategies.parse_strategy_params(args.strategy_param))
+    except (TypeError, ValueError) as error:
+        parser.error(f'策略参数无效: {error}')
     
-    # 验证时间范围
-    if start_date >= end_date:
-        print("错误: 开始时间必须早于结束时间")
-        start_date = datetime(2020, 1, 1)
-        end_date = datetime.now()
-        print(f"使用默认时间范围: {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')}")
+    execution = None
+    if args.fill or args.fee_rate or args.slippage_bps:
+        window_start, window_end = args.fill_window.split('-')
+        execution = ExecutionModel(args.fill or 'daily_avg', fill_time=args.fill_time, window_start=window_start,
+                                   window_end=window_end, fee_rate=args.fee_rate, slippage_bps=args.slippage_bps)
     
-    # 执行分析
-    analyzer.analyze_investment(start_date, end_date)
\ No newline at end of file
+    logger.info("启动加密货币投资策略分析...")
+    metrics.start_exporters()
+    migrations.migrate()
+    
+    with profiling.profile_run('investment_analysis', profiling.parse_options(args.profile)):
+        # 使用配置区域的参数创建分析器实例
+        analyzer = InvestmentAnalyzer(
+            initial_funds=INITIAL_FUNDS,
+            investment_strategy=INVESTMENT_STRATEGY,
+            log_trades=not args.summary_only,
+            trade_log=args.trade_log,
+            execution=execution,
+            strategy=strategy,
+            result_cache=None if args.no_cache else result_cache.ResultCache(RESULT_CACHE_DIR, int(RESULT_CACHE_MAX_MB * 1024 * 1024))
+        )
+        
+        # 使用配置区域的时间范围
+        # 格式: datetime(年, 月, 日)
+        start_date = datetime(*START_DATE)  # 投资开始时间
+        end_date = datetime(*END_DATE)      # 投资结束时间
+        
+        # 验证时间范围
+        if start_date >= end_date:
+            logger.error("错误: 开始时间必须早于结束时间")
+            start_date = datetime(2020, 1, 1)
+            end_date = datetime.now()
+            logger.info("使用默认时间范围: %s 到 %s", start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        
+        # 执行分析
+        analyzer.analyze_investment(start_date, end_date)
@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+
+# 币安K线数组中各字段的位置
+OPEN_TIME = 0
+OPEN = 1
+HIGH = 2
+LOW = 3
+CLOSE = 4
+VOLUME = 5
+CLOSE_TIME = 6
+
+
+def parse_klines(klines):
+    """
+    将币安K线原始数据一次性解析为按列存储的NumPy数组
+
+    参数:
+        klines (list): /api/v3/klines 返回的二维数组
+
+    返回:
+        dict: open_time/close_time（毫秒时间戳，int64），open/high/low/close/volume（float64），
+              以及开盘价和收盘价的均价 price
+    """
+    if not len(klines):
+        empty_int = np.empty(0, dtype=np.int64)
+        empty_float = np.empty(0, dtype=np.float64)
+        return {
+            'open_time': empty_int, 'close_time': empty_int,
+            'open': empty_float, 'high': empty_float, 'low': empty_float,
+            'close': empty_float, 'volume': empty_float, 'price': empty_float
+        }
+
+    raw = np.array(klines, dtype=object)
+    columns = {
+        'open_time': raw[:, OPEN_TIME].astype(np.int64),
+        'open': raw[:, OPEN].astype(np.float64),
+        'high': raw[:, HIGH].astype(np.float64),
+        'low': raw[:, LOW].astype(np.float64),
+        'close': raw[:, CLOSE].astype(np.float64),
+        'volume': raw[:, VOLUME].astype(np.float64),
+        'close_time': raw[:, CLOSE_TIME].astype(np.int64)
+    }
+    columns['price'] = (columns['open'] + columns['close']) / 2
+    return columns
+
+
+def epoch_ms_to_local(epoch_ms):
+    """
+    将毫秒时间戳批量转换为本地时间的 datetime64[s]，与 datetime.fromtimestamp 结果一致
+    """
+    seconds = np.asarray(epoch_ms, dtype=np.int64) // 1000
+    if not len(seconds):
+        return seconds.astype('datetime64[s]')
+
+    first_offset = time.localtime(int(seconds[0])).tm_gmtoff
+    last_offset = time.localtime(int(seconds[-1])).tm_gmtoff
+    if first_offset == last_offset:
+        offsets = first_offset
+    else:
+        # 区间跨越夏令时切换时逐条计算时区偏移
+        offsets = np.array([time.localtime(int(s)).tm_gmtoff for s in seconds], dtype=np.int64)
+    return (seconds + offsets).astype('datetime64[s]')
@@ -1,12 +1,24 @@
 # 导入必要的库
+import argparse
 import requests  # 用于发送HTTP请求
-import schedule  # 用于设置定时任务
-import time  # 用于时间控制
 from datetime import datetime, timedelta  # 用于获取当前时间和时间差计算
 import pymysql  # 用于MySQL数据库操作
+import numpy as np  # 用于批量数据处理
 import os
 from dotenv import load_dotenv
 
+from config import PRICE_FEED, BINANCE_API_URL, FNG_API_URL, ARCHIVE_DIR, SPOOL_PATH, SPOOL_SYNC_INTERVAL, DB_NAME
+from archive_importer import import_directory
+from daily_data_checker import DailyDataChecker
+from fng_cache import FngCache
+from indicators import update_indicators
+from klines import parse_klines, epoch_ms_to_local
+from migrations import migrate
+import metrics
+import profiling
+from scheduler import JobScheduler
+from spool import PriceSpool
+
 load_dotenv()
 
 # MySQL数据库配置
@@ -17,124 +29,22 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
-# 数据库和表名
-DB_NAME = 'cryptocurrency_analysis'
+# 表名（数据库名 DB_NAME 来自 config，与表结构迁移使用同一个库）
 TABLE_NAME = 'price_data'
 
+# 贪婪恐惧指数每条插入语句的最大行数
+FNG_UPSERT_CHUNK = 1000
+
 
 def init_database():
     """
-    初始化数据库，创建数据库和表
+    初始化数据库：按版本执行未应用的表结构迁移，已是最新版本时只做一次版本查询
     """
-    try:
-        # 连接到MySQL服务器
-        conn = pymysql.connect(
-            host=DB_CONFIG['host'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            charset=DB_CONFIG['charset']
-        )
-        cursor = conn.cursor()
-        
-        # 创建数据库
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
-        print(f"数据库 {DB_NAME} 已创建或已存在")
-        
-        # 选择数据库
-        cursor.execute(f"USE {DB_NAME}")
-        
-        # 创建币种主表
-        create_currency_table_sql = """
-        CREATE TABLE IF NOT EXISTS currencies (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            symbol VARCHAR(10) NOT NULL UNIQUE,
-            name VARCHAR(50) NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-        cursor.execute(create_currency_table_sql)
-        print("表 currencies 已创建或已存在")
-        
-        # 创建价格子表（字段冗余）- 只创建不存在的表
-        create_price_table_sql = """
-        CREATE TABLE IF NOT EXISTS price_data (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            currency_id INT NOT NULL,
-            symbol VARCHAR(10) NOT NULL,
-            price DECIMAL(20, 2) NULL,
-            timestamp DATETIME NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (currency_id) REFERENCES currencies(id)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-        cursor.execute(create_price_table_sql)
-        print("表 price_data 已创建或已存在")
-        
-        # 创建贪婪恐惧指数表（只包含日期和值字段）
-        create_fng_table_sql = """
-        CREATE TABLE IF NOT EXISTS fear_greed_index (
-            date DATE NOT NULL PRIMARY KEY,
-            value INT NOT NULL
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
-        """
-        cursor.execute(create_fng_table_sql)
-        print("表 fear_greed_index 已创建或已存在")
-        
-        # 尝试创建索引（如果不存在）
-        try:
-            # 检查索引是否存在
-            cursor.execute("""
-            SELECT COUNT(*) 
-            FROM information_schema.STATISTICS 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'price_data' 
-            AND index_name = 'idx_price_data_timestamp'
-            """)
-            if cursor.fetchone()[0] == 0:
-                cursor.execute("CREATE INDEX idx_price_data_timestamp ON price_data(timestamp)")
-                print("创建索引 idx_price_data_timestamp 成功")
-            else:
-                print("索引 idx_price_data_timestamp 已存在")
-            
-            cursor.execute("""
-            SELECT COUNT(*) 
-            FROM information_schema.STATISTICS 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'price_data' 
-            AND index_name = 'idx_price_data_symbol'
-            """)
-            if cursor.fetchone()[0] == 0:
-                cursor.execute("CREATE INDEX idx_price_data_symbol ON price_data(symbol)")
-                print("创建索引 idx_price_data_symbol 成功")
-            else:
-                print("索引 idx_price_data_symbol 已存在")
-            
-            print("索引检查完成")
-        except Exception as e:
-            print("索引操作失败:", str(e))
-        
-        # 插入默认币种数据
-        insert_currency_sql = """
-        INSERT IGNORE INTO currencies (symbol, name)
-        VALUES (%s, %s)
-        """
-        currencies = [
-            ('BTC', 'Bitcoin'),
-            ('ETH', 'Ethereum')
-        ]
-        cursor.executemany(insert_currency_sql, currencies)
-        conn.commit()
-        print("默认币种数据已插入")
-        
-        # 关闭连接
-        cursor.close()
-        conn.close()
-        
-        print("数据库初始化完成")
-    except Exception as error:
-        print('数据库初始化失败:', str(error))
+    version = migrate()
+    if version is None:
+        print('数据库初始化失败')
+    else:
+        print(f"数据库结构版本: {version}")
 
 
 def get_db_connection():
@@ -158,6 +68,37 @@ def get_db_connection():
         return None
 
 
+def http_get(endpoint, url, **kwargs):
+    """
+    发送GET请求，记录耗时和失败次数
+    
+    参数:
+        endpoint (str): 指标中的接口名称
+        url (str): 请求地址
+    """
+    with metrics.HTTP_REQUEST_SECONDS.time(endpoint=endpoint):
+        try:
+            response = requests.get(url, timeout=30, **kwargs)
+            response.raise_for_status()
+        except Exception as error:
+            status = getattr(getattr(error, 'response', None), 'status_code', None) or 'error'
+            metrics.HTTP_ERRORS.inc(endpoint=endpoint, status=status)
+            raise
+    return response
+
+
+def get_retry_delay(error, default=10):
+    """
+    计算请求失败后的重试等待秒数，遇到429/418限流响应时遵循Retry-After头
+    """
+    response = getattr(error, 'response', None)
+    if response is not None and response.status_code in (418, 429):
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return int(retry_after)
+    return default
+
+
 def fetch_price(symbol):
     """
     获取指定加密货币的实时价格
@@ -174,9 +115,7 @@ def fetch_price(symbol):
     while retry_count < max_retries:
         try:
             # 发送GET请求到币安API获取价格
-            response = requests.get(f'https://api.binance.com/api/v3/ticker/price?symbol={symbol}USDT')
-            # 检查请求是否成功
-            response.raise_for_status()
+            response = http_get('ticker_price', f'{BINANCE_API_URL}/api/v3/ticker/price?symbol={symbol}USDT')
             # 解析JSON响应
             data = response.json()
             # 返回价格信息
@@ -194,8 +133,9 @@ def fetch_price(symbol):
             retry_count += 1
             
             if retry_count < max_retries:
-                print(f'等待10秒后重新尝试...({retry_count}/{max_retries})')
-                time.sleep(10)
+                delay = get_retry_delay(error)
+                print(f'等待{delay}秒后重新尝试...({retry_count}/{max_retries})')
+                metrics.wait(delay, reason='retry')
             else:
                 print(f'已尝试{max_retries}次，获取{symbol}价格失败')
                 # 异常时返回空价格
@@ -216,8 +156,10 @@ def fetch_historical_data(symbol, start_time, end_time):
         end_time (datetime): 结束时间
     
     返回:
-        list: 包含历史价格信息的字典列表
+        datetime: 已保存（写入数据库或预写日志）的最后一根K线的开盘时间，没有保存任何数据时返回None；
+                  请求失败时提前结束，调用方可据此判断区间是否完整
     """
+    last_saved = None
     try:
         # 转换时间为毫秒时间戳
         start_ts = int(start_time.timestamp() * 1000)
@@ -240,10 +182,8 @@ def fetch_historical_data(symbol, start_time, end_time):
             # 计算本次请求的结束时间
             current_end = min(current_start + (limit * 5 * 60 * 1000), end_ts)
             
-            print(f'请求 {symbol} 数据: {datetime.fromtimestamp(current_start/1000)} 到 {datetime.fromtimestamp(current_end/1000)}')
-            
             # 发送GET请求到币安API获取K线数据
-            url = f'https://api.binance.com/api/v3/klines'
+            url = f'{BINANCE_API_URL}/api/v3/klines'
             params = {
                 'symbol': f'{symbol}USDT',
                 'interval': interval,
@@ -254,23 +194,22 @@ def fetch_historical_data(symbol, start_time, end_time):
             
             # 添加更长的随机延迟避免API限制
             sleep_time = 1.0 + (hash(current_start) % 10) / 5
-            print(f'等待 {sleep_time:.2f} 秒后请求...')
-            time.sleep(sleep_time)
+            metrics.wait(sleep_time, reason='pacing')
             
             max_retries = 3
             retry_count = 0
             klines = []
             while retry_count < max_retries:
                 try:
-                    response = requests.get(url, params=params)
-                    response.raise_for_status()
+                    response = http_get('klines', url, params=params)
                     klines = response.json()
                     break
                 except Exception as error:
                     retry_count += 1
                     if retry_count < max_retries:
-                        print(f'请求失败，10秒后重新尝试...({retry_count}/{max_retries})')
-                        time.sleep(10)
+                        delay = get_retry_delay(error)
+                        print(f'请求失败，{delay}秒后重新尝试...({retry_count}/{max_retries})')
+                        metrics.wait(delay, reason='retry')
                     else:
                         print(f'已尝试{max_retries}次，请求仍然失败:', str(error))
                         break
@@ -279,25 +218,12 @@ def fetch_historical_data(symbol, start_time, end_time):
                 print('没有更多数据，停止爬取')
                 break
             
-            # 处理K线数据
-            batch_data = []
-            for kline in klines:
-                timestamp = datetime.fromtimestamp(kline[0] / 1000)
-                open_price = float(kline[1])  # 开盘价
-                close_price = float(kline[4])  # 收盘价
-                avg_price = (open_price + close_price) / 2  # 开盘价和收盘价的均价
-                
-                batch_data.append({
-                    'symbol': symbol,
-                    'price': avg_price,
-                    'timestamp': timestamp.isoformat()
-                })
-            
-            # 每次请求后立即保存数据
-            if batch_data:
-                print(f'保存 {len(batch_data)} 条 {symbol} 数据...')
-                save_to_database(batch_data)
-                total_processed += len(batch_data)
+            # 一次性解析为按列存储的数组，直接按列写入数据库
+            columns = parse_klines(klines)
+            batch_size = len(columns['open_time'])
+            save_price_columns(symbol, epoch_ms_to_local(columns['open_time']), columns['price'])
+            total_processed += batch_size
+            last_saved = datetime.fromtimestamp(int(columns['open_time'].max()) / 1000)
             
             # 关键：更新当前开始时间为下一批数据的开始时间
             current_start = current_end
@@ -305,18 +231,17 @@ def fetch_historical_data(symbol, start_time, end_time):
             # 每3次请求增加更长的延迟
             request_count += 1
             if request_count % 3 == 0:
-                print(f'已请求 {request_count} 次，长时间休息...')
-                time.sleep(3)
+                metrics.wait(3, reason='pacing')
             else:
                 # 每次请求后都有短暂休息
-                time.sleep(1)
+                metrics.wait(1, reason='pacing')
         
         print(f'成功获取并保存 {symbol} 的 {total_processed} 条历史数据')
-        return []
+        return last_saved
     except Exception as error:
         # 处理异常情况
         print(f'获取{symbol}历史数据失败:', str(error))
-        return []
+        return last_saved
 
 
 def fetch_prices():
@@ -337,10 +262,6 @@ def fetch_prices():
     save_to_database(data)
 
 
-# 贪婪恐惧指数缓存
-fear_greed_cache = {}
-
-
 def get_latest_fng_date():
     """
     获取本地数据库中贪婪恐惧指数的最新日期
@@ -391,26 +312,25 @@ def fetch_fng_history(start_date=None):
             required_limit = 3000  # 完整历史数据
         
         # 根据计算的limit参数构建URL
-        url = f'https://api.alternative.me/fng/?limit={required_limit}'
+        url = f'{FNG_API_URL}/fng/?limit={required_limit}'
         print(f'API请求URL: {url}')
         
         # 添加合理的延迟避免API限制
-        time.sleep(3)
+        metrics.wait(3, reason='pacing')
         
         max_retries = 3
         retry_count = 0
         data = {'data': []}
         while retry_count < max_retries:
             try:
-                response = requests.get(url)
-                response.raise_for_status()
+                response = http_get('fng', url)
                 data = response.json()
                 break
             except Exception as error:
                 retry_count += 1
                 if retry_count < max_retries:
                     print(f'请求失败，10秒后重新尝试...({retry_count}/{max_retries})')
-                    time.sleep(10)
+                    metrics.wait(10, reason='retry')
                 else:
                     print(f'已尝试{max_retries}次，请求仍然失败:', str(error))
                     break
@@ -462,51 +382,29 @@ def fetch_fear_greed_index(timestamp=None):
             date_obj = datetime.fromisoformat(timestamp)
             date = date_obj.strftime('%Y-%m-%d')
             
-            # 检查缓存
-            if date in fear_greed_cache:
-                cached_value = fear_greed_cache[date]
-                # 只在首次从缓存获取时打印消息
-                if not hasattr(fetch_fear_greed_index, 'last_cached_date') or fetch_fear_greed_index.last_cached_date != date:
-                    print(f'从缓存获取 {date} 的贪婪恐惧指数: {cached_value}')
-                    fetch_fear_greed_index.last_cached_date = date
-                return cached_value
-            
-            # 获取历史数据
-            history_data = fetch_fng_history()
-            
-            # 查找对应日期的数据
-            if date in history_data:
-                index_value = history_data[date]
-                print(f'找到 {date} 的贪婪恐惧指数: {index_value}')
-                
-                # 缓存结果
-                fear_greed_cache[date] = index_value
-                return index_value
-            else:
-                print(f'未找到 {date} 的贪婪恐惧指数')
-                return None
+            # 通过读穿缓存获取（内存 -> 数据库 -> 网络）
+            return fng_cache.get(date)
         else:
             # 获取当前贪婪恐惧指数
             print('请求当前贪婪恐惧指数...')
-            url = 'https://api.alternative.me/fng/?limit=1'
+            url = f'{FNG_API_URL}/fng/?limit=1'
             
             # 添加延迟避免API限制
-            time.sleep(1)
+            metrics.wait(1, reason='pacing')
             
             max_retries = 3
             retry_count = 0
             data = {'data': []}
             while retry_count < max_retries:
                 try:
-                    response = requests.get(url)
-                    response.raise_for_status()
+                    response = http_get('fng', url)
                     data = response.json()
                     break
                 except Exception as error:
                     retry_count += 1
                     if retry_count < max_retries:
                         print(f'请求失败，10秒后重新尝试...({retry_count}/{max_retries})')
-                        time.sleep(10)
+                        metrics.wait(10, reason='retry')
                     else:
                         print(f'已尝试{max_retries}次，请求仍然失败:', str(error))
                         break
@@ -534,41 +432,74 @@ def save_fear_greed_index(date, value):
         date (str): 日期，格式为YYYY-MM-DD
         value (int): 贪婪恐惧指数值
     """
+    save_fng_history({date: value})
+
+
+def save_fng_history(history_data, min_date=None):
+    """
+    将贪婪恐惧指数历史数据批量保存到数据库
+    过滤和排序一次性完成，每个分块只执行一条多行插入或更新语句
+    
+    参数:
+        history_data (dict): 日期(YYYY-MM-DD)到指数值的映射
+        min_date (str, optional): 只保存该日期及之后的数据
+    
+    返回:
+        int: 写入的记录数
+    """
+    if not history_data:
+        return 0
+    
+    # 按日期过滤并正序排序，确保id按时间顺序递增
+    dates = np.array(list(history_data.keys()), dtype='datetime64[D]')
+    values = np.fromiter(history_data.values(), dtype=np.int64, count=len(history_data))
+    if min_date:
+        mask = dates >= np.datetime64(min_date)
+        dates, values = dates[mask], values[mask]
+    order = np.argsort(dates, kind='stable')
+    rows = list(zip(dates[order].astype(str).tolist(), values[order].tolist()))
+    if not rows:
+        return 0
+    
     try:
-        # 获取数据库连接
         conn = get_db_connection()
         if not conn:
-            return
+            return 0
         
         cursor = conn.cursor()
         
-        # 插入或更新贪婪恐惧指数数据
-        insert_sql = """
-        INSERT INTO fear_greed_index (date, value)
-        VALUES (%s, %s)
-        ON DUPLICATE KEY UPDATE value = VALUES(value)
-        """
-        
-        cursor.execute(insert_sql, (date, value))
+        for i in range(0, len(rows), FNG_UPSERT_CHUNK):
+            chunk = rows[i:i + FNG_UPSERT_CHUNK]
+            insert_sql = f"""
+            INSERT INTO fear_greed_index (date, value)
+            VALUES {', '.join(['(%s, %s)'] * len(chunk))}
+            ON DUPLICATE KEY UPDATE value = VALUES(value)
+            """
+            with metrics.DB_QUERY_SECONDS.time(query='upsert_fear_greed_index'):
+                cursor.execute(insert_sql, [field for row in chunk for field in row])
         conn.commit()
+        metrics.ROWS_WRITTEN.inc(len(rows), table='fear_greed_index')
         
-        # 关闭连接
         cursor.close()
         conn.close()
+        return len(rows)
     except Exception as error:
-        # 处理保存失败的情况
         print('保存贪婪恐惧指数到数据库失败:', str(error))
-        # 关闭连接
-        if 'cursor' in locals() and cursor:
-            try:
-                cursor.close()
-            except:
-                pass
         if 'conn' in locals() and conn:
             try:
+                conn.rollback()
                 conn.close()
             except:
                 pass
+        return 0
+
+
+# 贪婪恐惧指数读穿缓存
+fng_cache = FngCache(fetch_history=fetch_fng_history, save_history=save_fng_history)
+
+# 数据库不可用时价格先写入本地预写日志，恢复后再批量写入
+price_spool = PriceSpool(SPOOL_PATH, sync_interval=SPOOL_SYNC_INTERVAL)
+
 
 def save_to_database(data):
     """
@@ -577,91 +508,108 @@ def save_to_database(data):
     参数:
         data (list): 包含价格信息的字典列表
     """
+    symbols = {}
+    for item in data:
+        symbols.setdefault(item['symbol'], []).append(item)
+    
+    for symbol, items in symbols.items():
+        timestamps = np.array([item['timestamp'] for item in items], dtype='datetime64[s]')
+        prices = np.array([np.nan if item['price'] is None else item['price'] for item in items], dtype=np.float64)
+        save_price_columns(symbol, timestamps, prices)
+
+
+def save_price_columns(symbol, timestamps, prices):
+    """
+    将单个币种的按列价格数据保存到MySQL数据库，避免重复数据；
+    数据库不可用或预写日志中还有积压时写入本地预写日志，保证数据不丢失且按顺序入库
+    
+    参数:
+        symbol (str): 加密货币的符号
+        timestamps (numpy.ndarray): 本地时间的 datetime64[s] 数组
+        prices (numpy.ndarray): 价格数组，NaN表示价格缺失
+    
+    返回:
+        int: 新写入数据库的记录数，写入预写日志时为0
+    """
+    if not len(timestamps):
+        return 0
+    
+    # 有积压时不再逐批等待数据库，直接追加到预写日志，由 drain_spool 按顺序排空
+    if not price_spool.has_pending():
+        written = write_price_columns(symbol, timestamps, prices)
+        if written is not None:
+            return written
+    price_spool.append(symbol, timestamps, prices)
+    return 0
+
+
+def drain_spool():
+    """
+    将本地预写日志中积压的价格批量写入数据库
+    
+    返回:
+        int: 写入的记录数
+    """
+    return price_spool.drain(write_price_columns)
+
+
+def write_price_columns(symbol, timestamps, prices):
+    """
+    将单个币种的按列价格数据写入MySQL数据库，已存在的时间点由唯一键忽略
+    
+    返回:
+        int: 新写入的记录数，数据库不可用或写入失败时返回 None
+    """
+    if not len(timestamps):
+        return 0
+    
     try:
         # 获取数据库连接
         conn = get_db_connection()
         if not conn:
-            return
+            return None
         
         cursor = conn.cursor()
         
-        # 准备插入数据
-        insert_data = []
-        batch_size = 100  # 每批次处理的记录数
-        total_processed = 0
-        duplicate_count = 0
-        
-        for i, item in enumerate(data):
-            # 解析时间戳
-            timestamp = datetime.fromisoformat(item['timestamp'])
-            
-            # 查询币种ID
-            cursor.execute("SELECT id FROM currencies WHERE symbol = %s", (item['symbol'],))
+        # 查询币种ID
+        with metrics.DB_QUERY_SECONDS.time(query='select_currency'):
+            cursor.execute("SELECT id FROM currencies WHERE symbol = %s", (symbol,))
             currency_result = cursor.fetchone()
-            if not currency_result:
-                print(f"币种 {item['symbol']} 不存在，跳过保存")
-                continue
-            
-            currency_id = currency_result[0]
-            
-            # 检查该时间点的数据是否已存在
-            check_sql = """
-            SELECT COUNT(*) FROM price_data
-            WHERE symbol = %s AND timestamp = %s
-            """
-            cursor.execute(check_sql, (item['symbol'], timestamp))
-            exists = cursor.fetchone()[0]
-            
-            if exists > 0:
-                duplicate_count += 1
-                # 每100条重复数据打印一次提示
-                if duplicate_count % 100 == 0:
-                    print(f"跳过 {duplicate_count} 条重复数据")
-                continue
-            
-            # 每100条打印一次进度
-            if (i + 1) % batch_size == 0:
-                print(f"处理进度: {i + 1}/{len(data)}")
-            
-            insert_data.append((
-                currency_id,
-                item['symbol'],
-                item['price'],
-                timestamp
-            ))
-            
-            total_processed += 1
-            
-            # 每1000条数据执行一次批量插入
-            if len(insert_data) >= 1000:
-                # 执行批量插入
-                insert_sql = """
-                INSERT INTO price_data (currency_id, symbol, price, timestamp)
-                VALUES (%s, %s, %s, %s)
-                """
-                cursor.executemany(insert_sql, insert_data)
+        if not currency_result:
+            print(f"币种 {symbol} 不存在，跳过保存")
+            cursor.close()
+            conn.close()
+            return 0
+        currency_id = currency_result[0]
+        
+        # 依靠 (symbol, timestamp) 唯一键去重，并发写入同一根K线（K线流、预写日志排空、启动轮询）时不会冲突
+        timestamps = timestamps.tolist()
+        if np.isnan(prices).any():
+            prices = [None if np.isnan(price) else price for price in prices.tolist()]
+        else:
+            prices = prices.tolist()
+        
+        insert_sql = """
+        INSERT IGNORE INTO price_data (currency_id, symbol, price, timestamp)
+        VALUES (%s, %s, %s, %s)
+        """
+        total_processed = 0
+        for i in range(0, len(timestamps), 1000):
+            with metrics.DB_QUERY_SECONDS.time(query='insert_price_data'):
+                total_processed += cursor.executemany(insert_sql, [
+                    (currency_id, symbol, price, timestamp)
+                    for price, timestamp in zip(prices[i:i + 1000], timestamps[i:i + 1000])
+                ]) or 0
                 conn.commit()
-                
-                print(f"已保存 {len(insert_data)} 条数据")
-                insert_data = []
-        
-        # 处理剩余数据
-        if insert_data:
-            insert_sql = """
-            INSERT INTO price_data (currency_id, symbol, price, timestamp)
-            VALUES (%s, %s, %s, %s)
-            """
-            cursor.executemany(insert_sql, insert_data)
-            conn.commit()
-            print(f"已保存 {len(insert_data)} 条数据")
+        duplicate_count = len(timestamps) - total_processed
         
-        if duplicate_count > 0:
-            print(f"跳过 {duplicate_count} 条重复数据")
-        print(f"成功保存 {total_processed} 条价格数据到数据库")
+        metrics.ROWS_WRITTEN.inc(total_processed, table='price_data')
+        metrics.ROWS_SKIPPED.inc(duplicate_count, table='price_data')
         
         # 关闭连接
         cursor.close()
         conn.close()
+        return total_processed
     except Exception as error:
         # 处理保存失败的情况
         print('保存到数据库失败:', str(error))
@@ -682,30 +630,66 @@ def save_to_database(data):
                 conn.close()
             except:
                 pass
+        return None
 
 
 def setup_scheduler():
     """
-    设置定时任务，每5分钟获取一次价格
+    设置定时任务：每5分钟获取一次价格（对齐K线收盘时刻），
+    每天更新贪婪恐惧指数和技术指标并增量检查数据完整性
     """
     print('正在设置定时任务...')
-    
-    # 初始化数据库
-    init_database()
-    
-    # 立即执行一次价格获取
-    fetch_prices()
-    
-    # 设置每5分钟执行一次fetch_prices函数
-    schedule.every(5).minutes.do(fetch_prices)
-    
-    print('定时任务已启动。每5分钟获取一次价格。')
+    metrics.start_exporters()
+    
+    feed = None
+    if PRICE_FEED == 'stream':
+        # 使用K线流实时写入收盘K线，REST轮询仅在流不可用时作为后备
+        from stream_feed import KlineStreamFeed
+        feed = KlineStreamFeed()
+        feed.start()
+        print('已启动K线流，REST轮询作为后备')
+    
+    def poll_prices():
+        if feed is not None and feed.is_healthy:
+            return
+        fetch_prices()
+    
+    def check_integrity():
+        checker = DailyDataChecker()
+        for symbol in ['BTC', 'ETH']:
+            checker.check_incremental(symbol)
+    
+    scheduler = JobScheduler()
+    
+    # 初始化数据库和首次价格获取在线程池中执行，不阻塞调度启动
+    def startup():
+        init_database()
+        drain_spool()
+        poll_prices()
+    # 以 fetch_prices 的名义提交，启动任务结束前跳过第一次对齐的价格获取，避免两者同时运行
+    scheduler.run_once('fetch_prices', startup)
+    
+    # K线收盘后5秒获取价格
+    scheduler.add_job('fetch_prices', poll_prices, interval=5 * 60, offset=5, warn_after=4 * 60)
+    # 每分钟尝试把预写日志中的积压写入数据库
+    scheduler.add_job('drain_spool', drain_spool, interval=60, offset=30, warn_after=10 * 60)
+    # 贪婪恐惧指数每天UTC 0点更新，延后10分钟获取
+    scheduler.add_job('update_fng', update_fng_data_2020_to_present, interval=24 * 60 * 60, offset=10 * 60, warn_after=10 * 60)
+    # 每天增量检查一次数据完整性（已验证水位之后的日期及最近几天）
+    scheduler.add_job('check_integrity', check_integrity, interval=24 * 60 * 60, offset=30 * 60, warn_after=3 * 60 * 60)
+    # 贪婪恐惧指数更新后，用前一天收盘的日K线增量更新技术指标
+    scheduler.add_job('update_indicators', update_indicators, interval=24 * 60 * 60, offset=20 * 60, warn_after=10 * 60)
+    
+    print('定时任务已启动。每5分钟获取一次价格，每天更新贪婪恐惧指数和技术指标并检查数据完整性。')
     print('按Ctrl+C停止脚本。')
     
-    # 持续运行定时任务
-    while True:
-        schedule.run_pending()  # 运行待执行的任务
-        time.sleep(1)  # 暂停1秒，避免CPU占用过高
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+        if feed is not None:
+            feed.stop()
+        price_spool.close()
 
 
 def get_latest_timestamp(symbol):
@@ -896,36 +880,9 @@ def update_fng_data_2020_to_present():
     
     print(f'找到 {len(history_data)} 条恐惧贪婪指数数据')
     
-    if history_data:
-        # 保存数据到数据库
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            
-            insert_count = 0
-            
-            # 按日期正序排序，确保id按时间顺序递增
-            sorted_dates = sorted(history_data.items(), key=lambda x: x[0])
-            
-            for date_str, value in sorted_dates:
-                try:
-                    # 只保存2020年至今的数据
-                    year = int(date_str.split('-')[0])
-                    if year >= 2020:
-                        insert_sql = """
-                        INSERT IGNORE INTO fear_greed_index (date, value)
-                        VALUES (%s, %s)
-                        """
-                        cursor.execute(insert_sql, (date_str, value))
-                        insert_count += 1
-                except Exception as e:
-                    print(f'保存 {date_str} 数据失败:', str(e))
-            
-            conn.commit()
-            print(f'成功保存 {insert_count} 条2020年至今的恐惧贪婪指数数据')
-            
-            cursor.close()
-            conn.close()
+    # 只保存2020年至今的数据
+    insert_count = save_fng_history(history_data, min_date='2020-01-01')
+    print(f'成功保存 {insert_count} 条2020年至今的恐惧贪婪指数数据')
     
     print('\n2020年至今恐惧贪婪指数数据更新完成！')
 
@@ -944,20 +901,40 @@ def main():
     print('执行顺序: 1. 获取贪婪恐惧指数数据 2. 获取BTC/ETH价格数据')
     print('=============================================')
     
+    metrics.start_exporters()
+    
     # 初始化数据库
-    init_database()
+    with profiling.phase('init_database'):
+        init_database()
+        drain_spool()
     
     # 1. 首先获取完整的贪婪恐惧指数数据
     print('\n=== 步骤1: 获取完整的贪婪恐惧指数数据 ===')
-    update_fng_data_2020_to_present()
+    with profiling.phase('update_fng_data'):
+        update_fng_data_2020_to_present()
     
-    # 2. 然后获取BTC和ETH的价格数据
+    # 2. 然后获取BTC和ETH的价格数据：先导入本地月度归档，REST只补齐最后一个归档月之后的数据
     print('\n=== 步骤2: 获取BTC和ETH价格数据 ===')
-    fetch_data_2020_to_present()
+    if ARCHIVE_DIR:
+        with profiling.phase('import_archives'):
+            import_directory(ARCHIVE_DIR)
+    with profiling.phase('fetch_price_data'):
+        fetch_data_2020_to_present()
+    with profiling.phase('drain_spool'):
+        drain_spool()
+    price_spool.close()
+    if price_spool.has_pending():
+        print(f'数据库不可用，{price_spool.pending_rows} 条价格数据保留在预写日志 {SPOOL_PATH}，下次运行时写入')
     
     print('\n2020年至今数据获取和更新任务完成！')
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='获取2020年至今的加密货币价格和贪婪恐惧指数数据')
+    parser.add_argument('--profile', nargs='?', const='phases', default='',
+                        help='剖析运行过程: phases（默认）、cprofile、memory、stacks 或 all，可用逗号组合')
+    args = parser.parse_args()
+    
     # 当脚本直接运行时执行主函数
-    main()
\ No newline at end of file
+    with profiling.profile_run('main', profiling.parse_options(args.profile)):
+        main()
\ No newline at end of file
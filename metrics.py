@@ -0,0 +1,246 @@
+import atexit
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f'{self.name}{_format_labels(key)} {value}')
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(key), 'value': value} for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['buckets']):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{_format_labels(key, {"le": bound})} {cumulative}')
+                lines.append(f'{self.name}_bucket{_format_labels(key, {"le": "+Inf"})} {state["count"]}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {state["sum"]}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {state["count"]}')
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(key), 'count': state['count'], 'sum': round(state['sum'], 6),
+                     'buckets': dict(zip((str(b) for b in self.buckets), state['buckets']))}
+                    for key, state in self._values.items()]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        return {
+            'timestamp': time.time(),
+            'metrics': {name: {'type': metric.type_name, 'values': metric.snapshot()}
+                        for name, metric in list(self._metrics.items())}
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+REGISTRY = MetricsRegistry()
+
+# ==================== 热点路径指标 ====================
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram('http_request_seconds', 'HTTP请求耗时（秒）')
+HTTP_ERRORS = REGISTRY.counter('http_errors_total', 'HTTP请求失败次数')
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.counter('rate_limit_wait_seconds_total', '限流和重试等待的总秒数')
+DB_QUERY_SECONDS = REGISTRY.histogram('db_query_seconds', '数据库往返耗时（秒）')
+ROWS_WRITTEN = REGISTRY.counter('rows_written_total', '写入数据库的行数')
+ROWS_SKIPPED = REGISTRY.counter('rows_skipped_total', '因重复跳过的行数')
+BACKTEST_DAYS = REGISTRY.counter('backtest_days_total', '回测模拟的天数')
+BACKTEST_DAYS_PER_SECOND = REGISTRY.gauge('backtest_days_per_second', '最近一次回测每秒模拟的天数')
+CACHE_HITS = REGISTRY.counter('cache_hits_total', '缓存命中次数')
+CACHE_MISSES = REGISTRY.counter('cache_misses_total', '缓存未命中次数')
+SPOOLED_ROWS = REGISTRY.counter('spooled_rows_total', '写入本地预写日志的行数')
+SPOOL_PENDING_ROWS = REGISTRY.gauge('spool_pending_rows', '本地预写日志中待写入数据库的行数')
+
+
+def wait(seconds, reason):
+    """
+    休眠并记录限流等待时间
+    """
+    RATE_LIMIT_WAIT_SECONDS.inc(seconds, reason=reason)
+    time.sleep(seconds)
+
+
+# ==================== 导出 ====================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """
+    启动Prometheus文本格式的 /metrics 端点
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f'指标端点已启动: http://{host}:{port}/metrics')
+    return server
+
+
+def start_json_dump(path, interval=60):
+    """
+    定期将指标写入JSON文件，进程退出时再写一次
+    """
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            try:
+                REGISTRY.dump_json(path)
+            except Exception as error:
+                logger.error(f'写入指标文件失败: {error}')
+
+    threading.Thread(target=_loop, name='metrics-dump', daemon=True).start()
+    atexit.register(REGISTRY.dump_json, path)
+    return stop
+
+
+def start_exporters():
+    """
+    根据配置启动指标导出（METRICS_PORT / METRICS_DUMP_PATH）
+    """
+    from config import METRICS_PORT, METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT)
+    if METRICS_DUMP_PATH:
+        start_json_dump(METRICS_DUMP_PATH, METRICS_DUMP_INTERVAL)
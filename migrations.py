@@ -0,0 +1,226 @@
+import logging
+
+import pymysql
+
+from config import DB_NAME, get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# 重复执行时可忽略的MySQL错误：1060 列已存在，1061 索引名已存在
+IGNORABLE_ERRORS = (1060, 1061)
+
+
+def _create_base_tables(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS currencies (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        symbol VARCHAR(10) NOT NULL UNIQUE,
+        name VARCHAR(50) NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS price_data (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        currency_id INT NOT NULL,
+        symbol VARCHAR(10) NOT NULL,
+        price DECIMAL(20, 2) NULL,
+        timestamp DATETIME NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (currency_id) REFERENCES currencies(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS fear_greed_index (
+        date DATE NOT NULL PRIMARY KEY,
+        value INT NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    cursor.executemany("INSERT IGNORE INTO currencies (symbol, name) VALUES (%s, %s)",
+                       [('BTC', 'Bitcoin'), ('ETH', 'Ethereum')])
+
+
+def _create_price_indexes(cursor):
+    _execute_ignoring(cursor, "CREATE INDEX idx_price_data_timestamp ON price_data(timestamp)")
+    _execute_ignoring(cursor, "CREATE INDEX idx_price_data_symbol ON price_data(symbol)")
+
+
+def _add_price_unique_key(cursor):
+    # 创建唯一键前先删除重复行，保留id最小的一条
+    deleted = cursor.execute("""
+    DELETE p1 FROM price_data p1
+    JOIN price_data p2 ON p1.symbol = p2.symbol AND p1.timestamp = p2.timestamp AND p1.id > p2.id
+    """)
+    if deleted:
+        logger.info(f'删除重复价格数据 {deleted} 条')
+    _execute_ignoring(cursor, "ALTER TABLE price_data ADD UNIQUE KEY uk_price_data_symbol_timestamp (symbol, timestamp)")
+
+
+def _create_trade_records(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS trade_records (
+        id INT AUTO_INCREMENT PRIMARY KEY COMMENT '交易记录ID',
+        trade_date DATE NOT NULL COMMENT '交易日期',
+        trade_type VARCHAR(10) NOT NULL COMMENT '交易类型：buy或sell',
+        btc_trade_amount DECIMAL(20, 8) NOT NULL COMMENT 'BTC交易数量',
+        btc_trade_value DECIMAL(20, 2) NOT NULL COMMENT 'BTC交易金额',
+        btc_trade_price DECIMAL(20, 2) NOT NULL COMMENT 'BTC交易时价格',
+        eth_trade_amount DECIMAL(20, 8) NOT NULL COMMENT 'ETH交易数量',
+        eth_trade_value DECIMAL(20, 2) NOT NULL COMMENT 'ETH交易金额',
+        eth_trade_price DECIMAL(20, 2) NOT NULL COMMENT 'ETH交易时价格',
+        total_trade_value DECIMAL(20, 2) NOT NULL COMMENT '交易总金额',
+        btc_holdings DECIMAL(20, 8) NOT NULL COMMENT 'BTC持仓数量',
+        eth_holdings DECIMAL(20, 8) NOT NULL COMMENT 'ETH持仓数量',
+        btc_average_price DECIMAL(20, 2) NOT NULL COMMENT 'BTC持仓均价',
+        eth_average_price DECIMAL(20, 2) NOT NULL COMMENT 'ETH持仓均价',
+        remaining_usd DECIMAL(20, 2) NOT NULL COMMENT '剩余资金（USD）',
+        account_total DECIMAL(20, 2) NOT NULL COMMENT '账户总价值',
+        trade_note TEXT NOT NULL COMMENT '交易备注',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间'
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='交易记录表';
+    """)
+
+
+def _add_trade_runs(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS trade_runs (
+        id INT AUTO_INCREMENT PRIMARY KEY COMMENT '回测运行ID',
+        parameters TEXT NOT NULL COMMENT '策略和成交参数（JSON）',
+        initial_funds DECIMAL(20, 2) NOT NULL COMMENT '初始资金',
+        start_date DATE NOT NULL COMMENT '回测开始日期',
+        end_date DATE NOT NULL COMMENT '回测结束日期',
+        status VARCHAR(10) NOT NULL DEFAULT 'running' COMMENT '状态：running或finished',
+        trade_count INT NOT NULL DEFAULT 0 COMMENT '交易笔数',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '开始时间',
+        finished_at TIMESTAMP NULL COMMENT '结束时间',
+        INDEX idx_trade_runs_created_at (created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='回测运行表';
+    """)
+    _execute_ignoring(cursor, "ALTER TABLE trade_records ADD COLUMN run_id INT NULL COMMENT '回测运行ID' AFTER id")
+    _execute_ignoring(cursor, "CREATE INDEX idx_trade_records_run_id ON trade_records(run_id)")
+
+
+def _create_indicator_state(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS indicator_state (
+        engine VARCHAR(50) NOT NULL COMMENT '指标组名称',
+        bar_interval VARCHAR(5) NOT NULL COMMENT 'K线间隔',
+        last_timestamp DATETIME NOT NULL COMMENT '最后处理的K线时间',
+        state MEDIUMTEXT NOT NULL COMMENT '增量计算状态（JSON）',
+        latest_values TEXT NOT NULL COMMENT '最新指标值（JSON）',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+        PRIMARY KEY (engine, bar_interval)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='技术指标增量状态表';
+    """)
+
+
+
+def _create_integrity_state(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS integrity_state (
+        symbol VARCHAR(10) NOT NULL PRIMARY KEY COMMENT '币种符号',
+        verified_through DATE NOT NULL COMMENT '此日期及之前的数据已验证完整（或为已知缺口）',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间'
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数据完整性检查水位表';
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS known_data_gaps (
+        symbol VARCHAR(10) NOT NULL COMMENT '币种符号',
+        date DATE NOT NULL COMMENT '缺失数据的日期',
+        record_count INT NOT NULL COMMENT '数据库中的记录数',
+        reason VARCHAR(255) NOT NULL COMMENT '无法修复的原因',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP COMMENT '记录时间',
+        PRIMARY KEY (symbol, date)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='已知无法修复的数据缺口（如交易所停机）';
+    """)
+
+
+# 按版本号顺序执行，已发布的迁移不要修改，新的表结构变更追加到末尾
+MIGRATIONS = [
+    (1, '创建 currencies、price_data、fear_greed_index 表和默认币种', _create_base_tables),
+    (2, '创建 price_data 时间和币种索引', _create_price_indexes),
+    (3, '去重并创建 price_data (symbol, timestamp) 唯一键', _add_price_unique_key),
+    (4, '创建 trade_records 表', _create_trade_records),
+    (5, '创建 trade_runs 表，trade_records 按 run_id 区分回测运行', _add_trade_runs),
+    (6, '创建 indicator_state 表', _create_indicator_state),
+    (7, '创建 integrity_state 和 known_data_gaps 表', _create_integrity_state),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _execute_ignoring(cursor, sql):
+    try:
+        cursor.execute(sql)
+    except (pymysql.err.OperationalError, pymysql.err.InternalError) as error:
+        if error.args[0] not in IGNORABLE_ERRORS:
+            raise
+
+
+def current_version(cursor):
+    """
+    返回已应用的最高版本号；数据库或 schema_version 表不存在时返回 0
+    """
+    try:
+        cursor.execute(f"SELECT MAX(version) FROM {DB_NAME}.schema_version")
+        result = cursor.fetchone()
+    except (pymysql.err.ProgrammingError, pymysql.err.OperationalError):
+        return 0
+    return result[0] if result and result[0] else 0
+
+
+def _apply_pending(conn, cursor, version):
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_NAME}")
+    cursor.execute(f"USE {DB_NAME}")
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT NOT NULL PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """)
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        logger.info(f'执行数据库迁移 {number}: {description}')
+        migration(cursor)
+        cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description))
+        conn.commit()
+
+
+def migrate():
+    """
+    将数据库结构升级到最新版本
+
+    已是最新版本时只执行一次版本查询；否则创建数据库（如不存在）并按顺序执行未应用的迁移，每个迁移提交后记录版本，
+    中途失败时下次启动从失败的迁移继续
+
+    返回:
+        int: 当前版本号，失败时返回 None
+    """
+    with get_db_connection(use_database=False) as conn:
+        if not conn:
+            return None
+        cursor = conn.cursor()
+        version = current_version(cursor)
+        if version < LATEST_VERSION:
+            try:
+                _apply_pending(conn, cursor, version)
+            except pymysql.err.Error as error:
+                conn.rollback()
+                logger.error(f'数据库迁移失败: {error}')
+                return None
+            finally:
+                cursor.close()
+            version = LATEST_VERSION
+        else:
+            cursor.close()
+        return version
+
+
+if __name__ == '__main__':
+    version = migrate()
+    if version is not None:
+        logger.info(f'数据库结构版本: {version}')
@@ -0,0 +1,432 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+KLINE_INTERVAL_MS = 5 * 60 * 1000
+INITIAL_PRICES = {'BTC': 30000.0, 'ETH': 2000.0}
+
+
+class SyntheticMarket:
+    """
+    确定性的合成行情：多年5分钟K线和每日贪婪恐惧指数
+
+    价格为分段漂移的几何随机游走，贪婪恐惧指数跟随BTC近30天收益率并叠加均值回复噪声，
+    因此会周期性出现极度恐惧和极度贪婪区间。相同参数生成的数据完全一致。
+    """
+    def __init__(self, start=None, days=365 * 3, symbols=('BTC', 'ETH'), seed=7):
+        if start is None:
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            start = today - timedelta(days=days - 1)
+        self.start = start
+        self.days = days
+        self.symbols = list(symbols)
+        rng = np.random.default_rng(seed)
+
+        start_ms = int(start.timestamp() * 1000)
+        count = days * 288
+        self.open_time = start_ms + np.arange(count, dtype=np.int64) * KLINE_INTERVAL_MS
+        self.open = {}
+        self.high = {}
+        self.low = {}
+        self.close = {}
+        self.volume = {}
+
+        # 每90天切换一次趋势，所有币种共享同一市场趋势
+        regimes = rng.normal(0, 0.00004, days // 90 + 1)
+        drift = np.repeat(regimes, 90 * 288)[:count]
+        market_noise = rng.normal(0, 0.0015, count)
+        for symbol in self.symbols:
+            returns = drift + market_noise + rng.normal(0, 0.001, count)
+            initial = INITIAL_PRICES.get(symbol, 100.0)
+            close = initial * np.exp(np.cumsum(returns))
+            open_ = np.concatenate(([initial], close[:-1]))
+            wick = np.abs(rng.normal(0, 0.0008, count))
+            self.open[symbol] = open_
+            self.close[symbol] = close
+            self.high[symbol] = np.maximum(open_, close) * (1 + wick)
+            self.low[symbol] = np.minimum(open_, close) * (1 - wick)
+            self.volume[symbol] = rng.gamma(2.0, 50.0, count)
+
+        daily_close = self.close[self.symbols[0]][287::288]
+        trailing = np.zeros(days)
+        trailing[30:] = daily_close[30:] / daily_close[:-30] - 1
+        noise = np.zeros(days)
+        for i in range(1, days):
+            noise[i] = 0.85 * noise[i - 1] + rng.normal(0, 6)
+        fng = 50 + 150 * trailing + noise
+        self.fng_dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+        self.fng_timestamps = [int((start + timedelta(days=i)).timestamp()) for i in range(days)]
+        self.fng_values = np.clip(np.rint(fng), 0, 100).astype(np.int64)
+
+    def slice(self, start_ms=None, end_ms=None, limit=500):
+        """
+        按币安分页语义返回 [lo, hi) 下标：有startTime时取其后的前limit条，否则取endTime之前的最后limit条
+        """
+        hi_bound = np.searchsorted(self.open_time, end_ms, side='right') if end_ms is not None else len(self.open_time)
+        if start_ms is not None:
+            lo = np.searchsorted(self.open_time, start_ms, side='left')
+            return lo, max(lo, min(hi_bound, lo + limit))
+        return max(0, hi_bound - limit), hi_bound
+
+    def klines(self, symbol, start_ms=None, end_ms=None, limit=500):
+        lo, hi = self.slice(start_ms, end_ms, limit)
+        columns = zip(
+            self.open_time[lo:hi].tolist(),
+            self.open[symbol][lo:hi].tolist(),
+            self.high[symbol][lo:hi].tolist(),
+            self.low[symbol][lo:hi].tolist(),
+            self.close[symbol][lo:hi].tolist(),
+            self.volume[symbol][lo:hi].tolist()
+        )
+        return [
+            [t, f'{o:.2f}', f'{h:.2f}', f'{l:.2f}', f'{c:.2f}', f'{v:.4f}',
+             t + KLINE_INTERVAL_MS - 1, f'{v * c:.2f}', 100, '0', '0', '0']
+            for t, o, h, l, c, v in columns
+        ]
+
+    def price_at(self, symbol, epoch_ms):
+        index = max(np.searchsorted(self.open_time, epoch_ms, side='right') - 1, 0)
+        return float(self.close[symbol][index])
+
+    def fng_history(self):
+        return dict(zip(self.fng_dates, self.fng_values.tolist()))
+
+    def fng_payload(self, limit):
+        """
+        按alternative.me格式返回最新的limit条数据（limit=0返回全部），按日期倒序
+        """
+        count = self.days if limit <= 0 else min(limit, self.days)
+        data = []
+        for i in range(self.days - 1, self.days - 1 - count, -1):
+            value = int(self.fng_values[i])
+            data.append({
+                'value': str(value),
+                'value_classification': _classify_fng(value),
+                'timestamp': str(self.fng_timestamps[i])
+            })
+        return {'name': 'Fear and Greed Index', 'data': data, 'metadata': {'error': None}}
+
+
+def _classify_fng(value):
+    if value < 25:
+        return 'Extreme Fear'
+    if value < 45:
+        return 'Fear'
+    if value <= 55:
+        return 'Neutral'
+    if value <= 75:
+        return 'Greed'
+    return 'Extreme Greed'
+
+
+class _RateLimiter:
+    """
+    模拟币安按分钟统计的请求权重，超限返回429，429后继续请求超过ban_after次返回418
+    """
+    def __init__(self, weight_limit, ban_after, ban_seconds):
+        self.weight_limit = weight_limit
+        self.ban_after = ban_after
+        self.ban_seconds = ban_seconds
+        self.window = None
+        self.used = 0
+        self.violations = 0
+        self.banned_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, weight):
+        """
+        返回 (状态码, 当前窗口已用权重, Retry-After秒数)
+        """
+        with self._lock:
+            now = time.time()
+            window = int(now // 60)
+            if window != self.window:
+                self.window = window
+                self.used = 0
+
+            if now < self.banned_until:
+                return 418, self.used, int(self.banned_until - now) + 1
+
+            if self.weight_limit and self.used + weight > self.weight_limit:
+                self.violations += 1
+                if self.ban_after and self.violations > self.ban_after:
+                    self.banned_until = now + self.ban_seconds
+                    return 418, self.used, self.ban_seconds
+                return 429, self.used, (window + 1) * 60 - int(now)
+
+            self.used += weight
+            self.violations = 0
+            return 200, self.used, 0
+
+
+class MockMarketServer(ThreadingHTTPServer):
+    """
+    模拟币安 /api/v3/klines、/api/v3/ticker/price 和 alternative.me /fng/ 的本地HTTP服务
+
+    latency 为每个请求的固定延迟秒数；weight_limit 为每分钟权重上限（0表示不限），
+    超限返回429，连续违规超过 ban_after 次后返回418并封禁 ban_seconds 秒。
+    响应带有 X-MBX-USED-WEIGHT-1M 头。
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, market, host='127.0.0.1', port=0, latency=0.0, weight_limit=1200,
+                 ban_after=5, ban_seconds=120):
+        super().__init__((host, port), _MockMarketHandler)
+        self.market = market
+        self.latency = latency
+        self.limiter = _RateLimiter(weight_limit, ban_after, ban_seconds)
+        self.stats = {'requests': 0, '200': 0, '400': 0, '404': 0, '429': 0, '418': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'http://{host}:{port}'
+
+    def count(self, status):
+        with self._stats_lock:
+            self.stats['requests'] += 1
+            self.stats[str(status)] = self.stats.get(str(status), 0) + 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='mock-market', daemon=True)
+        thread.start()
+        return thread
+
+
+class _MockMarketHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status)
+
+    def _binance(self, weight, build):
+        status, used, retry_after = self.server.limiter.acquire(weight)
+        headers = {'X-MBX-USED-WEIGHT-1M': used}
+        if status != 200:
+            headers['Retry-After'] = retry_after
+            message = 'Too many requests' if status == 429 else 'IP banned'
+            self._send(status, {'code': -1003, 'msg': message}, headers)
+            return
+        try:
+            payload = build()
+        except (KeyError, ValueError) as error:
+            self._send(400, {'code': -1121, 'msg': f'Invalid request: {error}'}, headers)
+            return
+        self._send(200, payload, headers)
+
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        market = self.server.market
+
+        if parsed.path == '/api/v3/klines':
+            def build():
+                symbol = params['symbol'].upper()
+                if not symbol.endswith('USDT') or symbol[:-4] not in market.symbols:
+                    raise ValueError(symbol)
+                if params.get('interval', '5m') != '5m':
+                    raise ValueError('只支持5m周期')
+                limit = min(int(params.get('limit', 500)), 1000)
+                start_ms = int(params['startTime']) if 'startTime' in params else None
+                # 与真实接口一致，不返回尚未开始的K线
+                now_ms = int(time.time() * 1000)
+                end_ms = min(int(params['endTime']), now_ms) if 'endTime' in params else now_ms
+                return market.klines(symbol[:-4], start_ms, end_ms, limit)
+            self._binance(2, build)
+        elif parsed.path == '/api/v3/ticker/price':
+            def build():
+                now_ms = int(time.time() * 1000)
+                if 'symbol' in params:
+                    symbol = params['symbol'].upper()
+                    if symbol[:-4] not in market.symbols:
+                        raise ValueError(symbol)
+                    return {'symbol': symbol, 'price': f'{market.price_at(symbol[:-4], now_ms):.2f}'}
+                return [{'symbol': f'{s}USDT', 'price': f'{market.price_at(s, now_ms):.2f}'} for s in market.symbols]
+            self._binance(2 if 'symbol' in params else 4, build)
+        elif parsed.path.rstrip('/') == '/fng':
+            self._send(200, market.fng_payload(int(params.get('limit', 1))))
+        else:
+            self._send(404, {'code': -1, 'msg': 'Not found'})
+
+
+def _by_label(counter, label, **match):
+    """
+    按标签汇总计数器的当前值
+    """
+    totals = {}
+    for item in counter.snapshot():
+        labels = item['labels']
+        if all(labels.get(key) == value for key, value in match.items()):
+            key = str(labels.get(label))
+            totals[key] = totals.get(key, 0) + item['value']
+    return totals
+
+
+def _delta(after, before):
+    return {key: value - before.get(key, 0) for key, value in after.items() if value != before.get(key, 0)}
+
+
+def run_stress(server, concurrency=32, requests_per_worker=20, price_workers=None, time_scale=1.0, use_mysql=False):
+    """
+    并发运行入库代码（main.fetch_historical_data 和 main.fetch_price）请求模拟服务，
+    统计吞吐、入库代码遇到的429/418响应、重试次数和等待时间，以及写入的行数
+
+    参数:
+        requests_per_worker: 每个历史数据线程请求的K线页数（每页500条），价格线程请求的次数
+        price_workers: 同时轮询实时价格的线程数，默认为 concurrency 的四分之一
+        time_scale: 节流和重试等待的缩放系数，1 为真实等待，小于 1 时加快压测（Retry-After 也按比例缩短）
+        use_mysql: 写入 DB_NAME 指向的MySQL测试库，否则写入内存中的数据库替身
+    """
+    import contextlib
+    import io
+    import os
+    import tempfile
+    from unittest import mock
+
+    import pymysql
+
+    import benchmark
+    import main
+    import metrics
+    from spool import PriceSpool
+
+    if use_mysql and benchmark.DB_NAME == benchmark.DEFAULT_DB_NAME:
+        raise RuntimeError(f'压测会写入合成数据，DB_NAME 不能是生产库 {benchmark.DEFAULT_DB_NAME}')
+    if price_workers is None:
+        price_workers = max(1, concurrency // 4)
+
+    market = server.market
+    context = benchmark.BenchmarkContext(market, use_mysql=use_mysql)
+    page = 500 * KLINE_INTERVAL_MS
+    span = int(market.open_time[-1]) - int(market.open_time[0])
+    end_ms = int(market.open_time[-1])
+
+    waits = {'pacing': 0, 'retry': 0}
+    waits_lock = threading.Lock()
+
+    def scaled_wait(seconds, reason):
+        with waits_lock:
+            waits[reason] = waits.get(reason, 0) + 1
+        metrics.RATE_LIMIT_WAIT_SECONDS.inc(seconds, reason=reason)
+        time.sleep(seconds * time_scale)
+
+    def history_worker(index):
+        symbol = market.symbols[index % len(market.symbols)]
+        # 各线程请求互不重叠的时间段，超出合成数据范围时回绕
+        offset = (index * requests_per_worker * page) % max(span - requests_per_worker * page, page)
+        start = datetime.fromtimestamp((end_ms - offset - requests_per_worker * page) / 1000)
+        end = datetime.fromtimestamp((end_ms - offset) / 1000)
+        main.fetch_historical_data(symbol, start, end)
+
+    def price_worker(index):
+        symbol = market.symbols[index % len(market.symbols)]
+        prices = [main.fetch_price(symbol) for _ in range(requests_per_worker)]
+        main.save_to_database(prices)
+
+    http_errors = _by_label(metrics.HTTP_ERRORS, 'status')
+    written = metrics.ROWS_WRITTEN.value(table='price_data')
+    spooled = metrics.SPOOLED_ROWS.value(table='price_data')
+    retry_seconds = metrics.RATE_LIMIT_WAIT_SECONDS.value(reason='retry')
+    spool_dir = tempfile.mkdtemp(prefix='stress-spool-')
+
+    with mock.patch.object(main, 'BINANCE_API_URL', server.url), \
+            mock.patch.object(main, 'FNG_API_URL', server.url), \
+            mock.patch.object(main, 'price_spool', PriceSpool(os.path.join(spool_dir, 'price_data.spool'))), \
+            mock.patch.object(metrics, 'wait', scaled_wait), \
+            mock.patch.object(pymysql, 'connect', context.connect), \
+            contextlib.redirect_stdout(io.StringIO()):
+        if use_mysql:
+            main.init_database()
+        queries = context.counter.queries
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency + price_workers) as executor:
+            futures = [executor.submit(history_worker, i) for i in range(concurrency)]
+            futures += [executor.submit(price_worker, i) for i in range(price_workers)]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - began
+
+    responses = _delta(_by_label(metrics.HTTP_ERRORS, 'status'), http_errors)
+    return {
+        'history_workers': concurrency,
+        'price_workers': price_workers,
+        'elapsed': round(elapsed, 3),
+        'requests': server.stats['requests'],
+        'requests_per_sec': round(server.stats['requests'] / elapsed, 1),
+        'fetch_errors': responses,
+        'rate_limited': responses.get('429', 0),
+        'banned': responses.get('418', 0),
+        'retries': waits.get('retry', 0),
+        'retry_wait_seconds': round(metrics.RATE_LIMIT_WAIT_SECONDS.value(reason='retry') - retry_seconds, 1),
+        'rows_saved': metrics.ROWS_WRITTEN.value(table='price_data') - written,
+        'rows_spooled': metrics.SPOOLED_ROWS.value(table='price_data') - spooled,
+        'db_queries': context.counter.queries - queries,
+        'server': dict(server.stats)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成行情数据和本地币安/alternative.me模拟服务')
+    parser.add_argument('command', choices=['serve', 'stress'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--years', type=float, default=3, help='合成数据年数（截止到今天）')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个请求的延迟秒数')
+    parser.add_argument('--weight-limit', type=int, default=1200, help='每分钟请求权重上限，0表示不限')
+    parser.add_argument('--concurrency', type=int, default=32, help='压测并发数')
+    parser.add_argument('--requests', type=int, default=20, help='压测每个线程请求的K线页数或实时价格次数')
+    parser.add_argument('--price-workers', type=int, default=None, help='压测时轮询实时价格的线程数，默认并发数的四分之一')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='压测时节流和重试等待的缩放系数，1为真实等待')
+    parser.add_argument('--mysql', action='store_true', help='压测写入本地MySQL（DB_NAME应指向测试库）而不是内存替身')
+    args = parser.parse_args()
+
+    market = SyntheticMarket(days=int(args.years * 365), seed=args.seed)
+    port = args.port if args.command == 'serve' else 0
+    server = MockMarketServer(market, host=args.host, port=port, latency=args.latency,
+                              weight_limit=args.weight_limit)
+
+    if args.command == 'serve':
+        print(f'模拟服务已启动: {server.url}', flush=True)
+        print(f'设置 BINANCE_API_URL={server.url} FNG_API_URL={server.url} 即可让入库代码使用模拟数据', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    server.start()
+    report = run_stress(server, concurrency=args.concurrency, requests_per_worker=args.requests,
+                        price_workers=args.price_workers, time_scale=args.time_scale, use_mysql=args.mysql)
+    server.shutdown()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
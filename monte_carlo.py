@@ -0,0 +1,207 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import strategies
+from investment_analysis import InvestmentAnalyzer, INITIAL_FUNDS, INVESTMENT_STRATEGY, START_DATE, END_DATE
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('block', 'regime')
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def load_history(start_date, end_date):
+    """
+    预加载数据，返回区间内贪婪恐惧指数和两种价格都齐全的交易日数组
+    """
+    analyzer = InvestmentAnalyzer(log_trades=False, persist_trades=False)
+    if not analyzer.preload_data():
+        return None
+    start_str = start_date.strftime('%Y-%m-%d')
+    end_str = end_date.strftime('%Y-%m-%d')
+    dates = [date for date in sorted(analyzer.daily_fng)
+             if start_str <= date <= end_str
+             and date in analyzer.daily_prices['BTC'] and date in analyzer.daily_prices['ETH']]
+    return {
+        'dates': np.array(dates, dtype='datetime64[D]'),
+        'fng': np.array([analyzer.daily_fng[date] for date in dates], dtype=np.int64),
+        'btc': np.array([analyzer.daily_prices['BTC'][date] for date in dates], dtype=np.float64),
+        'eth': np.array([analyzer.daily_prices['ETH'][date] for date in dates], dtype=np.float64)
+    }
+
+
+def _regime_segments(fng):
+    """
+    按情绪区间（恐惧 <45、中性 45-55、贪婪 >55）把收益序列切成连续的区段
+    """
+    regime = np.digitize(fng, [45, 56])
+    breaks = np.flatnonzero(np.diff(regime)) + 1
+    bounds = np.concatenate(([0], breaks, [len(fng)]))
+    return [np.arange(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def sample_paths(history, n_paths, method='block', block_size=30, rng=None):
+    """
+    生成重采样的价格和贪婪恐惧指数路径
+
+    日收益率与当日贪婪恐惧指数成对采样，保留二者在区块/区段内的联动关系
+
+    参数:
+        method: 'block' 为循环区块自助法，'regime' 为按情绪区段打乱顺序
+
+    返回:
+        tuple: (fng, btc, eth)，形状均为 (n_paths, 天数)
+    """
+    rng = rng or np.random.default_rng()
+    btc_returns = np.diff(np.log(history['btc']))
+    eth_returns = np.diff(np.log(history['eth']))
+    fng_after = history['fng'][1:]
+    steps = len(btc_returns)
+
+    if method == 'block':
+        n_blocks = -(-steps // block_size)
+        starts = rng.integers(0, steps, size=(n_paths, n_blocks))
+        index = (starts[:, :, None] + np.arange(block_size)) % steps
+        index = index.reshape(n_paths, -1)[:, :steps]
+    elif method == 'regime':
+        segments = _regime_segments(fng_after)
+        index = np.empty((n_paths, steps), dtype=np.int64)
+        for path in range(n_paths):
+            order = rng.permutation(len(segments))
+            index[path] = np.concatenate([segments[i] for i in order])
+    else:
+        raise ValueError(f'未知的重采样方法: {method}')
+
+    fng = np.empty((n_paths, steps + 1), dtype=np.int64)
+    fng[:, 0] = history['fng'][0]
+    fng[:, 1:] = fng_after[index]
+    btc = np.empty((n_paths, steps + 1))
+    btc[:, 0] = 0
+    btc[:, 1:] = np.cumsum(btc_returns[index], axis=1)
+    eth = np.empty((n_paths, steps + 1))
+    eth[:, 0] = 0
+    eth[:, 1:] = np.cumsum(eth_returns[index], axis=1)
+    return fng, history['btc'][0] * np.exp(btc), history['eth'][0] * np.exp(eth)
+
+
+def simulate_history(history, strategy, initial_funds):
+    """
+    在原始历史路径上回测，作为重采样结果的参照
+    """
+    market = {'fng': history['fng'][None, :], 'btc': history['btc'][None, :], 'eth': history['eth'][None, :]}
+    result = strategies.simulate(strategy.compile(market), market['btc'], market['eth'], initial_funds)
+    return float(result['return'][0]), float(result['max_drawdown'][0])
+
+
+def _run_chunk(history, strategy, initial_funds, n_paths, method, block_size, seed):
+    rng = np.random.default_rng(seed)
+    fng, btc, eth = sample_paths(history, n_paths, method, block_size, rng)
+    signals = strategy.compile({'fng': fng, 'btc': btc, 'eth': eth})
+    result = strategies.simulate(signals, btc, eth, initial_funds)
+    return result['return'], result['max_drawdown']
+
+
+def run_monte_carlo(history, strategy, initial_funds, n_paths=2000, method='block',
+                    block_size=30, workers=None, chunk_size=250, seed=None):
+    """
+    分块并行生成路径，每块内编译一次策略并向量化模拟所有路径
+
+    参数:
+        strategy: strategies.Strategy
+
+    返回:
+        tuple: (收益率数组, 最大回撤数组)
+    """
+    chunks = [min(chunk_size, n_paths - offset) for offset in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = workers or os.cpu_count() or 1
+
+    args = [(history, strategy, initial_funds, size, method, block_size, child) for size, child in zip(chunks, seeds)]
+    if workers == 1:
+        results = [_run_chunk(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_chunk, *zip(*args)))
+    returns = np.concatenate([result[0] for result in results])
+    drawdowns = np.concatenate([result[1] for result in results])
+    return returns, drawdowns
+
+
+def distribution(values):
+    return {
+        'mean': float(values.mean()),
+        'std': float(values.std()),
+        **{f'p{p}': float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='贪婪恐惧指数策略的蒙特卡洛/自助法稳健性检验')
+    parser.add_argument('--start', default=datetime(*START_DATE).strftime('%Y-%m-%d'), help='历史数据开始日期')
+    parser.add_argument('--end', default=datetime(*END_DATE).strftime('%Y-%m-%d'), help='历史数据结束日期')
+    parser.add_argument('--strategy', choices=sorted(strategies.STRATEGIES), default='fng_tiers', help='回测策略')
+    parser.add_argument('--strategy-param', action='append', metavar='KEY=VALUE',
+                        help='策略参数，可重复，如 --strategy-param window=100')
+    parser.add_argument('--paths', type=int, default=2000, help='模拟路径数')
+    parser.add_argument('--method', choices=METHODS, default='block', help='重采样方法')
+    parser.add_argument('--block-size', type=int, default=30, help='区块自助法的区块长度（天）')
+    parser.add_argument('--workers', type=int, default=None, help='并行进程数，默认CPU核数')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--output', help='将分布结果写入JSON文件')
+    args = parser.parse_args()
+
+    try:
+        strategy = strategies.build_strategy(args.strategy, INVESTMENT_STRATEGY,
+                                             **strategies.parse_strategy_params(args.strategy_param))
+    except (TypeError, ValueError) as error:
+        parser.error(f'策略参数无效: {error}')
+
+    history = load_history(datetime.strptime(args.start, '%Y-%m-%d'), datetime.strptime(args.end, '%Y-%m-%d'))
+    if history is None or len(history['dates']) < 2:
+        logger.error('历史数据不足，无法进行模拟')
+        return 1
+
+    # 原始历史路径作为参照
+    actual_return, actual_drawdown = simulate_history(history, strategy, INITIAL_FUNDS)
+
+    start = time.perf_counter()
+    returns, drawdowns = run_monte_carlo(history, strategy, INITIAL_FUNDS, args.paths, args.method,
+                                         args.block_size, args.workers, seed=args.seed)
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'strategy': args.strategy,
+        'method': args.method,
+        'paths': int(len(returns)),
+        'days': int(len(history['dates'])),
+        'seconds': round(elapsed, 3),
+        'historical': {'return': actual_return, 'max_drawdown': actual_drawdown},
+        'return': distribution(returns),
+        'max_drawdown': distribution(drawdowns),
+        'loss_probability': float((returns < 0).mean())
+    }
+
+    logger.info(f"{report['paths']} 条路径 × {report['days']} 天，耗时 {elapsed:.1f} 秒")
+    logger.info(f"历史路径: 收益率 {actual_return * 100:.2f}%, 最大回撤 {actual_drawdown * 100:.2f}%")
+    for name, label in (('return', '收益率'), ('max_drawdown', '最大回撤')):
+        stats = report[name]
+        logger.info(f"{label}: 均值 {stats['mean'] * 100:.2f}%, "
+                    + ', '.join(f"P{p} {stats[f'p{p}'] * 100:.2f}%" for p in PERCENTILES))
+    logger.info(f"亏损概率: {report['loss_probability'] * 100:.1f}%")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f'结果已写入 {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+import numpy as np
+
+DAYS_PER_YEAR = 365  # 加密货币全年交易
+
+
+class PriceTable:
+    """
+    按日排列的BTC/ETH日均价数组，缺失日期用前一日价格填充
+
+    只需从预加载数据构建一次，之后各回测配置按区间切片共享
+    """
+    def __init__(self, dates, prices):
+        self.dates = dates
+        self.prices = prices
+
+    @classmethod
+    def from_daily_prices(cls, daily_prices, symbols=('BTC', 'ETH')):
+        all_dates = sorted(set().union(*(daily_prices.get(symbol, {}) for symbol in symbols)))
+        if not all_dates:
+            return cls(np.empty(0, dtype='datetime64[D]'), {symbol: np.empty(0) for symbol in symbols})
+        dates = np.arange(np.datetime64(all_dates[0], 'D'), np.datetime64(all_dates[-1], 'D') + 1)
+        prices = {}
+        for symbol in symbols:
+            series = daily_prices.get(symbol, {})
+            column = np.full(len(dates), np.nan)
+            if series:
+                index = (np.array(list(series), dtype='datetime64[D]') - dates[0]).astype(np.int64)
+                column[index] = np.fromiter(series.values(), dtype=np.float64, count=len(series))
+            prices[symbol] = _forward_fill(column)
+        return cls(dates, prices)
+
+    def slice(self, start_date, end_date):
+        """
+        返回 [start_date, end_date] 区间的日期和价格视图，区间外的日期价格为0
+        """
+        dates = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+        if not len(self.dates):
+            return dates, {symbol: np.zeros(len(dates)) for symbol in self.prices}
+        lo = int((dates[0] - self.dates[0]).astype(np.int64))
+        hi = lo + len(dates)
+        if lo >= 0 and hi <= len(self.dates):
+            return dates, {symbol: column[lo:hi] for symbol, column in self.prices.items()}
+        prices = {}
+        for symbol, column in self.prices.items():
+            out = np.zeros(len(dates))
+            src_lo, src_hi = max(lo, 0), min(hi, len(self.dates))
+            if src_lo < src_hi:
+                out[src_lo - lo:src_hi - lo] = column[src_lo:src_hi]
+                # 数据结束后沿用最后价格
+                if hi > len(self.dates):
+                    out[src_hi - lo:] = column[-1]
+            prices[symbol] = out
+        return dates, prices
+
+
+def _forward_fill(column):
+    valid = ~np.isnan(column)
+    index = np.where(valid, np.arange(len(column)), 0)
+    np.maximum.accumulate(index, out=index)
+    filled = column[index]
+    # 首个有效价格之前没有价格，此时不可能有持仓
+    filled[~np.maximum.accumulate(valid)] = 0
+    return filled
+
+
+def equity_curve(trade_records, initial_funds, price_table, start_date, end_date):
+    """
+    根据交易记录中的持仓快照生成每日权益曲线
+
+    交易只在交易日改变持仓，因此将每笔交易后的持仓按日期向前填充，再与日均价相乘
+
+    返回:
+        tuple: (日期数组, 每日权益, 每日持仓市值)
+    """
+    dates, prices = price_table.slice(start_date, end_date)
+    if trade_records:
+        trade_dates = np.array([record['trade_date'] for record in trade_records], dtype='datetime64[D]')
+        cash = np.array([record['remaining_usd'] for record in trade_records], dtype=np.float64)
+        btc = np.array([record['btc_holdings'] for record in trade_records], dtype=np.float64)
+        eth = np.array([record['eth_holdings'] for record in trade_records], dtype=np.float64)
+        # 每天对应当天及之前最后一笔交易；第0项代表尚未交易的初始状态
+        position = np.searchsorted(trade_dates, dates, side='right')
+        cash = np.concatenate(([initial_funds], cash))[position]
+        btc = np.concatenate(([0.0], btc))[position]
+        eth = np.concatenate(([0.0], eth))[position]
+    else:
+        cash = np.full(len(dates), float(initial_funds))
+        btc = eth = np.zeros(len(dates))
+    invested = btc * prices['BTC'] + eth * prices['ETH']
+    return dates, cash + invested, invested
+
+
+def compute_metrics(dates, equity, invested, risk_free_rate=0.0):
+    """
+    对权益曲线一次性向量化计算风险与收益指标
+
+    返回:
+        dict: 总收益、年化收益、年化波动率、夏普、索提诺、最大回撤（含峰值和谷底日期）、平均仓位和持仓时间占比
+    """
+    if len(equity) < 2 or equity[0] <= 0:
+        return {}
+
+    returns = np.diff(equity) / equity[:-1]
+    excess = returns - risk_free_rate / DAYS_PER_YEAR
+    volatility = returns.std()
+    downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2))
+
+    running_peak = np.maximum.accumulate(equity)
+    drawdown = equity / running_peak - 1
+    trough = int(drawdown.argmin())
+    peak = int(equity[:trough + 1].argmax())
+
+    total_return = equity[-1] / equity[0] - 1
+    years = (len(equity) - 1) / DAYS_PER_YEAR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        exposure = np.where(equity > 0, invested / equity, 0.0)
+
+    return {
+        'days': int(len(equity)),
+        'total_return_pct': float(total_return * 100),
+        'cagr_pct': float(((equity[-1] / equity[0]) ** (1 / years) - 1) * 100) if equity[-1] > 0 else -100.0,
+        'volatility_pct': float(volatility * np.sqrt(DAYS_PER_YEAR) * 100),
+        'sharpe': float(excess.mean() / volatility * np.sqrt(DAYS_PER_YEAR)) if volatility > 0 else 0.0,
+        'sortino': float(excess.mean() / downside * np.sqrt(DAYS_PER_YEAR)) if downside > 0 else 0.0,
+        'max_drawdown_pct': float(drawdown[trough] * 100),
+        'max_drawdown_peak': str(dates[peak]),
+        'max_drawdown_trough': str(dates[trough]),
+        'exposure_pct': float(exposure.mean() * 100),
+        'time_in_market_pct': float((invested > 0).mean() * 100)
+    }
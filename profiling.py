@@ -0,0 +1,167 @@
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+from config import PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+PROFILE_OPTIONS = ('phases', 'cprofile', 'memory', 'stacks')
+
+_active = None
+
+
+class RunProfiler:
+    """
+    运行剖析器：记录各阶段耗时，可选cProfile、tracemalloc和采样调用栈（folded格式，可直接生成火焰图）
+
+    结果写入 output_dir：phases.json、cprofile.pstats/cprofile.txt、memory.txt、stacks.folded
+    """
+    def __init__(self, output_dir, cprofile=False, memory=False, stacks=False, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.use_cprofile = cprofile
+        self.use_memory = memory
+        self.use_stacks = stacks
+        self.sample_interval = sample_interval
+
+        self.phases = []
+        self._profile = None
+        self._stack_counts = Counter()
+        self._sampler = None
+        self._sampling = threading.Event()
+        self._target_thread = None
+        self._started_at = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        if self.use_memory:
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            record = {'phase': name, 'seconds': round(time.perf_counter() - start, 6)}
+            if self.use_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['peak_memory_mb'] = round(peak / 1024 / 1024, 3)
+            self.phases.append(record)
+            logger.debug(f"阶段 {name} 耗时 {record['seconds']:.3f} 秒")
+
+    def _sample(self):
+        frames_of = sys._current_frames
+        while not self._sampling.wait(self.sample_interval):
+            frame = frames_of().get(self._target_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self._stack_counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        if self.use_memory:
+            tracemalloc.start()
+        if self.use_cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        if self.use_stacks:
+            self._target_thread = threading.get_ident()
+            self._sampler = threading.Thread(target=self._sample, name='stack-sampler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._sampling.set()
+            self._sampler.join()
+        if self._profile is not None:
+            self._profile.disable()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = {
+            'total_seconds': round(time.perf_counter() - self._started_at, 6),
+            'phases': self.phases
+        }
+        with open(os.path.join(self.output_dir, 'phases.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+        if self._profile is not None:
+            self._profile.dump_stats(os.path.join(self.output_dir, 'cprofile.pstats'))
+            text = io.StringIO()
+            pstats.Stats(self._profile, stream=text).sort_stats('cumulative').print_stats(50)
+            with open(os.path.join(self.output_dir, 'cprofile.txt'), 'w', encoding='utf-8') as f:
+                f.write(text.getvalue())
+
+        if self.use_memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(os.path.join(self.output_dir, 'memory.txt'), 'w', encoding='utf-8') as f:
+                for stat in snapshot.statistics('lineno')[:50]:
+                    f.write(f'{stat}\n')
+
+        if self.use_stacks:
+            with open(os.path.join(self.output_dir, 'stacks.folded'), 'w', encoding='utf-8') as f:
+                for stack, count in self._stack_counts.most_common():
+                    f.write(f'{stack} {count}\n')
+
+        logger.info(f'剖析结果已写入 {self.output_dir}')
+        for record in self.phases:
+            logger.info(f"  {record['phase']}: {record['seconds']:.3f} 秒")
+        return summary
+
+
+def parse_options(value):
+    """
+    解析 --profile 参数，如 'phases'、'cprofile,memory' 或 'all'
+    """
+    if not value:
+        return set()
+    options = {item.strip() for item in value.split(',') if item.strip()}
+    if 'all' in options:
+        return set(PROFILE_OPTIONS)
+    unknown = options - set(PROFILE_OPTIONS)
+    if unknown:
+        raise ValueError(f"未知的剖析选项: {', '.join(sorted(unknown))}")
+    return options | {'phases'}
+
+
+@contextlib.contextmanager
+def profile_run(name, options, output_dir=None):
+    """
+    在整个运行期间启用剖析；options 为空时不做任何事
+    """
+    global _active
+    if not options:
+        yield None
+        return
+
+    output_dir = output_dir or os.path.join(PROFILE_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    profiler = RunProfiler(output_dir, cprofile='cprofile' in options, memory='memory' in options,
+                           stacks='stacks' in options)
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _active = None
+        profiler.stop()
+
+
+def phase(name):
+    """
+    记录一个阶段的耗时；未启用剖析时为空操作
+    """
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT = 1  # 缓存内容格式变化时递增，使旧条目失效
+
+
+def data_watermark(cursor):
+    """
+    数据水位：price_data 的最大自增ID（任何新写入或修复都会使其增大）和贪婪恐惧指数的最新日期、条数及总和
+
+    price_data 只查询主键最大值，不随数据量变慢；fear_greed_index 每天一行，聚合开销可以忽略
+    """
+    with metrics.DB_QUERY_SECONDS.time(query='data_watermark'):
+        cursor.execute("SELECT MAX(id) FROM price_data")
+        price_row = cursor.fetchone()
+        cursor.execute("SELECT MAX(date), COUNT(*), SUM(value) FROM fear_greed_index")
+        fng_row = cursor.fetchone()
+    return {
+        'price_data_id': price_row[0] if price_row else None,
+        'fng': [str(value) if value is not None else None for value in fng_row] if fng_row else None
+    }
+
+
+def cache_key(parameters, watermark):
+    """
+    以回测参数和数据水位的规范化JSON的SHA-256作为键
+    """
+    payload = json.dumps({'format': CACHE_FORMAT, 'parameters': parameters, 'watermark': watermark},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    回测结果的磁盘缓存，按内容寻址
+
+    键包含数据水位，新数据入库后键自然变化，旧条目不再命中并随LRU淘汰；
+    目录总大小超过 max_bytes 时按最近访问时间淘汰最旧的条目
+    """
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        """
+        读取缓存结果，未命中或内容损坏时返回 None
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                result = json.load(f)
+        except FileNotFoundError:
+            metrics.CACHE_MISSES.inc(cache='backtest_result')
+            return None
+        except (OSError, ValueError) as error:
+            logger.warning(f'回测结果缓存 {path} 读取失败: {error}')
+            metrics.CACHE_MISSES.inc(cache='backtest_result')
+            return None
+        # 更新访问时间，淘汰时据此判断最近使用
+        os.utime(path)
+        metrics.CACHE_HITS.inc(cache='backtest_result')
+        return result
+
+    def put(self, key, result):
+        """
+        原子写入缓存结果（先写临时文件再重命名），然后按大小淘汰
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        删除最久未访问的条目，直到目录总大小不超过 max_bytes
+        """
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            logger.debug(f'淘汰回测结果缓存 {path}')
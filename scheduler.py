@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    定时任务
+
+    interval 为执行间隔（秒）；align 为 True 时对齐到间隔的整数倍边界（如5分钟K线收盘时刻），
+    offset 为对齐边界之后的延迟秒数；warn_after 为单次执行的告警阈值（秒）。
+    线程无法被强制终止，超过阈值只记录错误，任务继续占用工作线程，结束前该任务的后续执行都会被跳过，
+    因此任务内部的网络和数据库调用需要自带超时
+    """
+    def __init__(self, name, func, interval, align=True, offset=0, warn_after=None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.align = align
+        self.offset = offset
+        self.warn_after = warn_after
+        self.next_run = None
+        self.future = None
+        self.started_at = None
+        self.overdue = False
+
+    def schedule_next(self, now):
+        if self.align:
+            boundary = (now - self.offset) // self.interval * self.interval + self.interval
+            self.next_run = boundary + self.offset
+        else:
+            self.next_run = now + self.interval
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+
+class JobScheduler:
+    """
+    基于截止时间的任务调度器
+
+    调度线程休眠到最近的截止时间才唤醒，任务在线程池中执行，
+    同名任务（包括 run_once 提交的一次性任务）上一次未结束时跳过本次执行，运行超过告警阈值的任务会被记录
+    """
+    def __init__(self, max_workers=4):
+        self.jobs = []
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._one_off = {}  # 任务名 -> 一次性任务的 future
+
+    def add_job(self, name, func, interval, align=True, offset=0, warn_after=None, run_immediately=False):
+        job = Job(name, func, interval, align=align, offset=offset, warn_after=warn_after)
+        now = time.time()
+        if run_immediately:
+            job.next_run = now
+        else:
+            job.schedule_next(now)
+        with self._lock:
+            self.jobs.append(job)
+        self._wakeup.set()
+        return job
+
+    def run_once(self, name, func):
+        """
+        立即在线程池中执行一次性任务，不阻塞调度线程；与定时任务同名时，一次性任务结束前跳过该定时任务
+        """
+        future = self.executor.submit(self._run_job, name, func)
+        with self._lock:
+            self._one_off[name] = future
+        return future
+
+    def _busy(self, job):
+        one_off = self._one_off.get(job.name)
+        return job.running or (one_off is not None and not one_off.done())
+
+    def _run_job(self, name, func):
+        start = time.monotonic()
+        try:
+            func()
+            logger.debug(f'任务 {name} 完成，耗时 {time.monotonic() - start:.2f} 秒')
+        except Exception as error:
+            logger.error(f'任务 {name} 执行失败: {error}')
+
+    def _dispatch(self, job, now):
+        if self._busy(job):
+            logger.warning(f'任务 {job.name} 上一次执行尚未结束，跳过本次执行')
+        else:
+            job.started_at = time.monotonic()
+            job.overdue = False
+            job.future = self.executor.submit(self._run_job, job.name, job.func)
+        job.schedule_next(now)
+
+    def _check_overdue(self, jobs):
+        now = time.monotonic()
+        next_deadline = None
+        for job in jobs:
+            if not job.warn_after or not job.running or job.overdue:
+                continue
+            deadline = job.started_at + job.warn_after
+            if now >= deadline:
+                job.overdue = True
+                logger.error(f'任务 {job.name} 已运行超过 {job.warn_after} 秒，可能已卡住；在其结束前跳过该任务的后续执行')
+            elif next_deadline is None or deadline - now < next_deadline:
+                next_deadline = deadline - now
+        return next_deadline
+
+    def run_pending(self):
+        """
+        执行所有到期任务，返回距离下一个截止时间的秒数
+        """
+        now = time.time()
+        with self._lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            if job.next_run <= now:
+                self._dispatch(job, now)
+
+        delays = [job.next_run - time.time() for job in jobs]
+        overdue_delay = self._check_overdue(jobs)
+        if overdue_delay is not None:
+            delays.append(overdue_delay)
+        return max(min(delays), 0) if delays else None
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            delay = self.run_pending()
+            self._wakeup.wait(delay)
+
+    def stop(self, wait=False):
+        self._stop.set()
+        self._wakeup.set()
+        self.executor.shutdown(wait=wait, cancel_futures=True)
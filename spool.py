@@ -0,0 +1,175 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 定长记录：币种、本地时间的秒级时间戳、价格（NaN表示价格缺失）
+RECORD_DTYPE = np.dtype([('symbol', 'S8'), ('timestamp', '<i8'), ('price', '<f8')])
+# 每次排空从文件读取的记录数
+SPOOL_DRAIN_CHUNK = 50000
+
+
+class PriceSpool:
+    """
+    price_data 的本地预写日志：数据库不可用或有积压时，解析后的价格先追加到本地文件，数据库恢复后按写入顺序批量排空
+
+    文件只追加定长记录，已写入数据库的位置记录在 <path>.offset 中；全部排空后文件截断为空。
+    fsync 按批进行：距上次同步超过 sync_interval 秒或未同步行数达到 sync_rows 时立即同步，
+    否则由后台定时器在 sync_interval 秒内补做，断电时最多丢失这段时间内追加的行
+    """
+    def __init__(self, path, sync_interval=1.0, sync_rows=10000):
+        self.path = path
+        self.offset_path = f'{path}.offset'
+        self.sync_interval = sync_interval
+        self.sync_rows = sync_rows
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._file = None
+        self._timer = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._size = 0
+        self._offset = 0
+        self._open()
+
+    def _open(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        # 崩溃时可能留下半条记录，丢弃不完整的尾部
+        self._size = size - size % RECORD_DTYPE.itemsize
+        if self._size != size:
+            logger.warning(f'预写日志 {self.path} 末尾有不完整的记录，已丢弃 {size - self._size} 字节')
+            os.truncate(self.path, self._size)
+        try:
+            with open(self.offset_path, encoding='utf-8') as f:
+                self._offset = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            self._offset = 0
+        if self._offset > self._size or self._offset % RECORD_DTYPE.itemsize:
+            logger.warning(f'预写日志偏移量 {self._offset} 无效，从头排空（重复行由写入时去重）')
+            self._offset = 0
+        metrics.SPOOL_PENDING_ROWS.set(self.pending_rows)
+
+    @property
+    def pending_rows(self):
+        return (self._size - self._offset) // RECORD_DTYPE.itemsize
+
+    def has_pending(self):
+        return self._size > self._offset
+
+    def append(self, symbol, timestamps, prices):
+        """
+        追加单个币种的按列价格数据
+
+        参数:
+            timestamps (numpy.ndarray): 本地时间的 datetime64[s] 数组
+            prices (numpy.ndarray): 价格数组，NaN表示价格缺失
+        """
+        records = np.empty(len(timestamps), dtype=RECORD_DTYPE)
+        records['symbol'] = symbol.encode('ascii')
+        records['timestamp'] = timestamps.astype('datetime64[s]').astype(np.int64)
+        records['price'] = prices
+        data = records.tobytes()
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, 'ab')
+            self._file.write(data)
+            self._size += len(data)
+            self._unsynced += len(records)
+            if self._unsynced >= self.sync_rows or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.sync_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        metrics.SPOOLED_ROWS.inc(len(records), table='price_data')
+        metrics.SPOOL_PENDING_ROWS.set(self.pending_rows)
+
+    def _sync_locked(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        with self._lock:
+            self._sync_locked()
+
+    def _save_offset_locked(self):
+        temp_path = f'{self.offset_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(str(self._offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.offset_path)
+
+    def drain(self, write, chunk_rows=SPOOL_DRAIN_CHUNK):
+        """
+        按写入顺序批量排空预写日志
+
+        参数:
+            write: 写入函数 write(symbol, timestamps, prices)，数据库不可用时返回 None
+
+        返回:
+            int: 本次排空的记录数；已有其他线程在排空时返回 0
+        """
+        if not self._drain_lock.acquire(blocking=False):
+            return 0
+        drained = 0
+        try:
+            while True:
+                with self._lock:
+                    self._sync_locked()
+                    offset, end = self._offset, self._size
+                    if offset >= end:
+                        if end:
+                            # 全部排空后截断文件，避免无限增长
+                            if self._file is not None:
+                                self._file.truncate(0)
+                            else:
+                                os.truncate(self.path, 0)
+                            self._size = self._offset = 0
+                            self._save_offset_locked()
+                        break
+                count = min(chunk_rows, (end - offset) // RECORD_DTYPE.itemsize)
+                records = np.fromfile(self.path, dtype=RECORD_DTYPE, count=count, offset=offset)
+                # 按币种分组批量写入，组内保持写入顺序
+                for symbol in dict.fromkeys(records['symbol'].tolist()):
+                    rows = records[records['symbol'] == symbol]
+                    if write(symbol.decode('ascii'), rows['timestamp'].astype('datetime64[s]'), rows['price']) is None:
+                        logger.warning(f'数据库仍不可用，预写日志剩余 {self.pending_rows} 行待写入')
+                        return drained
+                # 写入成功后才推进偏移量；中途崩溃时重放的行由写入时去重
+                with self._lock:
+                    self._offset = offset + count * RECORD_DTYPE.itemsize
+                    self._save_offset_locked()
+                drained += count
+                metrics.SPOOL_PENDING_ROWS.set(self.pending_rows)
+        finally:
+            metrics.SPOOL_PENDING_ROWS.set(self.pending_rows)
+            self._drain_lock.release()
+        if drained:
+            logger.info(f'预写日志已排空 {drained} 行')
+        return drained
+
+    def close(self):
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,320 @@
+import json
+
+import numpy as np
+
+import indicators
+
+FNG_LEVELS = 101  # 贪婪恐惧指数取值 0-100
+
+
+def fng_level(fng):
+    """
+    将贪婪恐惧指数限制在查找表下标范围内
+    """
+    return min(max(int(fng), 0), FNG_LEVELS - 1)
+
+
+class Rule:
+    """
+    策略规则基类
+
+    规则只在编译时执行一次，把行情数组变换为每日的买入金额/卖出比例数组，回测引擎逐日只做数组下标访问
+    """
+    def apply(self, market, signals):
+        raise NotImplementedError
+
+
+class FngTiers(Rule):
+    """
+    按贪婪恐惧指数分档买入固定金额、卖出持仓比例（InvestmentAnalyzer 的默认规则）
+    """
+    def __init__(self, buy_thresholds, sell_thresholds):
+        self.buy_thresholds = buy_thresholds
+        self.sell_thresholds = sell_thresholds
+        self._tables = None
+
+    @classmethod
+    def from_config(cls, investment_strategy):
+        return cls(investment_strategy['buy_thresholds'], investment_strategy['sell_thresholds'])
+
+    def tables(self):
+        """
+        展开为以贪婪恐惧指数为下标的查找表
+
+        返回:
+            dict: buy/sell 为当日是否买入/卖出（买入优先），sell_tier 为是否落在任一卖出档，
+                  buy_btc/buy_eth 为买入金额，sell_btc/sell_eth 为卖出比例
+        """
+        if self._tables is not None:
+            return self._tables
+
+        fng = np.arange(FNG_LEVELS)
+        buy_thresholds = sorted(self.buy_thresholds, key=lambda x: x['fng'], reverse=True)
+        sell_thresholds = sorted(self.sell_thresholds, key=lambda x: x['fng'])
+        max_buy = buy_thresholds[0]['fng'] if buy_thresholds else 20
+        min_sell = sell_thresholds[0]['fng'] if sell_thresholds else 80
+
+        buy_btc = np.zeros(FNG_LEVELS)
+        buy_eth = np.zeros(FNG_LEVELS)
+        # 从高到低覆盖，最终每个指数取满足 fng < 阈值 的最低档
+        for threshold in buy_thresholds:
+            mask = fng < threshold['fng']
+            buy_btc[mask] = threshold['btc']
+            buy_eth[mask] = threshold['eth']
+
+        sell_btc = np.zeros(FNG_LEVELS)
+        sell_eth = np.zeros(FNG_LEVELS)
+        # 从低到高覆盖，最终每个指数取满足 fng >= 阈值 的最高档
+        for threshold in sell_thresholds:
+            mask = fng >= threshold['fng']
+            sell_btc[mask] = threshold['btc']
+            sell_eth[mask] = threshold['eth']
+
+        buy = fng < max_buy
+        sell_tier = fng >= min_sell
+        self._tables = {'buy': buy, 'sell': ~buy & sell_tier, 'sell_tier': sell_tier,
+                        'buy_btc': buy_btc, 'buy_eth': buy_eth, 'sell_btc': sell_btc, 'sell_eth': sell_eth}
+        return self._tables
+
+    def apply(self, market, signals):
+        tables = self.tables()
+        fng = np.clip(market['fng'], 0, FNG_LEVELS - 1)
+        buy = tables['buy'][fng]
+        sell = tables['sell'][fng]
+        signals['buy_btc'] += np.where(buy, tables['buy_btc'][fng], 0.0)
+        signals['buy_eth'] += np.where(buy, tables['buy_eth'][fng], 0.0)
+        np.maximum(signals['sell_btc'], np.where(sell, tables['sell_btc'][fng], 0.0), out=signals['sell_btc'])
+        np.maximum(signals['sell_eth'], np.where(sell, tables['sell_eth'][fng], 0.0), out=signals['sell_eth'])
+
+
+class MovingAverageFilter(Rule):
+    """
+    均线过滤：只在价格低于N日均线时买入、高于均线时卖出（前N天使用累计均值）
+    """
+    def __init__(self, window=200, symbol='BTC', filter_buys=True, filter_sells=True):
+        self.window = window
+        self.symbol = symbol
+        self.filter_buys = filter_buys
+        self.filter_sells = filter_sells
+
+    def apply(self, market, signals):
+        price = market[self.symbol.lower()]
+        average = indicators.sma(price, self.window)
+        if self.filter_buys:
+            below = price < average
+            signals['buy_btc'] *= below
+            signals['buy_eth'] *= below
+        if self.filter_sells:
+            above = price > average
+            signals['sell_btc'] *= above
+            signals['sell_eth'] *= above
+
+
+class DcaSchedule(Rule):
+    """
+    定投：每隔 every_days 天买入固定金额，与其他买入规则的金额相加
+    """
+    def __init__(self, every_days=7, btc=100, eth=50, offset=0):
+        self.every_days = every_days
+        self.btc = btc
+        self.eth = eth
+        self.offset = offset
+
+    def apply(self, market, signals):
+        days = market['fng'].shape[-1]
+        scheduled = (np.arange(days) - self.offset) % self.every_days == 0
+        signals['buy_btc'] += np.where(scheduled, self.btc, 0.0)
+        signals['buy_eth'] += np.where(scheduled, self.eth, 0.0)
+
+
+class RsiFilter(Rule):
+    """
+    RSI过滤：只在RSI低于 buy_below 时买入、高于 sell_above 时卖出（RSI预热期内不过滤）
+    """
+    def __init__(self, period=14, buy_below=50, sell_above=50, symbol='BTC'):
+        self.period = period
+        self.buy_below = buy_below
+        self.sell_above = sell_above
+        self.symbol = symbol
+
+    def apply(self, market, signals):
+        value = indicators.rsi(market[self.symbol.lower()], self.period)
+        warming_up = np.isnan(value)
+        allow_buy = warming_up | (value < self.buy_below)
+        allow_sell = warming_up | (value > self.sell_above)
+        signals['buy_btc'] *= allow_buy
+        signals['buy_eth'] *= allow_buy
+        signals['sell_btc'] *= allow_sell
+        signals['sell_eth'] *= allow_sell
+
+
+class Cooldown(Rule):
+    """
+    冷却期：两次买入（或两次卖出）之间至少间隔的天数，由回测引擎按状态执行
+    """
+    def __init__(self, buy_days=0, sell_days=0):
+        self.buy_days = buy_days
+        self.sell_days = sell_days
+
+    def apply(self, market, signals):
+        signals['buy_cooldown'] = max(signals['buy_cooldown'], self.buy_days)
+        signals['sell_cooldown'] = max(signals['sell_cooldown'], self.sell_days)
+
+
+class Strategy:
+    """
+    由若干规则声明的策略，编译后得到与行情数组同形状的每日信号数组
+    """
+    def __init__(self, name, rules):
+        self.name = name
+        self.rules = list(rules)
+
+    def compile(self, market):
+        """
+        参数:
+            market (dict): fng/btc/eth 数组，形状为 (天数,) 或 (路径数, 天数)
+
+        返回:
+            dict: buy_btc/buy_eth 每日买入金额，sell_btc/sell_eth 每日卖出比例，buy_cooldown/sell_cooldown 冷却天数
+        """
+        shape = np.shape(market['fng'])
+        signals = {'buy_btc': np.zeros(shape), 'buy_eth': np.zeros(shape),
+                   'sell_btc': np.zeros(shape), 'sell_eth': np.zeros(shape),
+                   'buy_cooldown': 0, 'sell_cooldown': 0}
+        for rule in self.rules:
+            rule.apply(market, signals)
+        return signals
+
+    def describe(self):
+        """
+        策略名和各规则的参数，用于区分回测运行和生成缓存键
+        """
+        return {'name': self.name,
+                'rules': [{'rule': type(rule).__name__,
+                           **{key: value for key, value in vars(rule).items() if not key.startswith('_')}}
+                          for rule in self.rules]}
+
+
+def simulate(signals, btc_price, eth_price, initial_funds):
+    """
+    按编译好的信号数组回测，所有路径每天一次向量运算；买入时BTC先于ETH，资金不足时跳过对应部分
+
+    参数:
+        signals: Strategy.compile 的结果
+        btc_price, eth_price: 形状为 (路径数, 天数) 的价格
+
+    返回:
+        dict: return/max_drawdown/buys/sells，均为每条路径一个值
+    """
+    n_paths, days = btc_price.shape
+    cash = np.full(n_paths, float(initial_funds))
+    btc = np.zeros(n_paths)
+    eth = np.zeros(n_paths)
+    peak = cash.copy()
+    max_drawdown = np.zeros(n_paths)
+    buys = np.zeros(n_paths, dtype=np.int64)
+    sells = np.zeros(n_paths, dtype=np.int64)
+    never = -10 ** 9
+    last_buy = np.full(n_paths, never)
+    last_sell = np.full(n_paths, never)
+    buy_btc = np.broadcast_to(signals['buy_btc'], btc_price.shape)
+    buy_eth = np.broadcast_to(signals['buy_eth'], btc_price.shape)
+    sell_btc = np.broadcast_to(signals['sell_btc'], btc_price.shape)
+    sell_eth = np.broadcast_to(signals['sell_eth'], btc_price.shape)
+    equity = cash.copy()
+
+    for day in range(days):
+        pb = btc_price[:, day]
+        pe = eth_price[:, day]
+        btc_investment = buy_btc[:, day]
+        eth_investment = buy_eth[:, day]
+
+        wants_buy = (btc_investment + eth_investment > 0) & (day - last_buy >= signals['buy_cooldown'])
+        can_buy_btc = wants_buy & (cash >= btc_investment)
+        btc_cost = np.where(can_buy_btc, btc_investment, 0.0)
+        cash -= btc_cost
+        btc += btc_cost / pb
+        eth_cost = np.where(can_buy_btc & (cash >= eth_investment), eth_investment, 0.0)
+        cash -= eth_cost
+        eth += eth_cost / pe
+        buys += can_buy_btc
+        last_buy = np.where(can_buy_btc, day, last_buy)
+
+        selling = ((sell_btc[:, day] > 0) | (sell_eth[:, day] > 0)) & ((btc > 0) | (eth > 0)) \
+            & (day - last_sell >= signals['sell_cooldown'])
+        btc_sold = np.where(selling, btc * sell_btc[:, day], 0.0)
+        eth_sold = np.where(selling, eth * sell_eth[:, day], 0.0)
+        btc -= btc_sold
+        eth -= eth_sold
+        cash += btc_sold * pb + eth_sold * pe
+        sells += selling
+        last_sell = np.where(selling, day, last_sell)
+
+        equity = cash + btc * pb + eth * pe
+        np.maximum(peak, equity, out=peak)
+        np.minimum(max_drawdown, equity / peak - 1, out=max_drawdown)
+
+    return {'return': equity / initial_funds - 1, 'max_drawdown': max_drawdown, 'buys': buys, 'sells': sells}
+
+
+# ==================== 策略注册 ====================
+
+STRATEGIES = {}
+
+
+def register_strategy(name):
+    """
+    注册策略工厂函数，工厂接收 investment_strategy 配置和关键字参数，返回 Strategy
+    """
+    def decorator(factory):
+        STRATEGIES[name] = factory
+        return factory
+    return decorator
+
+
+def build_strategy(name, investment_strategy, **params):
+    if name not in STRATEGIES:
+        raise ValueError(f"未知的策略: {name}，可选: {', '.join(sorted(STRATEGIES))}")
+    return STRATEGIES[name](investment_strategy, **params)
+
+
+def parse_strategy_params(items):
+    """
+    解析命令行的 KEY=VALUE 策略参数，值按 JSON 解析（如 200、true），解析失败时作为字符串
+    """
+    params = {}
+    for item in items or []:
+        key, separator, value = item.partition('=')
+        if not separator or not key:
+            raise ValueError(f'策略参数格式应为 KEY=VALUE: {item}')
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return params
+
+
+@register_strategy('fng_tiers')
+def fng_tiers_strategy(investment_strategy):
+    return Strategy('fng_tiers', [FngTiers.from_config(investment_strategy)])
+
+
+@register_strategy('fng_tiers_ma')
+def fng_tiers_ma_strategy(investment_strategy, window=200):
+    return Strategy('fng_tiers_ma', [FngTiers.from_config(investment_strategy), MovingAverageFilter(window)])
+
+
+@register_strategy('fng_tiers_rsi')
+def fng_tiers_rsi_strategy(investment_strategy, period=14, buy_below=50, sell_above=50):
+    return Strategy('fng_tiers_rsi', [FngTiers.from_config(investment_strategy),
+                                      RsiFilter(period, buy_below, sell_above)])
+
+
+@register_strategy('fng_tiers_cooldown')
+def fng_tiers_cooldown_strategy(investment_strategy, buy_days=7, sell_days=7):
+    return Strategy('fng_tiers_cooldown', [FngTiers.from_config(investment_strategy), Cooldown(buy_days, sell_days)])
+
+
+@register_strategy('dca')
+def dca_strategy(investment_strategy, every_days=7, btc=100, eth=50):
+    return Strategy('dca', [DcaSchedule(every_days, btc, eth)])
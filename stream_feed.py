@@ -0,0 +1,378 @@
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import random
+import socketserver
+import struct
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+from config import BINANCE_STREAM_URL, SYMBOLS
+
+logger = logging.getLogger(__name__)
+
+KLINE_INTERVAL = '5m'
+KLINE_INTERVAL_MS = 5 * 60 * 1000
+GAP_RETRY_SECONDS = 60  # 回补未完成的区间的重试间隔
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class StreamUnavailable(Exception):
+    pass
+
+
+def build_stream_url(symbols, base_url=None):
+    """
+    构建币安组合流地址，订阅每个币种的5分钟K线
+    """
+    base_url = (base_url or BINANCE_STREAM_URL).rstrip('/')
+    streams = '/'.join(f'{symbol.lower()}usdt@kline_{KLINE_INTERVAL}' for symbol in symbols)
+    return f'{base_url}/stream?streams={streams}'
+
+
+def kline_to_row(symbol, kline):
+    """
+    将已收盘的K线转换为入库格式，价格取开盘价和收盘价的均价，与REST历史数据保持一致
+    """
+    open_price = float(kline['o'])
+    close_price = float(kline['c'])
+    return {
+        'symbol': symbol,
+        'price': (open_price + close_price) / 2,
+        'timestamp': datetime.fromtimestamp(kline['t'] / 1000).isoformat()
+    }
+
+
+def _default_on_candle(row):
+    from main import save_to_database
+    save_to_database([row])
+
+
+def _default_backfill(symbol, start_time, end_time):
+    from main import fetch_historical_data
+    return fetch_historical_data(symbol, start_time, end_time)
+
+
+def _default_latest_timestamp(symbol):
+    from main import get_latest_timestamp
+    return get_latest_timestamp(symbol)
+
+
+class KlineStreamFeed:
+    """
+    通过持久连接消费K线流，收盘K线直接写入入库流程
+    断线后自动重连，并通过REST接口回补断线期间缺失的K线
+    """
+    def __init__(self, symbols=None, url=None, on_candle=None, backfill=None,
+                 latest_timestamp=None, max_reconnects=5, reconnect_delay=5, recv_timeout=90):
+        self.symbols = [s.upper() for s in (symbols or SYMBOLS)]
+        self.url = url or build_stream_url(self.symbols)
+        self.on_candle = on_candle or _default_on_candle
+        self.backfill = backfill or _default_backfill
+        self.latest_timestamp = latest_timestamp or _default_latest_timestamp
+        self.max_reconnects = max_reconnects
+        self.reconnect_delay = reconnect_delay
+        self.recv_timeout = recv_timeout
+
+        self.last_open_time = {}  # 每个币种最后一根已收盘K线的开盘时间（毫秒）
+        self.gaps = {}  # 每个币种回补未完成、待重试的K线开盘时间区间 [(开始, 结束)]（毫秒）
+        self._next_gap_retry = 0
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._ws = None
+
+    @property
+    def is_healthy(self):
+        return self.connected.is_set()
+
+    def stop(self):
+        self._stop.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+
+    def _load_watermarks(self):
+        for symbol in self.symbols:
+            if symbol in self.last_open_time:
+                continue
+            latest = self.latest_timestamp(symbol)
+            if latest:
+                self.last_open_time[symbol] = int(latest.timestamp() * 1000)
+
+    def replay_gaps(self):
+        """
+        回补从最后一根已收盘K线到当前时间之间缺失的数据，以及之前回补未完成的区间
+
+        backfill 返回已保存的最后一根K线的开盘时间，水位只推进到实际保存的位置；
+        失败或只保存了一部分时，剩余区间留在 gaps 中，之后每隔 GAP_RETRY_SECONDS 秒重试
+        """
+        now_ms = int(time.time() * 1000)
+        # 当前尚未收盘的K线由流推送，只回补已经收盘的区间
+        current_open = now_ms - now_ms % KLINE_INTERVAL_MS
+        self._next_gap_retry = time.monotonic() + GAP_RETRY_SECONDS
+        for symbol in self.symbols:
+            pending = self.gaps.pop(symbol, [])
+            last = self.last_open_time.get(symbol)
+            if last is not None:
+                # 待重试的区间已在 pending 中，新的缺口从它们之后开始
+                last = max([last] + [gap_end for _, gap_end in pending])
+                if last + KLINE_INTERVAL_MS < current_open:
+                    pending.append((last + KLINE_INTERVAL_MS, current_open - KLINE_INTERVAL_MS))
+            for gap_start, gap_end in pending:
+                self._replay_gap(symbol, gap_start, gap_end)
+
+    def _replay_gap(self, symbol, gap_start, gap_end):
+        logger.info(f'{symbol} 回补缺失K线: {datetime.fromtimestamp(gap_start / 1000)} 到 {datetime.fromtimestamp(gap_end / 1000)}')
+        try:
+            stored = self.backfill(symbol, datetime.fromtimestamp(gap_start / 1000),
+                                   datetime.fromtimestamp((gap_end + KLINE_INTERVAL_MS - 1) / 1000))
+        except Exception as error:
+            logger.error(f'{symbol} 回补K线失败: {error}')
+            stored = None
+        stored_ms = int(stored.timestamp() * 1000) if stored else None
+        if stored_ms is not None and stored_ms > self.last_open_time.get(symbol, -1):
+            self.last_open_time[symbol] = stored_ms
+        if stored_ms is None or stored_ms < gap_end:
+            remaining = gap_start if stored_ms is None else max(gap_start, stored_ms + KLINE_INTERVAL_MS)
+            self.gaps.setdefault(symbol, []).append((remaining, gap_end))
+            logger.warning(f'{symbol} 回补未完成，{datetime.fromtimestamp(remaining / 1000)} 起的K线将在 '
+                           f'{GAP_RETRY_SECONDS} 秒后重试')
+
+    def handle_message(self, raw):
+        message = json.loads(raw)
+        # 组合流的消息包装在data字段中
+        data = message.get('data', message)
+        if data.get('e') != 'kline':
+            return None
+
+        kline = data['k']
+        if not kline.get('x'):
+            return None  # 只处理已收盘的K线
+
+        symbol = kline['s'][:-len('USDT')] if kline['s'].endswith('USDT') else kline['s']
+        open_time = int(kline['t'])
+        if open_time <= self.last_open_time.get(symbol, -1):
+            return None  # 回补或重连时已写入
+
+        row = kline_to_row(symbol, kline)
+        self.on_candle(row)
+        self.last_open_time[symbol] = open_time
+        return row
+
+    def _connect(self):
+        import websocket  # websocket-client
+        return websocket.create_connection(self.url, timeout=self.recv_timeout)
+
+    def run(self):
+        """
+        持续消费K线流，连续重连失败超过上限时抛出StreamUnavailable
+        """
+        self._load_watermarks()
+        failures = 0
+
+        while not self._stop.is_set():
+            try:
+                self._ws = self._connect()
+                logger.info(f'K线流已连接: {self.url}')
+                self.connected.set()
+                failures = 0
+                self.replay_gaps()
+
+                while not self._stop.is_set():
+                    raw = self._ws.recv()
+                    if not raw:
+                        raise ConnectionError('K线流连接已关闭')
+                    self.handle_message(raw)
+                    if self.gaps and time.monotonic() >= self._next_gap_retry:
+                        self.replay_gaps()
+            except Exception as error:
+                self.connected.clear()
+                if self._stop.is_set():
+                    break
+                failures += 1
+                if failures > self.max_reconnects:
+                    raise StreamUnavailable(f'K线流连续 {failures} 次连接失败: {error}') from error
+                delay = min(self.reconnect_delay * 2 ** (failures - 1), 300)
+                logger.warning(f'K线流中断: {error}，{delay} 秒后重连 ({failures}/{self.max_reconnects})')
+                self._stop.wait(delay)
+            finally:
+                self.connected.clear()
+                if self._ws is not None:
+                    try:
+                        self._ws.close()
+                    except Exception:
+                        pass
+                    self._ws = None
+
+        logger.info('K线流已停止')
+
+    def start(self):
+        """
+        在后台线程中运行，失败后由REST轮询接管
+        """
+        def _target():
+            try:
+                self.run()
+            except StreamUnavailable as error:
+                logger.error(f'{error}，回退到REST轮询')
+            except ImportError:
+                logger.error('未安装websocket-client，回退到REST轮询')
+
+        thread = threading.Thread(target=_target, name='kline-stream', daemon=True)
+        thread.start()
+        return thread
+
+
+# ==================== 本地测试用流服务 ====================
+
+def _send_text_frame(sock, text):
+    payload = text.encode('utf-8')
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x81, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x81, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x81, 127, length)
+    sock.sendall(header + payload)
+
+
+class _StubStreamHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return
+            request += chunk
+
+        lines = request.decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1]
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                key, value = line.split(':', 1)
+                headers[key.strip().lower()] = value.strip()
+
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.request.sendall((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+
+        streams = parse_qs(urlparse(path).query).get('streams', [''])[0].split('/')
+        self.server.serve_stream(self.request, [s for s in streams if s])
+
+
+class StubStreamServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    模拟币安K线组合流的本地服务，用于无网络环境下测试
+
+    每个tick推送一根K线的未收盘更新和收盘消息，K线时间按5分钟递增
+    disconnect_after 指定每个连接推送多少根K线后主动断开，用于测试重连和回补
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, tick_interval=0.05, start_time=None,
+                 disconnect_after=None, seed=42):
+        super().__init__((host, port), _StubStreamHandler)
+        now_ms = int(time.time() * 1000)
+        self.open_time = start_time if start_time is not None else now_ms - now_ms % KLINE_INTERVAL_MS
+        self.tick_interval = tick_interval
+        self.disconnect_after = disconnect_after
+        self.random = random.Random(seed)
+        self.prices = {}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'ws://{host}:{port}'
+
+    def _next_candles(self, streams):
+        with self._lock:
+            open_time = self.open_time
+            self.open_time += KLINE_INTERVAL_MS
+            candles = []
+            for stream in streams:
+                pair = stream.split('@')[0].upper()
+                open_price = self.prices.get(pair, 30000.0 if pair.startswith('BTC') else 2000.0)
+                close_price = open_price * (1 + self.random.gauss(0, 0.002))
+                self.prices[pair] = close_price
+                candles.append((stream, pair, open_price, close_price))
+        return open_time, candles
+
+    def serve_stream(self, sock, streams):
+        sent = 0
+        try:
+            while self.disconnect_after is None or sent < self.disconnect_after:
+                open_time, candles = self._next_candles(streams)
+                for closed in (False, True):
+                    for stream, pair, open_price, close_price in candles:
+                        message = {
+                            'stream': stream,
+                            'data': {
+                                'e': 'kline',
+                                'E': open_time + (KLINE_INTERVAL_MS if closed else KLINE_INTERVAL_MS // 2),
+                                's': pair,
+                                'k': {
+                                    't': open_time,
+                                    'T': open_time + KLINE_INTERVAL_MS - 1,
+                                    's': pair,
+                                    'i': KLINE_INTERVAL,
+                                    'o': f'{open_price:.2f}',
+                                    'c': f'{close_price:.2f}',
+                                    'h': f'{max(open_price, close_price):.2f}',
+                                    'l': f'{min(open_price, close_price):.2f}',
+                                    'v': '0',
+                                    'x': closed
+                                }
+                            }
+                        }
+                        _send_text_frame(sock, json.dumps(message))
+                sent += 1
+                time.sleep(self.tick_interval)
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='消费币安5分钟K线流并写入数据库')
+    parser.add_argument('--stub', action='store_true', help='启动本地模拟流服务并连接')
+    parser.add_argument('--dry-run', action='store_true', help='只输出收盘K线，不写入数据库')
+    args = parser.parse_args()
+
+    kwargs = {}
+    if args.stub:
+        server = StubStreamServer(disconnect_after=20)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        kwargs['url'] = build_stream_url(SYMBOLS, server.url)
+        logger.info(f'本地模拟流服务已启动: {server.url}')
+    if args.dry_run:
+        kwargs['on_candle'] = lambda row: logger.info(f'收盘K线: {row}')
+        def dry_run_backfill(symbol, start, end):
+            logger.info(f'回补 {symbol}: {start} 到 {end}')
+            return end
+
+        kwargs['backfill'] = dry_run_backfill
+        kwargs['latest_timestamp'] = lambda symbol: None
+
+    feed = KlineStreamFeed(**kwargs)
+    try:
+        feed.run()
+    except KeyboardInterrupt:
+        feed.stop()
+
+
+if __name__ == '__main__':
+    main()
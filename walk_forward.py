@@ -0,0 +1,225 @@
+import argparse
+import bisect
+import calendar
+import csv
+import json
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import strategies
+from investment_analysis import InvestmentAnalyzer, INVESTMENT_STRATEGY, START_DATE, END_DATE
+from performance import PriceTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HORIZONS = (12, 24, 36)  # 回测期限（月）
+
+
+def add_months(date, months):
+    """
+    日期加上若干个月，日超出目标月份天数时取该月最后一天
+    """
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return date.replace(year=year, month=month, day=day)
+
+
+def window_starts(start_date, end_date, step_months=1, min_horizon=12):
+    """
+    生成滚动窗口的开始日期：从 start_date 起的每个月初（按 step_months 步进），
+    且至少最短期限的窗口能完整落在 end_date 之前
+    """
+    current = datetime(start_date.year, start_date.month, 1)
+    if current < start_date:
+        current = add_months(current, 1)
+    starts = []
+    while add_months(current, min_horizon) - timedelta(days=1) <= end_date:
+        starts.append(current)
+        current = add_months(current, step_months)
+    return starts
+
+
+class WalkForwardRunner:
+    """
+    滚动窗口回测
+
+    只预加载一次数据、编译一次策略并提取一次交易信号日；同一开始日期的各期限共用一次模拟，
+    较短期限的结果是较长期限模拟过程中的快照
+    """
+    def __init__(self, initial_funds=None, investment_strategy=None, execution=None, strategy=None):
+        self.base = InvestmentAnalyzer(initial_funds, investment_strategy, log_trades=False, persist_trades=False,
+                                       execution=execution, strategy=strategy)
+        self.signals = []
+        self.signal_dates = []
+        self.price_dates = {}
+        self.price_table = None
+
+    def load(self, end_date=None):
+        """
+        预加载价格和贪婪恐惧指数，并计算与窗口无关的信号日列表
+        """
+        if not self.base.preload_data(end_date):
+            return False
+        self.signals = self.base.trade_signals()
+        self.signal_dates = [signal[0] for signal in self.signals]
+        self.price_dates = {symbol: sorted(prices) for symbol, prices in self.base.daily_prices.items()}
+        self.price_table = PriceTable.from_daily_prices(self.base.daily_prices)
+        logger.info(f'共 {len(self.signals)} 个信号日可用于滚动回测')
+        return True
+
+    def price_on_or_before(self, symbol, date_str):
+        dates = self.price_dates.get(symbol, [])
+        index = bisect.bisect_right(dates, date_str)
+        if not index:
+            return None
+        return self.base.daily_prices[symbol][dates[index - 1]]
+
+    def new_analyzer(self):
+        """
+        创建共享预加载数据和编译后信号的新分析器，不访问数据库
+        """
+        analyzer = InvestmentAnalyzer(self.base.initial_funds, self.base.investment_strategy,
+                                      log_trades=False, persist_trades=False, execution=self.base.execution,
+                                      strategy=self.base.strategy)
+        analyzer.daily_prices = self.base.daily_prices
+        analyzer.daily_fng = self.base.daily_fng
+        analyzer.compiled_signals = self.base.compiled_signals
+        return analyzer
+
+    def snapshot(self, analyzer, start, end, months):
+        end_str = end.strftime('%Y-%m-%d')
+        btc_price = self.price_on_or_before('BTC', end_str) or 0
+        eth_price = self.price_on_or_before('ETH', end_str) or 0
+        total_value = analyzer.current_funds + analyzer.btc_holdings * btc_price + analyzer.eth_holdings * eth_price
+        buys = sum(1 for record in analyzer.trade_records if record['trade_type'] == 'buy')
+        risk = analyzer.compute_performance(start, end, self.price_table)
+        return {
+            'start': start.strftime('%Y-%m-%d'),
+            'end': end_str,
+            'horizon_months': months,
+            'final_value': round(total_value, 2),
+            'return_pct': round((total_value / analyzer.initial_funds - 1) * 100, 4),
+            'remaining_usd': round(analyzer.current_funds, 2),
+            'btc_holdings': analyzer.btc_holdings,
+            'eth_holdings': analyzer.eth_holdings,
+            'trades': len(analyzer.trade_records),
+            'buys': buys,
+            'sells': len(analyzer.trade_records) - buys,
+            'cagr_pct': round(risk.get('cagr_pct', 0.0), 4),
+            'sharpe': round(risk.get('sharpe', 0.0), 4),
+            'max_drawdown_pct': round(risk.get('max_drawdown_pct', 0.0), 4),
+            'exposure_pct': round(risk.get('exposure_pct', 0.0), 4),
+            'time_in_market_pct': round(risk.get('time_in_market_pct', 0.0), 4)
+        }
+
+    def run_window_group(self, start, horizons, end_limit):
+        """
+        从 start 开始模拟一次，依次在每个期限结束日记录结果
+        """
+        analyzer = self.new_analyzer()
+        index = bisect.bisect_left(self.signal_dates, start.strftime('%Y-%m-%d'))
+        results = []
+        for months in sorted(horizons):
+            end = add_months(start, months) - timedelta(days=1)
+            if end > end_limit:
+                break
+            end_str = end.strftime('%Y-%m-%d')
+            while index < len(self.signals) and self.signal_dates[index] <= end_str:
+                date_str, fng, btc_price, eth_price, trade_type = self.signals[index]
+                if trade_type == 'buy':
+                    analyzer.buy_crypto(date_str, btc_price, eth_price, fng)
+                else:
+                    analyzer.sell_crypto(date_str, btc_price, eth_price, fng)
+                index += 1
+            results.append(self.snapshot(analyzer, start, end, months))
+        return results
+
+    def run(self, start_date, end_date, horizons=DEFAULT_HORIZONS, step_months=1):
+        if not self.signal_dates and not self.load(end_date):
+            return []
+        results = []
+        for start in window_starts(start_date, end_date, step_months, min(horizons)):
+            results.extend(self.run_window_group(start, horizons, end_date))
+        return results
+
+
+def summarize(results):
+    """
+    按期限汇总各窗口的收益率分布
+    """
+    summary = []
+    for months in sorted({result['horizon_months'] for result in results}):
+        group = [result for result in results if result['horizon_months'] == months]
+        returns = np.array([result['return_pct'] for result in group])
+        summary.append({
+            'horizon_months': months,
+            'windows': int(len(returns)),
+            'mean_return_pct': round(float(returns.mean()), 4),
+            'median_return_pct': round(float(np.median(returns)), 4),
+            'min_return_pct': round(float(returns.min()), 4),
+            'max_return_pct': round(float(returns.max()), 4),
+            'positive_ratio': round(float((returns > 0).mean()), 4),
+            'mean_sharpe': round(float(np.mean([result['sharpe'] for result in group])), 4),
+            'worst_drawdown_pct': round(float(min(result['max_drawdown_pct'] for result in group)), 4)
+        })
+    return summary
+
+
+def write_results(results, path):
+    if path.endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'windows': results, 'summary': summarize(results)}, f, ensure_ascii=False, indent=2)
+        return
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='滚动窗口（walk-forward）回测')
+    parser.add_argument('--start', default=datetime(*START_DATE).strftime('%Y-%m-%d'), help='最早的窗口开始日期')
+    parser.add_argument('--end', default=datetime(*END_DATE).strftime('%Y-%m-%d'), help='窗口结束日期上限')
+    parser.add_argument('--horizons', default=','.join(str(months) for months in DEFAULT_HORIZONS),
+                        help='回测期限（月），逗号分隔')
+    parser.add_argument('--step-months', type=int, default=1, help='窗口开始日期的步进（月）')
+    parser.add_argument('--strategy', choices=sorted(strategies.STRATEGIES), default='fng_tiers', help='回测策略')
+    parser.add_argument('--strategy-param', action='append', metavar='KEY=VALUE',
+                        help='策略参数，可重复，如 --strategy-param window=100')
+    parser.add_argument('--output', help='结果输出文件（.csv 或 .json）')
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d')
+    end_date = datetime.strptime(args.end, '%Y-%m-%d')
+    horizons = sorted(int(months) for months in args.horizons.split(','))
+    try:
+        strategy = strategies.build_strategy(args.strategy, INVESTMENT_STRATEGY,
+                                             **strategies.parse_strategy_params(args.strategy_param))
+    except (TypeError, ValueError) as error:
+        parser.error(f'策略参数无效: {error}')
+
+    runner = WalkForwardRunner(strategy=strategy)
+    results = runner.run(start_date, end_date, horizons, args.step_months)
+    if not results:
+        logger.error('没有可评估的窗口')
+        return 1
+
+    for item in summarize(results):
+        logger.info(f"{item['horizon_months']}个月: {item['windows']} 个窗口, "
+                    f"平均收益 {item['mean_return_pct']:.2f}%, 中位数 {item['median_return_pct']:.2f}%, "
+                    f"最差 {item['min_return_pct']:.2f}%, 最好 {item['max_return_pct']:.2f}%, "
+                    f"盈利窗口占比 {item['positive_ratio'] * 100:.1f}%, 平均夏普 {item['mean_sharpe']:.2f}, "
+                    f"最大回撤 {item['worst_drawdown_pct']:.2f}%")
+
+    if args.output:
+        write_results(results, args.output)
+        logger.info(f'结果已写入 {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())